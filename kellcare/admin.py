@@ -1,5 +1,47 @@
-from django.contrib import admin
-from .models import Department, Doctor, Patient, Appointment, ContactMessage
+from django.contrib import admin, messages
+from .models import Department, Doctor, Patient, Appointment, ContactMessage, GeocodeCacheEntry, GeocodingJob, NetworkReport
+from .pagination import EstimatedCountPaginator
+from .utils.autocomplete import get_autocomplete_index
+from .utils.row_counts import ESTIMATE
+
+
+class EstimatedCountAdminMixin:
+    """
+    Changelist counts from kellcare.utils.row_counts instead of COUNT(*) per page view
+
+    Skips the second, unfiltered count Django runs for "N results (M total)" and
+    says so on the page when the count shown is not exact.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        changelist = getattr(response, "context_data", {}).get("cl")
+        if changelist is not None and not changelist.paginator.count_exact:
+            kind = "approximate" if changelist.paginator.count_mode == ESTIMATE else "cached"
+            self.message_user(request, f"The result count ({changelist.result_count}) is {kind}.", level=messages.INFO)
+        return response
+
+
+class IndexedAutocompleteAdminMixin:
+    """
+    Answer the admin's autocomplete widgets from the in-memory autocomplete index
+
+    Applies when another admin lists this model in ``autocomplete_fields``; the
+    changelist search box keeps using ``search_fields``.
+    """
+
+    autocomplete_kind = None
+    autocomplete_limit = 100
+
+    def get_search_results(self, request, queryset, search_term):
+        match = getattr(request, "resolver_match", None)
+        if search_term and match is not None and match.url_name == "autocomplete" and "admin" in match.app_names:
+            matches = get_autocomplete_index().search(search_term, kinds=[self.autocomplete_kind], limit=self.autocomplete_limit)
+            return queryset.filter(pk__in=[result["id"] for result in matches]), False
+        return super().get_search_results(request, queryset, search_term)
 
 
 @admin.register(Department)
@@ -10,27 +52,30 @@ class DepartmentAdmin(admin.ModelAdmin):
 
 
 @admin.register(Doctor)
-class DoctorAdmin(admin.ModelAdmin):
+class DoctorAdmin(IndexedAutocompleteAdminMixin, admin.ModelAdmin):
     list_display = ["user", "license_number", "specialization", "department", "is_available"]
     list_filter = ["specialization", "department", "is_available", "created_at"]
     search_fields = ["user__first_name", "user__last_name", "license_number"]
+    autocomplete_kind = "doctor"
     list_editable = ["is_available"]
 
 
 @admin.register(Patient)
-class PatientAdmin(admin.ModelAdmin):
+class PatientAdmin(IndexedAutocompleteAdminMixin, EstimatedCountAdminMixin, admin.ModelAdmin):
     list_display = ["user", "patient_id", "gender", "blood_group", "phone"]
     list_filter = ["gender", "blood_group", "created_at"]
     search_fields = ["user__first_name", "user__last_name", "patient_id", "phone"]
+    autocomplete_kind = "patient"
 
 
 @admin.register(Appointment)
-class AppointmentAdmin(admin.ModelAdmin):
+class AppointmentAdmin(EstimatedCountAdminMixin, admin.ModelAdmin):
     list_display = ["patient", "doctor", "appointment_date", "status", "created_at"]
     list_filter = ["status", "appointment_date", "doctor__specialization"]
     search_fields = ["patient__user__first_name", "patient__user__last_name", "doctor__user__first_name", "doctor__user__last_name"]
     list_editable = ["status"]
     date_hierarchy = "appointment_date"
+    autocomplete_fields = ["patient", "doctor"]
 
 
 @admin.register(ContactMessage)
@@ -40,3 +85,25 @@ class ContactMessageAdmin(admin.ModelAdmin):
     search_fields = ["name", "email", "subject"]
     list_editable = ["is_read"]
     readonly_fields = ["created_at"]
+
+
+@admin.register(GeocodeCacheEntry)
+class GeocodeCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ["normalized_query", "kind", "provider", "success", "hits", "expires_at"]
+    list_filter = ["kind", "provider", "success"]
+    search_fields = ["normalized_query", "address"]
+    readonly_fields = ["query_hash", "hits", "created_at"]
+
+
+@admin.register(GeocodingJob)
+class GeocodingJobAdmin(admin.ModelAdmin):
+    list_display = ["id", "status", "service", "targets", "created_by", "created_at", "finished_at"]
+    list_filter = ["status", "service"]
+    readonly_fields = ["progress", "errors", "error", "created_at", "started_at", "heartbeat_at", "finished_at"]
+
+
+@admin.register(NetworkReport)
+class NetworkReportAdmin(admin.ModelAdmin):
+    list_display = ["id", "status", "k", "specialization", "created_by", "created_at", "finished_at"]
+    list_filter = ["status", "k", "specialization"]
+    readonly_fields = ["report", "error", "created_at", "started_at", "finished_at"]
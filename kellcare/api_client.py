@@ -2,40 +2,486 @@
 API consumption utilities for making HTTP requests to Django REST Framework endpoints
 """
 
-import requests
+import asyncio
+import contextvars
+import hashlib
+import io
+import json
 import logging
+import random
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
+from urllib.parse import urlencode, urlsplit
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.base import BaseHandler
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connections, transaction
+from django.urls import Resolver404, resolve
 
 logger = logging.getLogger(__name__)
 
+# Path prefix under which kellcare.api_urls is mounted in the root URLconf
+API_URL_PREFIX = "/api"
+
+
+class APIRequestError(Exception):
+    """Raised when an in-process API call returns an error status"""
+
+
+class TransportUnavailable(Exception):
+    """Raised when a transport cannot serve an endpoint and the caller should fall back"""
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """The fan-out deadline passed before the request could be sent"""
+
+
+# time.monotonic() by which the current fan_out()/afan_out() call must finish, if any
+_fan_out_deadline = contextvars.ContextVar("kellcare_fan_out_deadline", default=None)
+
+
+def _time_left(target):
+    """Seconds left before the current fan-out deadline (None outside a fan-out)"""
+    deadline = _fan_out_deadline.get()
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded(f"Fan-out deadline passed before calling {target}")
+    return remaining
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without touching the network while a circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker for one API host.
+
+    Opens after ``failure_threshold`` consecutive failures and short-circuits
+    calls until ``reset_timeout`` seconds have passed, then lets a single trial
+    request through (half-open) to decide whether to close again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.opens = 0
+        self.short_circuits = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow_request(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Half-open: let this call through and hold everyone else off for another window
+                self.opened_at = time.monotonic()
+                return True
+            self.short_circuits += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold and self.opened_at is None:
+                self.opens += 1
+                self.opened_at = time.monotonic()
+                logger.warning(f"API circuit breaker opened after {self.failures} consecutive failures")
+
+
+class HTTPSessionPool:
+    """
+    Process-wide pool of keep-alive ``requests`` sessions, one per API host.
+
+    Sessions are shared by every thread and every APIClient, so per-caller state
+    such as the auth token must be sent as request headers, never set on the session.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._breakers = {}
+        self.counters = {"hits": 0, "misses": 0, "requests": 0, "retries": 0, "failures": 0}
+
+    def _new_session(self):
+        pool_size = getattr(settings, "KELLCARE_API_POOL_SIZE", 10)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update({"Content-Type": "application/json", "Accept": "application/json", "Connection": "keep-alive"})
+        return session
+
+    def get_session(self, base_url):
+        with self._lock:
+            session = self._sessions.get(base_url)
+            if session is None:
+                self.counters["misses"] += 1
+                session = self._sessions[base_url] = self._new_session()
+            else:
+                self.counters["hits"] += 1
+            return session
+
+    def get_breaker(self, base_url):
+        with self._lock:
+            breaker = self._breakers.get(base_url)
+            if breaker is None:
+                breaker = self._breakers[base_url] = CircuitBreaker(
+                    failure_threshold=getattr(settings, "KELLCARE_API_BREAKER_THRESHOLD", 5),
+                    reset_timeout=getattr(settings, "KELLCARE_API_BREAKER_RESET", 30.0),
+                )
+            return breaker
+
+    def count(self, counter, amount=1):
+        with self._lock:
+            self.counters[counter] += amount
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self.counters,
+                "sessions": len(self._sessions),
+                "breakers": {
+                    base_url: {"state": breaker.state, "failures": breaker.failures, "opens": breaker.opens, "short_circuits": breaker.short_circuits}
+                    for base_url, breaker in self._breakers.items()
+                },
+            }
+
+    def reset(self):
+        """Close all pooled sessions and clear breakers and counters"""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+            self._breakers.clear()
+            self.counters = dict.fromkeys(self.counters, 0)
+
+
+http_session_pool = HTTPSessionPool()
+
+# Only these methods are safe to replay after a connection error or gateway failure
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+RETRY_STATUS_CODES = {502, 503, 504}
+
+
+class HTTPTransport:
+    """
+    Transport that talks to the API over a real socket using ``requests``.
+
+    Uses the pooled keep-alive session for the host, retries idempotent calls
+    with jittered exponential backoff, and fails fast while the host's circuit
+    breaker is open. Inside fan_out() each attempt's timeout is cut to what is
+    left of the fan-out deadline, so a late call frees its worker soon after.
+    """
+
+    name = "http"
+
+    def __init__(self, base_url, token=None):
+        self.base_url = base_url.rstrip("/")
+        self.session = http_session_pool.get_session(self.base_url)
+        self.breaker = http_session_pool.get_breaker(self.base_url)
+        self.timeout = getattr(settings, "KELLCARE_API_HTTP_TIMEOUT", 5.0)
+        self.retries = getattr(settings, "KELLCARE_API_RETRIES", 2)
+        self.backoff = getattr(settings, "KELLCARE_API_RETRY_BACKOFF", 0.1)
+
+        # Add authentication if token provided
+        self.headers = {"Authorization": f"Token {token}"} if token else {}
+
+    def _sleep_before_retry(self, attempt):
+        # Full jitter keeps retrying workers from hammering the API in lockstep
+        time.sleep(random.uniform(0, self.backoff * (2**attempt)))
+        http_session_pool.count("retries")
+
+    def request(self, method, endpoint, params=None, data=None):
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(f"Circuit breaker open for {self.base_url}")
+
+        attempts = self.retries + 1 if method.upper() in IDEMPOTENT_METHODS else 1
+        for attempt in range(attempts):
+            # Raised before the breaker sees it: a passed deadline is not the host's fault
+            remaining = _time_left(self.base_url)
+            timeout = self.timeout if remaining is None else min(self.timeout, remaining)
+            http_session_pool.count("requests")
+            try:
+                response = self.session.request(method, f"{self.base_url}{endpoint}", params=params, json=data, headers=self.headers, timeout=timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt == attempts - 1:
+                    http_session_pool.count("failures")
+                    self.breaker.record_failure()
+                    raise
+                self._sleep_before_retry(attempt)
+                continue
+
+            if response.status_code in RETRY_STATUS_CODES and attempt < attempts - 1:
+                self._sleep_before_retry(attempt)
+                continue
+            break
+
+        if response.status_code >= 500:
+            http_session_pool.count("failures")
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        response.raise_for_status()
+        return response.json()
+
+
+class InProcessTransport:
+    """
+    Transport that serves API endpoints through Django's request handler in this
+    process, skipping the HTTP loopback.
+
+    The request is a real WSGIRequest passed through the project's middleware
+    chain (security, sessions, CSRF, authentication, ...) and URLconf, so it goes
+    through the same middleware, authentication, permission, pagination and
+    rendering code as a socket request and callers get an identical JSON payload.
+    Endpoints outside kellcare.api_urls raise TransportUnavailable so the client
+    falls back to HTTP. request_started/request_finished are not sent, so the
+    caller's database connections are left alone.
+    """
+
+    name = "inprocess"
+    urlconf = "kellcare.api_urls"
+
+    def __init__(self, base_url, token=None):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme or "http"
+        self.server_name = parts.hostname or "127.0.0.1"
+        self.server_port = str(parts.port or (443 if self.scheme == "https" else 80))
+        self.headers = {"HTTP_ACCEPT": "application/json"}
+        if parts.netloc:
+            # Keep the caller's host so pagination links match the HTTP transport
+            self.headers["HTTP_HOST"] = parts.netloc
+        if token:
+            self.headers["HTTP_AUTHORIZATION"] = f"Token {token}"
+
+    def _environ(self, method, path, query, body):
+        return {
+            "REQUEST_METHOD": method.upper(),
+            "SCRIPT_NAME": "",
+            "PATH_INFO": path,
+            "QUERY_STRING": query,
+            "CONTENT_TYPE": "application/json",
+            "CONTENT_LENGTH": str(len(body)),
+            "SERVER_NAME": self.server_name,
+            "SERVER_PORT": self.server_port,
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "REMOTE_ADDR": "127.0.0.1",
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": self.scheme,
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": True,
+            "wsgi.run_once": False,
+            **self.headers,
+        }
+
+    def request(self, method, endpoint, params=None, data=None):
+        path, _, query = endpoint.partition("?")
+        if not path.startswith(f"{API_URL_PREFIX}/"):
+            raise TransportUnavailable(f"{endpoint} is not an API endpoint")
+        try:
+            resolve(path[len(API_URL_PREFIX) :], urlconf=self.urlconf)
+        except Resolver404:
+            raise TransportUnavailable(f"{endpoint} does not resolve in {self.urlconf}")
+
+        if params:
+            extra = urlencode({key: value for key, value in params.items() if value is not None}, doseq=True)
+            query = f"{query}&{extra}" if query and extra else query or extra
+
+        # A view can't be interrupted, so a call queued past its fan-out deadline is not started
+        _time_left(path)
+        body = json.dumps(data).encode() if data is not None else b""
+        request = WSGIRequest(self._environ(method, path, query, body))
+
+        try:
+            response = _get_request_handler().get_response(request)
+        except Exception as e:
+            # Mirror the HTTP transport, where an unhandled error is just a 500
+            raise APIRequestError(f"In-process request for {path} raised {e!r}") from e
+        try:
+            if response.status_code >= 400:
+                raise APIRequestError(f"{response.status_code} returned by in-process request for {path}")
+            return json.loads(response.content)
+        finally:
+            response.close()
+
+
+_request_handler = None
+_request_handler_lock = threading.Lock()
+
+
+def _get_request_handler():
+    """Handler with the project's middleware loaded, shared by every InProcessTransport"""
+    global _request_handler
+    with _request_handler_lock:
+        if _request_handler is None:
+            handler = BaseHandler()
+            handler.load_middleware()
+            _request_handler = handler
+        return _request_handler
+
+
+class ResponseCache:
+    """
+    Bounded, thread-safe LRU cache of GET responses with per-endpoint TTLs.
+
+    Keys carry a generation number per API resource (the first path segment
+    under /api/). Model writes bump the generation in Django's cache framework,
+    so every process sharing that cache (see CACHES in settings) stops serving
+    the old entries as soon as a write commits; the orphaned entries then age
+    out through TTL and LRU eviction. Writes that are not seen (bulk writes
+    without signals, or a per-process cache backend) are served stale for up to
+    the endpoint's TTL.
+
+    Cached payloads are shared between callers and must be treated as read-only.
+    """
+
+    GENERATION_KEY = "kellcare:api-cache:generation:{}"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    @staticmethod
+    def resource_for(endpoint):
+        path = endpoint.split("?", 1)[0]
+        if not path.startswith(f"{API_URL_PREFIX}/"):
+            return None
+        return path[len(API_URL_PREFIX) + 1 :].split("/", 1)[0] or None
+
+    @staticmethod
+    def ttl_for(endpoint):
+        ttls = getattr(settings, "KELLCARE_API_CACHE_TTLS", {})
+        matches = [prefix for prefix in ttls if endpoint.startswith(prefix)]
+        if matches:
+            return ttls[max(matches, key=len)]
+        return getattr(settings, "KELLCARE_API_CACHE_DEFAULT_TTL", 0)
+
+    def make_key(self, method, endpoint, params, principal):
+        resource = self.resource_for(endpoint)
+        generation = cache.get(self.GENERATION_KEY.format(resource), 0)
+        query = urlencode(sorted((key, value) for key, value in (params or {}).items() if value is not None), doseq=True)
+        return (method, endpoint, query, principal, resource, generation)
+
+    def get(self, key, record_miss=True):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                if record_miss:
+                    self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        max_entries = getattr(settings, "KELLCARE_API_CACHE_MAX_ENTRIES", 512)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def invalidate(self, resources):
+        """Bump the generation of each resource so existing entries are never served again"""
+        for resource in resources:
+            key = self.GENERATION_KEY.format(resource)
+            cache.add(key, 0, timeout=None)
+            try:
+                cache.incr(key)
+            except ValueError:
+                # Evicted between add() and incr(); any new value differs from cached keys
+                cache.set(key, time.time_ns(), timeout=None)
+        with self._lock:
+            self.counters["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {**self.counters, "entries": len(self._entries)}
+
+
+response_cache = ResponseCache()
+
+
+def invalidate_response_cache(*resources):
+    """
+    Invalidate cached API responses for the given resources (e.g. "doctors")
+
+    The bump happens immediately and again once the current transaction commits,
+    so a concurrent reader cannot re-cache data from before the write.
+    """
+    response_cache.invalidate(resources)
+    transaction.on_commit(lambda: response_cache.invalidate(resources))
+
 
 class APIClient:
     """
     Client for consuming Django REST Framework API endpoints
     """
 
-    def __init__(self, base_url="http://127.0.0.1:8000", token=None):
+    def __init__(self, base_url="http://127.0.0.1:8000", token=None, transport="http"):
         """
         Initialize API client
 
         Args:
             base_url (str): Base URL for API endpoints
             token (str): Authentication token (optional)
+            transport (str): 'http' (socket) or 'inprocess' (direct DRF view call,
+                falling back to 'http' for endpoints outside kellcare.api_urls)
         """
         self.base_url = base_url.rstrip("/")
         self.token = token
-        self.session = requests.Session()
-
-        # Set default headers
-        self.session.headers.update(
-            {
-                "Content-Type": "application/json",
-                "Accept": "application/json",
-            }
-        )
-
-        # Add authentication if token provided
-        if token:
-            self.session.headers.update({"Authorization": f"Token {token}"})
+        self.transport = transport
+        # Identity used in response cache keys; responses differ per user
+        self.principal = hashlib.sha256(token.encode()).hexdigest()[:16] if token else "anonymous"
+        self._http = None
+        self._inprocess = InProcessTransport(self.base_url, token) if transport == "inprocess" else None
+
+    @property
+    def session(self):
+        """Pooled requests.Session used by the HTTP transport (shared, don't set per-user headers on it)"""
+        return self._get_http_transport().session
+
+    def _get_http_transport(self):
+        if self._http is None:
+            self._http = HTTPTransport(self.base_url, self.token)
+        return self._http
 
     def _make_request(self, method, endpoint, **kwargs):
         """
@@ -44,18 +490,42 @@ class APIClient:
         Args:
             method (str): HTTP method (GET, POST, PUT, DELETE)
             endpoint (str): API endpoint path
-            **kwargs: Additional request parameters
+            **kwargs: Additional request parameters (params, data)
 
         Returns:
             dict: JSON response data or None if error
         """
+        ttl = response_cache.ttl_for(endpoint) if method == "GET" else 0
+        if not ttl:
+            return self._send(method, endpoint, **kwargs)
+
+        key = response_cache.make_key(method, endpoint, kwargs.get("params"), self.principal)
+        data = response_cache.get(key)
+        if data is None:
+            data = self._send(method, endpoint, **kwargs)
+            if data is not None:
+                response_cache.set(key, data, ttl)
+        return data
+
+    def get_cached(self, endpoint, params=None):
+        """Return a cached GET response without touching the transport, or None"""
+        if not response_cache.ttl_for(endpoint):
+            return None
+        # A miss here is followed by a real get(), which records it
+        return response_cache.get(response_cache.make_key("GET", endpoint, params, self.principal), record_miss=False)
+
+    def _send(self, method, endpoint, **kwargs):
+        """Send the request through the configured transport, returning None on error"""
         url = f"{self.base_url}{endpoint}"
 
         try:
-            response = self.session.request(method, url, **kwargs)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
+            if self._inprocess is not None:
+                try:
+                    return self._inprocess.request(method, endpoint, **kwargs)
+                except TransportUnavailable as e:
+                    logger.debug(f"In-process transport unavailable, falling back to HTTP: {e}")
+            return self._get_http_transport().request(method, endpoint, **kwargs)
+        except (requests.exceptions.RequestException, APIRequestError) as e:
             logger.error(f"API request failed: {method} {url} - {e}")
             return None
         except ValueError as e:
@@ -68,47 +538,278 @@ class APIClient:
 
     def post(self, endpoint, data=None):
         """POST request to API endpoint"""
-        return self._make_request("POST", endpoint, json=data)
+        return self._make_request("POST", endpoint, data=data)
 
     def put(self, endpoint, data=None):
         """PUT request to API endpoint"""
-        return self._make_request("PUT", endpoint, json=data)
+        return self._make_request("PUT", endpoint, data=data)
 
     def delete(self, endpoint):
         """DELETE request to API endpoint"""
         return self._make_request("DELETE", endpoint)
 
 
-def get_api_client(request=None, base_url=None):
+def _default_base_url(request=None, base_url=None):
+    if not base_url and request:
+        return request.build_absolute_uri("/")
+    return base_url or "http://127.0.0.1:8000"
+
+
+def _authenticated_user(request):
+    user = getattr(request, "user", None)
+    return user if user is not None and user.is_authenticated else None
+
+
+def get_api_client(request=None, base_url=None, transport=None):
     """
     Get configured API client instance
 
     Args:
         request: Django request object (for getting auth token)
         base_url: Custom base URL (defaults to current request's host)
+        transport: 'http' or 'inprocess' (defaults to settings.KELLCARE_API_TRANSPORT)
 
     Returns:
         APIClient: Configured API client
     """
     # Determine base URL
-    if not base_url and request:
-        base_url = request.build_absolute_uri("/")
-    elif not base_url:
-        base_url = "http://127.0.0.1:8000"
+    base_url = _default_base_url(request, base_url)
 
     # Get authentication token if available
     token = None
-    if request and hasattr(request, "user") and request.user.is_authenticated:
+    user = _authenticated_user(request) if request else None
+    if user is not None:
         # Try to get token from user's auth token
         try:
             from rest_framework.authtoken.models import Token
 
-            token_obj = Token.objects.get(user=request.user)
+            token_obj = Token.objects.get(user=user)
             token = token_obj.key
         except Exception:
             pass
 
-    return APIClient(base_url=base_url, token=token)
+    if transport is None:
+        transport = getattr(settings, "KELLCARE_API_TRANSPORT", "http")
+
+    return APIClient(base_url=base_url, token=token, transport=transport)
+
+
+class AsyncAPIClient:
+    """
+    Async client for consuming Django REST Framework API endpoints
+
+    Wraps an APIClient: the response cache (a blocking Django cache read) and the
+    blocking transport (in-process DRF view or pooled HTTP session) both run in
+    worker threads, so the event loop keeps serving other requests meanwhile.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    async def _call(self, func, *args):
+        return await sync_to_async(_run_call, thread_sensitive=False)(partial(func, *args))
+
+    async def get(self, endpoint, params=None):
+        """GET request to API endpoint"""
+        data = await sync_to_async(self.client.get_cached, thread_sensitive=False)(endpoint, params)
+        if data is None:
+            data = await self._call(self.client.get, endpoint, params)
+        return data
+
+    async def post(self, endpoint, data=None):
+        """POST request to API endpoint"""
+        return await self._call(self.client.post, endpoint, data)
+
+    async def put(self, endpoint, data=None):
+        """PUT request to API endpoint"""
+        return await self._call(self.client.put, endpoint, data)
+
+    async def delete(self, endpoint):
+        """DELETE request to API endpoint"""
+        return await self._call(self.client.delete, endpoint)
+
+
+async def aget_api_client(request=None, base_url=None, transport=None):
+    """
+    Async counterpart of get_api_client(); the token lookup uses the async ORM
+
+    Returns:
+        AsyncAPIClient: Configured async API client
+    """
+    from rest_framework.authtoken.models import Token
+
+    base_url = _default_base_url(request, base_url)
+
+    # request.user is lazy and may need the session store, which is sync-only
+    token = None
+    user = await sync_to_async(_authenticated_user)(request) if request else None
+    if user is not None:
+        token_obj = await Token.objects.filter(user=user).afirst()
+        token = token_obj.key if token_obj else None
+
+    if transport is None:
+        transport = getattr(settings, "KELLCARE_API_TRANSPORT", "http")
+
+    return AsyncAPIClient(APIClient(base_url=base_url, token=token, transport=transport))
+
+
+def get_client_stats():
+    """
+    Counters for the shared HTTP session pool and the response cache
+
+    Returns:
+        dict: pool hits/misses, request/retry/failure counts, per-host breaker state,
+        response cache hits/misses/evictions under "response_cache" and the late
+        fan-out calls still holding a worker under "fan_out_abandoned"
+    """
+    return {**http_session_pool.stats(), "response_cache": response_cache.stats(), "fan_out_abandoned": _abandoned_calls()}
+
+
+class FanOutResult(dict):
+    """
+    Results of a fan_out() call keyed by call name.
+
+    Calls that failed or missed the deadline map to None; ``late`` names the
+    calls that missed the deadline and ``elapsed`` is the wall time in seconds.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.late = []
+        self.elapsed = 0.0
+
+    @property
+    def partial(self):
+        return bool(self.late)
+
+
+_fan_out_executor = None
+_fan_out_workers = 0
+
+# Late calls that were already running when their fan-out gave up on them, and so still hold a worker
+_abandoned = 0
+_abandoned_lock = threading.Lock()
+
+
+def _get_fan_out_executor():
+    global _fan_out_executor, _fan_out_workers
+    if _fan_out_executor is None:
+        _fan_out_workers = getattr(settings, "KELLCARE_API_FANOUT_WORKERS", 8)
+        _fan_out_executor = ThreadPoolExecutor(max_workers=_fan_out_workers, thread_name_prefix="kellcare-api")
+    return _fan_out_executor
+
+
+def _abandoned_calls():
+    with _abandoned_lock:
+        return _abandoned
+
+
+def _abandon(future):
+    """Count a late call that could not be cancelled until it finishes"""
+    global _abandoned
+
+    def finished(_):
+        global _abandoned
+        with _abandoned_lock:
+            _abandoned -= 1
+
+    with _abandoned_lock:
+        _abandoned += 1
+    future.add_done_callback(finished)
+
+
+def _run_call(func, deadline=None):
+    token = _fan_out_deadline.set(deadline) if deadline is not None else None
+    try:
+        return func()
+    finally:
+        if token is not None:
+            _fan_out_deadline.reset(token)
+        # Worker threads get their own DB connections; don't leak them between calls
+        connections.close_all()
+
+
+def fan_out(calls, timeout=None):
+    """
+    Run several API calls concurrently under one deadline
+
+    HTTP requests made by the calls time out at the deadline. Calls that miss it
+    and cannot be cancelled (such as an in-process view that is still running)
+    keep their worker until they finish; while they hold every worker, new
+    batches are refused and come back with every call late.
+
+    Args:
+        calls (dict): Mapping of name -> zero-argument callable (e.g. functools.partial(fetch_doctors, request))
+        timeout (float): Deadline in seconds for the whole batch (defaults to settings.KELLCARE_API_FANOUT_TIMEOUT)
+
+    Returns:
+        FanOutResult: name -> result, with ``late`` listing calls that missed the deadline
+    """
+    if timeout is None:
+        timeout = getattr(settings, "KELLCARE_API_FANOUT_TIMEOUT", 2.0)
+
+    start = time.perf_counter()
+    executor = _get_fan_out_executor()
+    if calls and _abandoned_calls() >= _fan_out_workers:
+        logger.warning(f"API fan-out refused: {_fan_out_workers} workers are still busy with late calls")
+        results = FanOutResult(dict.fromkeys(calls))
+        results.late = list(calls)
+        return results
+
+    deadline = time.monotonic() + timeout
+    futures = {name: executor.submit(_run_call, func, deadline) for name, func in calls.items()}
+    done, _ = wait(futures.values(), timeout=timeout)
+    return _collect_fan_out(futures, done, start, timeout)
+
+
+async def afan_out(calls, timeout=None):
+    """
+    Async counterpart of fan_out(): await several API calls under one deadline
+
+    Args:
+        calls (dict): Mapping of name -> awaitable (e.g. afetch_doctors(request))
+        timeout (float): Deadline in seconds for the whole batch (defaults to settings.KELLCARE_API_FANOUT_TIMEOUT)
+
+    Returns:
+        FanOutResult: name -> result, with ``late`` listing calls that missed the deadline
+    """
+    if timeout is None:
+        timeout = getattr(settings, "KELLCARE_API_FANOUT_TIMEOUT", 2.0)
+
+    start = time.perf_counter()
+    # Tasks copy the context, so sync_to_async carries the deadline into the HTTP transport's thread
+    token = _fan_out_deadline.set(time.monotonic() + timeout)
+    try:
+        tasks = {name: asyncio.ensure_future(awaitable) for name, awaitable in calls.items()}
+    finally:
+        _fan_out_deadline.reset(token)
+    if not tasks:
+        return FanOutResult()
+    done, _ = await asyncio.wait(tasks.values(), timeout=timeout)
+    return _collect_fan_out(tasks, done, start, timeout)
+
+
+def _collect_fan_out(futures, done, start, timeout):
+    """Gather finished futures or asyncio tasks into a FanOutResult, cancelling the late ones"""
+    results = FanOutResult()
+    for name, future in futures.items():
+        if future not in done:
+            # A call that already started keeps running in the background; the page renders without it
+            if not future.cancel() and not isinstance(future, asyncio.Future):
+                _abandon(future)
+            results[name] = None
+            results.late.append(name)
+            continue
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            logger.error(f"API fan-out call {name} failed: {e}")
+            results[name] = None
+
+    results.elapsed = time.perf_counter() - start
+    if results.late:
+        logger.warning(f"API fan-out deadline of {timeout}s exceeded by: {', '.join(results.late)}")
+    return results
 
 
 # Convenience functions for common API calls
@@ -124,6 +825,12 @@ def fetch_doctors(request=None, **params):
     return client.get("/api/doctors/", params=params)
 
 
+def fetch_stats_summary(request=None):
+    """Fetch aggregate doctor and department statistics from API"""
+    client = get_api_client(request)
+    return client.get("/api/stats/summary/")
+
+
 def fetch_patients(request=None, **params):
     """Fetch patients from API"""
     client = get_api_client(request)
@@ -146,3 +853,28 @@ def reverse_geocode_via_api(request, latitude, longitude):
     """Reverse geocode coordinates via API endpoint"""
     client = get_api_client(request)
     return client.post("/api/geocode/reverse/", data={"latitude": latitude, "longitude": longitude})
+
+
+# Async convenience functions for the ASGI page views
+async def afetch_departments(request=None, **params):
+    """Fetch departments from API"""
+    client = await aget_api_client(request)
+    return await client.get("/api/departments/", params=params)
+
+
+async def afetch_doctors(request=None, **params):
+    """Fetch doctors from API"""
+    client = await aget_api_client(request)
+    return await client.get("/api/doctors/", params=params)
+
+
+async def afetch_stats_summary(request=None):
+    """Fetch aggregate doctor and department statistics from API"""
+    client = await aget_api_client(request)
+    return await client.get("/api/stats/summary/")
+
+
+async def ageocode_address_via_api(request, address):
+    """Geocode address via API endpoint"""
+    client = await aget_api_client(request)
+    return await client.post("/api/geocode/address/", data={"address": address})
@@ -2,7 +2,9 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .api_views import DepartmentViewSet, DoctorViewSet, PatientViewSet, AppointmentViewSet, ContactMessageViewSet, UserViewSet
 from .auth_views import get_auth_token, refresh_auth_token, get_user_info, cors_test
-from .geocoding_views import geocode_address, reverse_geocode, update_doctor_coordinates, update_patient_coordinates, bulk_update_coordinates, geocoding_info
+from .stats_views import stats_summary, nearest_specialists_report
+from .search_views import autocomplete, search
+from .geocoding_views import geocode_address, reverse_geocode, update_doctor_coordinates, update_patient_coordinates, bulk_update_coordinates, geocoding_info, geocoding_job_status
 
 # Create a router and register our viewsets with it
 router = DefaultRouter()
@@ -20,12 +22,19 @@ urlpatterns = [
     path("auth/token/", get_auth_token, name="get_auth_token"),
     path("auth/refresh-token/", refresh_auth_token, name="refresh_auth_token"),
     path("auth/user/", get_user_info, name="get_user_info"),
+    # Statistics endpoints
+    path("stats/summary/", stats_summary, name="stats_summary"),
+    path("stats/nearest-specialists/", nearest_specialists_report, name="nearest_specialists_report"),
+    # Full-text search and autocomplete
+    path("search/", search, name="search"),
+    path("autocomplete/", autocomplete, name="autocomplete"),
     # Geocoding endpoints
     path("geocode/address/", geocode_address, name="geocode_address"),
     path("geocode/reverse/", reverse_geocode, name="reverse_geocode"),
     path("geocode/doctor/update/", update_doctor_coordinates, name="update_doctor_coordinates"),
     path("geocode/patient/update/", update_patient_coordinates, name="update_patient_coordinates"),
     path("geocode/bulk-update/", bulk_update_coordinates, name="bulk_update_coordinates"),
+    path("geocode/jobs/<int:job_id>/", geocoding_job_status, name="geocoding_job_status"),
     path("geocode/info/", geocoding_info, name="geocoding_info"),
     # CORS test endpoint
     path("cors-test/", cors_test, name="cors_test"),
@@ -1,13 +1,20 @@
-from rest_framework import viewsets, status, permissions
+from rest_framework import viewsets, status, permissions, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.filters import SearchFilter, OrderingFilter
 from django_filters.rest_framework import DjangoFilterBackend
 from django.contrib.auth.models import User
+from django.core.exceptions import FieldDoesNotExist
 from django.db.models import Q
-from datetime import datetime
+from django.utils import timezone
+from datetime import timedelta
 
+from .filters import FullTextSearchFilter, RankedOrderingFilter
 from .models import Department, Doctor, Patient, Appointment, ContactMessage
+from .pagination import KeysetOptInPagination
+from .utils.doctor_search import nearby_doctors_from_db
+from .utils.geo import haversine_km
+from .utils.spatial_index import get_doctor_index
 from .serializers import (
     DepartmentSerializer,
     DoctorSerializer,
@@ -23,8 +30,114 @@ from .serializers import (
     UserSerializer,
 )
 
+# Bounds for /api/doctors/nearby/ so one request cannot scan the whole table
+NEARBY_MAX_RADIUS_KM = 500
+NEARBY_MAX_LIMIT = 100
 
-class DepartmentViewSet(viewsets.ModelViewSet):
+
+def _add_column(needs, path, column):
+    if needs.get(path, set()) is not None:
+        needs.setdefault(path, set()).add(column)
+
+
+def _serializer_column_needs(serializer, model, prefix=(), needs=None):
+    """
+    Work out which columns and joins a serializer reads
+
+    Returns:
+        dict or None: relation path tuple -> set of column names (None = all columns),
+        or None if some top-level field reads the whole object (source="*" or unknown method fields)
+    """
+    if needs is None:
+        needs = {(): set()}
+    needs.setdefault(prefix, set())
+    dependencies = getattr(serializer, "field_dependencies", {})
+
+    for name, field in serializer.fields.items():
+        if isinstance(field, serializers.SerializerMethodField):
+            if name not in dependencies:
+                return None
+            for column in dependencies[name]:
+                _add_column(needs, prefix, column)
+            continue
+        if field.source == "*":
+            return None
+
+        path = prefix
+        current = model
+        attrs = field.source.split(".")
+        for attr in attrs:
+            try:
+                model_field = current._meta.get_field(attr)
+            except FieldDoesNotExist:
+                # A method or property such as get_full_name: it may read any column
+                if path == prefix:
+                    return None
+                needs[path] = None
+                break
+            if not model_field.is_relation:
+                _add_column(needs, path, attr)
+                break
+            if not (model_field.many_to_one or model_field.one_to_one) or not model_field.concrete:
+                return None
+            _add_column(needs, path, attr)
+            if isinstance(field, serializers.RelatedField) and attr == attrs[-1]:
+                # Primary key or slug representation only needs the foreign key column
+                break
+            path += (attr,)
+            current = model_field.related_model
+        else:
+            if isinstance(field, serializers.BaseSerializer):
+                # Nested serializer: join it and restrict its columns the same way
+                if _serializer_column_needs(field, current, path, needs) is None:
+                    needs[path] = None
+    return needs
+
+
+def optimize_queryset_for_serializer(queryset, serializer):
+    """
+    Restrict a queryset to the columns and joins a (possibly pruned) serializer needs
+
+    Unneeded select_related joins are dropped and large unused columns on the
+    selected models are deferred with only().
+    """
+    needs = _serializer_column_needs(serializer, queryset.model)
+    if needs is None:
+        return queryset
+
+    joins = [path for path in needs if path]
+    queryset = queryset.select_related(None)
+    if joins:
+        queryset = queryset.select_related(*("__".join(path) for path in joins))
+
+    only = set()
+    for path, columns in needs.items():
+        if columns is None:
+            # Name the relation so it can be traversed; its own columns stay unrestricted.
+            # Under an unrestricted parent, naming it would restrict the parent instead.
+            if needs.get(path[:-1], set()) is not None:
+                only.add("__".join(path))
+        else:
+            only.update("__".join(path + (column,)) for column in columns)
+    return queryset.only(*only) if only else queryset
+
+
+class SparseFieldsetViewSetMixin:
+    """
+    ViewSet mixin that shrinks list/retrieve SQL to the serializer's fields
+
+    Works together with SparseFieldsetMixin serializers, so ``?fields=`` and
+    ``?expand=`` prune both the JSON payload and the columns/joins queried.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ("list", "retrieve"):
+            queryset = optimize_queryset_for_serializer(queryset, self.get_serializer())
+        return queryset
+
+
+class DepartmentViewSet(SparseFieldsetViewSetMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing hospital departments
     """
@@ -38,15 +151,17 @@ class DepartmentViewSet(viewsets.ModelViewSet):
     ordering = ["name"]
 
 
-class DoctorViewSet(viewsets.ModelViewSet):
+class DoctorViewSet(SparseFieldsetViewSetMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing doctors
     """
 
     queryset = Doctor.objects.select_related("user", "department").all()
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    filter_backends = [SearchFilter, OrderingFilter, DjangoFilterBackend]
+    filter_backends = [FullTextSearchFilter, RankedOrderingFilter, DjangoFilterBackend]
     search_fields = ["user__first_name", "user__last_name", "specialization", "department__name"]
+    # ?search= uses this FTS5 table (search_fields is the LIKE fallback)
+    fulltext_index = "doctors"
     ordering_fields = ["user__first_name", "specialization", "consultation_fee", "experience_years"]
     ordering = ["user__first_name"]
     filterset_fields = ["specialization", "department", "is_available"]
@@ -80,6 +195,62 @@ class DoctorViewSet(viewsets.ModelViewSet):
         specializations = Doctor.objects.values("specialization").annotate(count=Count("id"), available_count=Count("id", filter=Q(is_available=True)))
         return Response(specializations)
 
+    @action(detail=False, methods=["get"])
+    def nearby(self, request):
+        """
+        Get the nearest available doctors to a point
+
+        GET /api/doctors/nearby/?lat=35.59&lng=-82.55&radius_km=10&specialization=cardiology&limit=10
+        """
+        params = request.query_params
+        try:
+            latitude = float(params["lat"])
+            longitude = float(params["lng"])
+            radius_km = float(params.get("radius_km", 10))
+            limit = int(params.get("limit", 10))
+        except KeyError:
+            return Response({"error": "Both lat and lng are required"}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError:
+            return Response({"error": "lat, lng, radius_km and limit must be numbers"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            return Response({"error": "lat must be within [-90, 90] and lng within [-180, 180]"}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 < radius_km <= NEARBY_MAX_RADIUS_KM:
+            return Response({"error": f"radius_km must be between 0 and {NEARBY_MAX_RADIUS_KM}"}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 < limit <= NEARBY_MAX_LIMIT:
+            return Response({"error": f"limit must be between 1 and {NEARBY_MAX_LIMIT}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        specialization = params.get("specialization") or None
+        if specialization and specialization not in dict(Doctor.SPECIALIZATION_CHOICES):
+            return Response({"error": f"Unknown specialization: {specialization}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        index = get_doctor_index()
+        if index is not None:
+            matches = index.search(latitude, longitude, radius_km, specialization=specialization, limit=limit)
+        else:
+            matches = nearby_doctors_from_db(latitude, longitude, radius_km, specialization=specialization, limit=limit)
+        doctors = self.queryset.in_bulk([doctor_id for doctor_id, _ in matches])
+        # The index can trail the database (a write not yet seen by this process), so
+        # matches are re-checked against the fetched rows and deleted doctors skipped
+        found = []
+        for doctor_id, _ in matches:
+            doctor = doctors.get(doctor_id)
+            if doctor is None or not doctor.is_available or doctor.latitude is None or doctor.longitude is None:
+                continue
+            if specialization and doctor.specialization != specialization:
+                continue
+            distance = haversine_km(latitude, longitude, float(doctor.latitude), float(doctor.longitude))
+            if distance <= radius_km:
+                found.append((distance, doctor))
+        found.sort(key=lambda match: match[0])
+        serializer = DoctorListSerializer([doctor for _, doctor in found], many=True, context=self.get_serializer_context())
+
+        results = []
+        for data, (distance, _) in zip(serializer.data, found):
+            data["distance_km"] = round(distance, 3)
+            results.append(data)
+        return Response({"origin": {"lat": latitude, "lng": longitude}, "radius_km": radius_km, "specialization": specialization, "count": len(results), "results": results})
+
     @action(detail=True, methods=["get"])
     def appointments(self, request, pk=None):
         """Get appointments for a specific doctor"""
@@ -89,18 +260,23 @@ class DoctorViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class PatientViewSet(viewsets.ModelViewSet):
+class PatientViewSet(SparseFieldsetViewSetMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing patients
     """
 
     queryset = Patient.objects.select_related("user").all()
     permission_classes = [permissions.IsAuthenticated]  # Patients data is sensitive
-    filter_backends = [SearchFilter, OrderingFilter, DjangoFilterBackend]
+    filter_backends = [FullTextSearchFilter, RankedOrderingFilter, DjangoFilterBackend]
     search_fields = ["user__first_name", "user__last_name", "patient_id", "phone"]
+    # ?search= uses this FTS5 table (search_fields is the LIKE fallback)
+    fulltext_index = "patients"
     ordering_fields = ["user__first_name", "created_at", "date_of_birth"]
     ordering = ["user__first_name"]
     filterset_fields = ["gender", "blood_group"]
+    pagination_class = KeysetOptInPagination
+    # ?cursor= switches to keyset pages in this order (see kellcare.pagination)
+    keyset_ordering = ("-created_at", "-id")
 
     def get_serializer_class(self):
         if self.action == "create":
@@ -132,18 +308,23 @@ class PatientViewSet(viewsets.ModelViewSet):
         )
 
 
-class AppointmentViewSet(viewsets.ModelViewSet):
+class AppointmentViewSet(SparseFieldsetViewSetMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing appointments
     """
 
     queryset = Appointment.objects.select_related("patient__user", "doctor__user").all()
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [SearchFilter, OrderingFilter, DjangoFilterBackend]
+    filter_backends = [FullTextSearchFilter, RankedOrderingFilter, DjangoFilterBackend]
     search_fields = ["patient__user__first_name", "patient__user__last_name", "doctor__user__first_name", "doctor__user__last_name", "reason"]
+    # ?search= uses this FTS5 table (search_fields is the LIKE fallback)
+    fulltext_index = "appointments"
     ordering_fields = ["appointment_date", "created_at", "status"]
     ordering = ["-appointment_date"]
     filterset_fields = ["status", "doctor", "patient"]
+    pagination_class = KeysetOptInPagination
+    # ?cursor= switches to keyset pages in this order (see kellcare.pagination)
+    keyset_ordering = ("-appointment_date", "-id")
 
     def get_serializer_class(self):
         if self.action == "create":
@@ -155,15 +336,16 @@ class AppointmentViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=["get"])
     def today(self, request):
         """Get today's appointments"""
-        today = datetime.now().date()
-        appointments = self.queryset.filter(appointment_date__date=today)
+        # A range on the column (not appointment_date__date) so the date index can be used
+        start = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        appointments = self.queryset.filter(appointment_date__gte=start, appointment_date__lt=start + timedelta(days=1))
         serializer = AppointmentListSerializer(appointments, many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=["get"])
     def upcoming(self, request):
         """Get upcoming appointments"""
-        now = datetime.now()
+        now = timezone.now()
         upcoming = self.queryset.filter(appointment_date__gte=now, status__in=["scheduled", "confirmed"])
         serializer = AppointmentListSerializer(upcoming, many=True)
         return Response(serializer.data)
@@ -218,7 +400,7 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class ContactMessageViewSet(viewsets.ModelViewSet):
+class ContactMessageViewSet(SparseFieldsetViewSetMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing contact messages
     """
@@ -226,11 +408,16 @@ class ContactMessageViewSet(viewsets.ModelViewSet):
     queryset = ContactMessage.objects.all()
     serializer_class = ContactMessageSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    filter_backends = [SearchFilter, OrderingFilter, DjangoFilterBackend]
+    filter_backends = [FullTextSearchFilter, RankedOrderingFilter, DjangoFilterBackend]
     search_fields = ["name", "email", "subject", "message"]
+    # ?search= uses this FTS5 table (search_fields is the LIKE fallback)
+    fulltext_index = "contact_messages"
     ordering_fields = ["created_at", "name", "is_read"]
     ordering = ["-created_at"]
     filterset_fields = ["is_read"]
+    pagination_class = KeysetOptInPagination
+    # ?cursor= switches to keyset pages in this order (see kellcare.pagination)
+    keyset_ordering = ("-created_at", "-id")
 
     def get_permissions(self):
         """
@@ -260,7 +447,7 @@ class ContactMessageViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class UserViewSet(viewsets.ReadOnlyModelViewSet):
+class UserViewSet(SparseFieldsetViewSetMixin, viewsets.ReadOnlyModelViewSet):
     """
     ViewSet for viewing users (read-only)
     """
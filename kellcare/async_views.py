@@ -0,0 +1,54 @@
+"""
+Async (ASGI-native) versions of the API-backed page views
+
+kellcare/urls.py routes to these instead of the sync views in views.py when
+KELLCARE_ASYNC_VIEWS is enabled. Context building is shared with the sync views;
+only the data fetching differs, so an ASGI worker can serve other requests while
+a page waits on the API.
+"""
+
+from asgiref.sync import sync_to_async
+from django.shortcuts import render
+
+from .api_client import afan_out, afetch_departments, afetch_doctors, afetch_stats_summary
+from .views import (
+    build_home_context,
+    build_locations_context,
+    build_nursing_homes_context,
+    build_urgent_care_context,
+    queue_missing_coordinates,
+)
+
+
+async def _render(request, template_name, context):
+    # Context processors may read the session or user, which are sync-only
+    return await sync_to_async(render)(request, template_name, context)
+
+
+async def home(request):
+    """Unified Home page with featured services and top medical talent"""
+    api_data = await afan_out({"doctors": afetch_doctors(request), "stats": afetch_stats_summary(request)})
+    return await _render(request, "kellcare/home.html", build_home_context(api_data["doctors"], api_data["stats"]))
+
+
+async def urgent_care(request):
+    """Urgent Care page view - specialized for emergency and urgent medical services"""
+    doctors_data = await afetch_doctors(request)
+    return await _render(request, "kellcare/urgent_care.html", build_urgent_care_context(doctors_data))
+
+
+async def locations(request):
+    """Locations page view - consuming Django REST Framework API"""
+    api_data = await afan_out({"departments": afetch_departments(request), "stats": afetch_stats_summary(request)})
+    return await _render(request, "kellcare/locations.html", build_locations_context(api_data["departments"], api_data["stats"]))
+
+
+async def nursing_homes(request):
+    """Nursing Homes page view - consuming Django REST Framework API and stored coordinates"""
+    api_data = await afan_out({"doctors": afetch_doctors(request), "departments": afetch_departments(request)})
+
+    # Enqueueing is non-blocking; the background worker resolves missing coordinates
+    queue_missing_coordinates(api_data["doctors"])
+
+    context = build_nursing_homes_context(api_data["doctors"], api_data["departments"])
+    return await _render(request, "kellcare/nursing_homes.html", context)
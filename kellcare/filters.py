@@ -0,0 +1,35 @@
+"""
+Filter backends for the KellCare API viewsets
+"""
+
+from rest_framework.filters import OrderingFilter, SearchFilter
+
+from .utils.fulltext import get_fulltext_index, match_expression
+
+
+class FullTextSearchFilter(SearchFilter):
+    """
+    ``?search=`` served from the view's FTS5 table (``fulltext_index``)
+
+    Every search term must match the start of a word in the indexed columns, and
+    matches carry a ``search_rank`` column (bm25, lower is better) that
+    RankedOrderingFilter sorts by. Without a usable index (full-text search
+    disabled, not SQLite, or the view sets no ``fulltext_index``) this is the
+    plain SearchFilter over ``search_fields``.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        index = get_fulltext_index(getattr(view, "fulltext_index", None))
+        expression = match_expression(self.get_search_terms(request))
+        if index is None or expression is None or queryset.model is not index.model:
+            return super().filter_queryset(request, queryset, view)
+        return index.filter(queryset, expression)
+
+
+class RankedOrderingFilter(OrderingFilter):
+    """OrderingFilter that keeps full-text matches best-first unless ``?ordering=`` is given"""
+
+    def filter_queryset(self, request, queryset, view):
+        if "search_rank" in queryset.query.extra_select and not request.query_params.get(self.ordering_param):
+            return queryset.order_by("search_rank", "pk")
+        return super().filter_queryset(request, queryset, view)
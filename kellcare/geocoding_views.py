@@ -5,9 +5,47 @@ Geocoding API views for converting addresses to coordinates
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework import status
-from .utils.geocoding import address_to_coordinates, coordinates_to_address
-from .models import Doctor, Patient
+from rest_framework import serializers, status
+from django.conf import settings
+from django.urls import reverse
+from .utils.gazetteer import get_gazetteer
+from .utils.geocode_cache import address_fingerprint, geocode_cache
+from .utils.geocoding_jobs import create_job, job_status, start_job_in_background
+from .utils.geocoding import PROVIDER_SERVICES, address_to_coordinates, coordinates_to_address, provider_concurrency
+from .utils.provider_health import provider_health_stats
+from .utils.rate_limiter import rate_limiter_stats
+from .models import Doctor, GeocodingJob, Patient
+
+# Values accepted for "service" (a single provider, or "chain" for KELLCARE_GEOCODE_CHAIN)
+GEOCODING_SERVICES = (*PROVIDER_SERVICES, "chain")
+
+
+class GeocodeServiceSerializer(serializers.Serializer):
+    """The optional "service" of a geocoding request"""
+
+    service = serializers.ChoiceField(choices=GEOCODING_SERVICES, default="nominatim")
+
+
+class BulkUpdateRequestSerializer(GeocodeServiceSerializer):
+    """Body of POST /api/geocode/bulk-update/ (flags accept JSON booleans and "true"/"false" form values)"""
+
+    update_doctors = serializers.BooleanField(default=True)
+    update_patients = serializers.BooleanField(default=True)
+    only_missing = serializers.BooleanField(default=False)
+    force = serializers.BooleanField(default=False)
+
+
+def _requested_service(request):
+    """
+    Validated "service" of a request
+
+    Returns:
+        tuple: (service, None), or (None, 400 Response) for an unknown service
+    """
+    options = GeocodeServiceSerializer(data=request.data)
+    if not options.is_valid():
+        return None, Response({"error": "Invalid geocoding service", "details": options.errors}, status=status.HTTP_400_BAD_REQUEST)
+    return options.validated_data["service"], None
 
 
 @api_view(["POST"])
@@ -19,11 +57,13 @@ def geocode_address(request):
     POST /api/geocode/address/
     {
         "address": "1600 Amphitheatre Parkway, Mountain View, CA",
-        "service": "nominatim"  // optional: "nominatim" or "google"
+        "service": "nominatim"  // optional: "nominatim", "google", "local" or "chain"
     }
     """
     address = request.data.get("address")
-    service = request.data.get("service", "nominatim")
+    service, error = _requested_service(request)
+    if error is not None:
+        return error
 
     if not address:
         return Response({"error": "Address is required"}, status=status.HTTP_400_BAD_REQUEST)
@@ -37,12 +77,26 @@ def geocode_address(request):
                 "latitude": result["latitude"],
                 "longitude": result["longitude"],
                 "formatted_address": result["formatted_address"],
-                "service_used": service,
+                "service_used": result["service_used"],
+                "provider": result["provider"],
+                "elapsed": result["elapsed"],
+                "rate_limit_wait": result.get("rate_limit_wait", 0.0),
                 "success": True,
             }
         )
     else:
-        return Response({"address": address, "error": result["error"], "service_used": service, "success": False}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            {
+                "address": address,
+                "error": result["error"],
+                "service_used": service,
+                "tried": result["tried"],
+                "elapsed": result["elapsed"],
+                "rate_limit_wait": result.get("rate_limit_wait", 0.0),
+                "success": False,
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
 
 
 @api_view(["POST"])
@@ -60,7 +114,9 @@ def reverse_geocode(request):
     """
     latitude = request.data.get("latitude")
     longitude = request.data.get("longitude")
-    service = request.data.get("service", "nominatim")
+    service, error = _requested_service(request)
+    if error is not None:
+        return error
 
     if latitude is None or longitude is None:
         return Response({"error": "Both latitude and longitude are required"}, status=status.HTTP_400_BAD_REQUEST)
@@ -74,10 +130,21 @@ def reverse_geocode(request):
     result = coordinates_to_address(latitude, longitude, service=service)
 
     if result["success"]:
-        return Response({"latitude": latitude, "longitude": longitude, "address": result["address"], "service_used": service, "success": True})
+        return Response(
+            {
+                "latitude": latitude,
+                "longitude": longitude,
+                "address": result["address"],
+                "service_used": result["service_used"],
+                "provider": result["provider"],
+                "elapsed": result["elapsed"],
+                "success": True,
+            }
+        )
     else:
         return Response(
-            {"latitude": latitude, "longitude": longitude, "error": result["error"], "service_used": service, "success": False}, status=status.HTTP_400_BAD_REQUEST
+            {"latitude": latitude, "longitude": longitude, "error": result["error"], "service_used": service, "tried": result["tried"], "elapsed": result["elapsed"], "success": False},
+            status=status.HTTP_400_BAD_REQUEST,
         )
 
 
@@ -94,7 +161,9 @@ def update_doctor_coordinates(request):
     }
     """
     doctor_id = request.data.get("doctor_id")
-    service = request.data.get("service", "nominatim")
+    service, error = _requested_service(request)
+    if error is not None:
+        return error
 
     if not doctor_id:
         return Response({"error": "doctor_id is required"}, status=status.HTTP_400_BAD_REQUEST)
@@ -112,6 +181,7 @@ def update_doctor_coordinates(request):
     if result["success"]:
         doctor.latitude = result["latitude"]
         doctor.longitude = result["longitude"]
+        doctor.address_fingerprint = address_fingerprint(doctor.address)
         doctor.save()
 
         return Response(
@@ -122,7 +192,9 @@ def update_doctor_coordinates(request):
                 "latitude": result["latitude"],
                 "longitude": result["longitude"],
                 "formatted_address": result["formatted_address"],
-                "service_used": service,
+                "service_used": result["service_used"],
+                "provider": result["provider"],
+                "elapsed": result["elapsed"],
                 "success": True,
                 "message": "Doctor coordinates updated successfully",
             }
@@ -154,7 +226,9 @@ def update_patient_coordinates(request):
     }
     """
     patient_id = request.data.get("patient_id")
-    service = request.data.get("service", "nominatim")
+    service, error = _requested_service(request)
+    if error is not None:
+        return error
 
     if not patient_id:
         return Response({"error": "patient_id is required"}, status=status.HTTP_400_BAD_REQUEST)
@@ -172,6 +246,7 @@ def update_patient_coordinates(request):
     if result["success"]:
         patient.latitude = result["latitude"]
         patient.longitude = result["longitude"]
+        patient.address_fingerprint = address_fingerprint(patient.address)
         patient.save()
 
         return Response(
@@ -182,7 +257,9 @@ def update_patient_coordinates(request):
                 "latitude": result["latitude"],
                 "longitude": result["longitude"],
                 "formatted_address": result["formatted_address"],
-                "service_used": service,
+                "service_used": result["service_used"],
+                "provider": result["provider"],
+                "elapsed": result["elapsed"],
                 "success": True,
                 "message": "Patient coordinates updated successfully",
             }
@@ -205,50 +282,67 @@ def update_patient_coordinates(request):
 @permission_classes([IsAuthenticated])
 def bulk_update_coordinates(request):
     """
-    Update coordinates for all doctors and patients
+    Start a background job updating coordinates for all doctors and patients
 
     POST /api/geocode/bulk-update/
     {
-        "service": "nominatim",  // optional
+        "service": "nominatim",  // optional: "nominatim", "google", "local" or "chain"
         "update_doctors": true,  // optional, default true
-        "update_patients": true  // optional, default true
+        "update_patients": true,  // optional, default true
+        "only_missing": false,  // optional, skip rows that already have coordinates
+        "force": false  // optional, also re-geocode rows whose address is unchanged
     }
+
+    Returns 202 with the job id; poll GET /api/geocode/jobs/<job_id>/ for progress.
     """
-    service = request.data.get("service", "nominatim")
-    update_doctors = request.data.get("update_doctors", True)
-    update_patients = request.data.get("update_patients", True)
-
-    results = {"doctors": {"updated": 0, "failed": 0, "errors": []}, "patients": {"updated": 0, "failed": 0, "errors": []}, "service_used": service}
-
-    # Update doctors
-    if update_doctors:
-        doctors = Doctor.objects.filter(address__isnull=False).exclude(address="")
-        for doctor in doctors:
-            result = address_to_coordinates(doctor.address, service=service)
-            if result["success"]:
-                doctor.latitude = result["latitude"]
-                doctor.longitude = result["longitude"]
-                doctor.save()
-                results["doctors"]["updated"] += 1
-            else:
-                results["doctors"]["failed"] += 1
-                results["doctors"]["errors"].append({"doctor_id": doctor.id, "doctor_name": doctor.user.get_full_name(), "error": result["error"]})
-
-    # Update patients
-    if update_patients:
-        patients = Patient.objects.filter(address__isnull=False).exclude(address="")
-        for patient in patients:
-            result = address_to_coordinates(patient.address, service=service)
-            if result["success"]:
-                patient.latitude = result["latitude"]
-                patient.longitude = result["longitude"]
-                patient.save()
-                results["patients"]["updated"] += 1
-            else:
-                results["patients"]["failed"] += 1
-                results["patients"]["errors"].append({"patient_id": patient.id, "patient_name": patient.user.get_full_name(), "error": result["error"]})
-
-    return Response({"message": "Bulk coordinate update completed", "results": results, "success": True})
+    options = BulkUpdateRequestSerializer(data=request.data)
+    if not options.is_valid():
+        return Response({"error": "Invalid bulk update options", "details": options.errors}, status=status.HTTP_400_BAD_REQUEST)
+    options = options.validated_data
+    service = options["service"]
+    targets = [name for name, flag in (("doctors", "update_doctors"), ("patients", "update_patients")) if options[flag]]
+
+    if not targets:
+        return Response({"error": "Nothing to update"}, status=status.HTTP_400_BAD_REQUEST)
+
+    job = create_job(
+        service=service,
+        targets=targets,
+        only_missing=options["only_missing"],
+        force=options["force"],
+        user=request.user,
+    )
+    if settings.KELLCARE_GEOCODE_IN_BACKGROUND:
+        # Claims the job first; a worker may already have picked it up, which is fine too
+        start_job_in_background(job)
+
+    return Response(
+        {
+            "message": "Bulk coordinate update started" if settings.KELLCARE_GEOCODE_IN_BACKGROUND else "Bulk coordinate update queued for a worker",
+            "job_id": job.pk,
+            "status": job.status,
+            "status_url": reverse("geocoding_job_status", kwargs={"job_id": job.pk}),
+            "service_used": service,
+            "success": True,
+        },
+        status=status.HTTP_202_ACCEPTED,
+    )
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def geocoding_job_status(request, job_id):
+    """
+    Report progress, throughput and errors of a bulk geocoding job
+
+    GET /api/geocode/jobs/<job_id>/
+    """
+    try:
+        job = GeocodingJob.objects.get(pk=job_id)
+    except GeocodingJob.DoesNotExist:
+        return Response({"error": "Job not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    return Response(job_status(job))
 
 
 @api_view(["GET"])
@@ -259,9 +353,8 @@ def geocoding_info(request):
 
     GET /api/geocode/info/
     """
-    from django.conf import settings
-
     google_api_key_configured = hasattr(settings, "GOOGLE_MAPS_API_KEY") and settings.GOOGLE_MAPS_API_KEY
+    gazetteer = get_gazetteer()
 
     return Response(
         {
@@ -283,6 +376,21 @@ def geocoding_info(request):
                     "available": google_api_key_configured,
                     "requires_api_key": True,
                 },
+                "local": {
+                    "name": "Local gazetteer (offline)",
+                    "cost": "Free",
+                    "rate_limit": "None",
+                    "accuracy": "Street, postal code or city centroid",
+                    "coverage": "Entries in KELLCARE_GAZETTEER_CSV",
+                    "available": gazetteer is not None,
+                    "entries": len(gazetteer) if gazetteer is not None else 0,
+                },
+                "chain": {
+                    "name": "Fallback chain",
+                    "order": settings.KELLCARE_GEOCODE_CHAIN,
+                    "failover": settings.KELLCARE_GEOCODE_FAILOVER,
+                    "available": True,
+                },
             },
             "default_service": "nominatim",
             "endpoints": {
@@ -291,6 +399,12 @@ def geocoding_info(request):
                 "update_doctor": "/api/geocode/doctor/update/",
                 "update_patient": "/api/geocode/patient/update/",
                 "bulk_update": "/api/geocode/bulk-update/",
+                "job_status": "/api/geocode/jobs/<job_id>/",
             },
+            "cache": geocode_cache.stats(),
+            "rate_limits": rate_limiter_stats(),
+            "concurrency": {service: provider_concurrency(service) for service in ("nominatim", "google", "local")},
+            "provider_health": provider_health_stats(),
         }
     )
+
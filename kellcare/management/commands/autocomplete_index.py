@@ -0,0 +1,24 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from kellcare.utils.autocomplete import AutocompleteIndex
+
+
+class Command(BaseCommand):
+    help = "Build the in-memory autocomplete index and report its size, build time and consistency with the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Compare the index with the database and fail on differences")
+
+    def handle(self, *args, **options):
+        index = AutocompleteIndex()
+        index.build()
+        self.stdout.write(json.dumps(index.stats(), indent=2))
+
+        if options["check"]:
+            report = index.check_consistency()
+            self.stdout.write(json.dumps(report, indent=2))
+            if not report["consistent"]:
+                raise CommandError("Autocomplete index does not match the database")
+            self.stdout.write(self.style.SUCCESS("Autocomplete index matches the database"))
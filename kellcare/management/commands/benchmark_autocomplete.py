@@ -0,0 +1,115 @@
+import datetime
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from kellcare.models import Patient
+from kellcare.utils.autocomplete import AutocompleteIndex
+
+FIRST_NAMES = "james mary john patricia robert jennifer michael linda william elizabeth david barbara richard susan joseph jessica thomas sarah".split()
+LAST_NAMES = "smith johnson williams brown jones garcia miller davis rodriguez martinez hernandez lopez gonzalez wilson anderson thomas taylor moore".split()
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Time autocomplete lookups (in-memory index and a LIKE query) and index updates against synthetic patients (rolled back afterwards)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--patients", type=int, nargs="+", default=[10_000, 100_000], help="Table sizes to measure")
+        parser.add_argument("--queries", type=int, default=500, help="Timed lookups per table size")
+        parser.add_argument("--limit", type=int, default=10, help="Suggestions per lookup")
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'patients':>10}{'index p50 us':>14}{'index p95 us':>14}{'like p50 ms':>13}{'refresh ms':>12}{'build s':>9}{'index MB':>10}"
+        )
+        try:
+            with transaction.atomic():
+                created = 0
+                for size in sorted(options["patients"]):
+                    self.create_patients(created, size - created)
+                    created = size
+                    self.measure(size, options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def create_patients(self, offset, count):
+        for start in range(0, count, 5000):
+            batch = range(offset + start, offset + min(start + 5000, count))
+            users = User.objects.bulk_create(
+                [User(username=f"bench-patient-{i}", first_name=random.choice(FIRST_NAMES).title(), last_name=random.choice(LAST_NAMES).title()) for i in batch]
+            )
+            Patient.objects.bulk_create(
+                [
+                    Patient(
+                        user=user,
+                        patient_id=f"BP-{i:07d}",
+                        date_of_birth=datetime.date(1980, 1, 1),
+                        gender="O",
+                        phone=f"555-{random.randint(0, 9999999):07d}",
+                        emergency_contact="Synthetic",
+                        emergency_phone="555-0000",
+                        address="Synthetic",
+                    )
+                    for i, user in zip(batch, users)
+                ]
+            )
+
+    def sample_queries(self, count):
+        """Prefixes of 1-4 characters as typed: names, "first last" pairs, patient ids and phone numbers"""
+        queries = []
+        for _ in range(count):
+            kind = random.random()
+            if kind < 0.5:
+                queries.append(random.choice(FIRST_NAMES + LAST_NAMES)[: random.randint(1, 4)])
+            elif kind < 0.7:
+                queries.append(f"{random.choice(FIRST_NAMES)} {random.choice(LAST_NAMES)[: random.randint(1, 3)]}")
+            elif kind < 0.85:
+                queries.append(f"BP-{random.randint(0, 99):02d}")
+            else:
+                queries.append(f"555-{random.randint(0, 999):03d}")
+        return queries
+
+    def like_lookup(self, query, limit):
+        condition = Q()
+        for word in query.split():
+            condition &= Q(user__first_name__istartswith=word) | Q(user__last_name__istartswith=word) | Q(patient_id__istartswith=word) | Q(phone__startswith=word)
+        return list(Patient.objects.filter(condition).values_list("id", flat=True)[:limit])
+
+    def measure(self, size, options):
+        index = AutocompleteIndex()
+        index.build()
+        index_timings, like_timings = [], []
+        for query in self.sample_queries(options["queries"]):
+            start = time.perf_counter()
+            index.search(query, limit=options["limit"])
+            index_timings.append((time.perf_counter() - start) * 1_000_000)
+        for query in self.sample_queries(min(options["queries"], 50)):
+            start = time.perf_counter()
+            self.like_lookup(query, options["limit"])
+            like_timings.append((time.perf_counter() - start) * 1000)
+
+        # Incremental refresh of one saved patient, as the post_save receiver runs it
+        patient_id = Patient.objects.order_by("?").values_list("id", flat=True).first()
+        update_timings = []
+        for _ in range(50):
+            start = time.perf_counter()
+            index.refresh(patient_ids=[patient_id])
+            update_timings.append((time.perf_counter() - start) * 1000)
+
+        index_timings.sort()
+        p95 = index_timings[min(len(index_timings) - 1, int(len(index_timings) * 0.95))]
+        memory_mb = index.memory_footprint()["total_bytes"] / 1024 / 1024
+        self.stdout.write(
+            f"{size:>10}{statistics.median(index_timings):>14.1f}{p95:>14.1f}{statistics.median(like_timings):>13.2f}"
+            f"{statistics.median(update_timings):>12.2f}{index.build_seconds:>9.2f}{memory_mb:>10.2f}"
+        )
@@ -0,0 +1,95 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.test import AsyncRequestFactory, RequestFactory, override_settings
+
+from kellcare import async_views, views
+from kellcare.api_client import InProcessTransport
+
+PAGES = ["home", "urgent_care", "locations", "nursing_homes"]
+
+
+@contextmanager
+def simulated_backend_latency(seconds):
+    """Make every in-process API call block for ``seconds``, like a remote backend would"""
+    original = InProcessTransport.request
+
+    def slow_request(self, *args, **kwargs):
+        time.sleep(seconds)
+        return original(self, *args, **kwargs)
+
+    if seconds:
+        InProcessTransport.request = slow_request
+    try:
+        yield
+    finally:
+        InProcessTransport.request = original
+
+
+class Command(BaseCommand):
+    help = "Compare concurrent page renders on one ASGI worker (async views) against a WSGI worker (sync views)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--page", choices=PAGES, default="home", help="Page to render")
+        parser.add_argument("--requests", type=int, default=100, help="Total page renders per mode")
+        parser.add_argument("--concurrency", type=int, default=25, help="Renders in flight at once on the ASGI worker")
+        parser.add_argument("--wsgi-threads", type=int, default=1, help="Threads of the WSGI worker")
+        parser.add_argument("--backend-latency-ms", type=float, default=50.0, help="Simulated latency added to every API call")
+        parser.add_argument("--host", type=str, default="127.0.0.1:8000", help="Host header for the rendered pages")
+
+    def handle(self, *args, **options):
+        total = options["requests"]
+        latency = options["backend_latency_ms"] / 1000
+
+        # Measure the views, not the response cache
+        with override_settings(KELLCARE_API_TRANSPORT="inprocess", KELLCARE_API_CACHE_DEFAULT_TTL=0, KELLCARE_API_CACHE_TTLS={}):
+            with simulated_backend_latency(latency):
+                wsgi_wall, wsgi_timings = self.run_wsgi(getattr(views, options["page"]), total, options["wsgi_threads"], options["host"])
+                asgi_wall, asgi_timings = asyncio.run(self.run_asgi(getattr(async_views, options["page"]), total, options["concurrency"], options["host"]))
+
+        self.stdout.write(f"{options['page']}: {total} renders, {options['backend_latency_ms']:.0f} ms simulated backend latency per API call")
+        self.stdout.write(f"{'mode':<28}{'wall s':>9}{'req/s':>9}{'mean ms':>10}{'p95 ms':>10}")
+        self.report(f"WSGI ({options['wsgi_threads']} thread)", wsgi_wall, wsgi_timings)
+        self.report(f"ASGI (concurrency {options['concurrency']})", asgi_wall, asgi_timings)
+
+    def report(self, label, wall, timings):
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(f"{label:<28}{wall:>9.2f}{len(timings) / wall:>9.1f}{statistics.mean(timings):>10.1f}{p95:>10.1f}")
+
+    def run_wsgi(self, view, total, threads, host):
+        factory = RequestFactory()
+
+        def render_once(_):
+            request = factory.get("/", HTTP_HOST=host)
+            request.user = AnonymousUser()
+            start = time.perf_counter()
+            view(request)
+            return (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            timings = list(executor.map(render_once, range(total)))
+        return time.perf_counter() - start, timings
+
+    async def run_asgi(self, view, total, concurrency, host):
+        factory = AsyncRequestFactory()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def render_once():
+            async with semaphore:
+                request = factory.get("/")
+                request.META["HTTP_HOST"] = host
+                request.user = AnonymousUser()
+                start = time.perf_counter()
+                await view(request)
+                return (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        timings = await asyncio.gather(*(render_once() for _ in range(total)))
+        return time.perf_counter() - start, list(timings)
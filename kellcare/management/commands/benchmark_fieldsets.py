@@ -0,0 +1,67 @@
+import json
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from kellcare.api_client import InProcessTransport
+
+# endpoint -> {mode name: query params}
+MODES = {
+    "/api/doctors/": {
+        "default": {},
+        "sparse": {"fields": "id,name,specialization"},
+        "expanded": {"expand": "user,department"},
+    },
+    "/api/patients/": {
+        "default": {},
+        "sparse": {"fields": "id,name,patient_id"},
+        "expanded": {"expand": "user"},
+    },
+    "/api/appointments/": {
+        "default": {},
+        "sparse": {"fields": "id,appointment_date,status"},
+        "expanded": {"expand": "patient,doctor"},
+    },
+}
+
+
+class Command(BaseCommand):
+    help = "Report payload size, SQL and latency for default, sparse (?fields=) and expanded (?expand=) API responses"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--username", type=str, help="User whose API token authenticates the requests", default="admin")
+        parser.add_argument("--iterations", type=int, default=20, help="Timed requests per endpoint and mode")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["username"])
+        except User.DoesNotExist:
+            self.stdout.write(self.style.ERROR(f'User "{options["username"]}" does not exist.'))
+            return
+
+        token, _ = Token.objects.get_or_create(user=user)
+        transport = InProcessTransport("http://127.0.0.1:8000", token.key)
+
+        self.stdout.write(f"{'endpoint':<22}{'mode':<10}{'bytes':>10}{'queries':>9}{'sql bytes':>11}{'mean ms':>10}{'p50 ms':>10}")
+        for endpoint, modes in MODES.items():
+            for mode, params in modes.items():
+                with CaptureQueriesContext(connection) as queries:
+                    data = transport.request("GET", endpoint, params=params)
+                payload_bytes = len(json.dumps(data, separators=(",", ":")))
+                sql_bytes = sum(len(query["sql"]) for query in queries.captured_queries)
+
+                timings = []
+                for _ in range(options["iterations"]):
+                    start = time.perf_counter()
+                    transport.request("GET", endpoint, params=params)
+                    timings.append((time.perf_counter() - start) * 1000)
+
+                self.stdout.write(
+                    f"{endpoint:<22}{mode:<10}{payload_bytes:>10}{len(queries):>9}{sql_bytes:>11}"
+                    f"{statistics.mean(timings):>10.2f}{statistics.median(timings):>10.2f}"
+                )
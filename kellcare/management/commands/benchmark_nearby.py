@@ -0,0 +1,99 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from kellcare.models import Doctor
+from kellcare.utils.doctor_search import nearby_doctors_from_db
+from kellcare.utils.geo import KM_PER_DEGREE_LATITUDE
+from kellcare.utils.spatial_index import DoctorSpatialIndex
+
+# Synthetic doctors are scattered around Asheville, NC
+CENTER = (35.5951, -82.5515)
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Time /api/doctors/nearby/ searches (database and in-memory index) against synthetic doctors (rolled back afterwards)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--doctors", type=int, nargs="+", default=[1000, 10000, 100000], help="Table sizes to measure")
+        parser.add_argument("--spread-km", type=float, default=300.0, help="Synthetic doctors are placed within this distance of the centre")
+        parser.add_argument("--radius-km", type=float, default=10.0, help="Search radius")
+        parser.add_argument("--queries", type=int, default=200, help="Timed searches per table size")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'doctors':>10}{'results':>10}{'db mean ms':>12}{'db p95 ms':>11}{'index mean ms':>15}{'index p95 ms':>14}{'build s':>9}{'index MB':>10}")
+        try:
+            with transaction.atomic():
+                created = 0
+                for size in sorted(options["doctors"]):
+                    self.create_doctors(created, size - created, options["spread_km"])
+                    created = size
+                    self.measure(size, options)
+                self.explain(options["radius_km"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def create_doctors(self, offset, count, spread_km):
+        spread = spread_km / KM_PER_DEGREE_LATITUDE
+        specializations = [choice for choice, _ in Doctor.SPECIALIZATION_CHOICES]
+        for start in range(0, count, 5000):
+            batch = range(offset + start, offset + min(start + 5000, count))
+            users = User.objects.bulk_create([User(username=f"bench-doctor-{i}") for i in batch])
+            Doctor.objects.bulk_create(
+                [
+                    Doctor(
+                        user=user,
+                        license_number=f"BENCH{i}",
+                        specialization=random.choice(specializations),
+                        phone="555-0000",
+                        address="Synthetic",
+                        latitude=round(CENTER[0] + random.uniform(-spread, spread), 6),
+                        longitude=round(CENTER[1] + random.uniform(-spread, spread), 6),
+                        is_available=random.random() < 0.8,
+                    )
+                    for i, user in zip(batch, users)
+                ]
+            )
+
+    def measure(self, size, options):
+        index = DoctorSpatialIndex()
+        index.build()
+        searches = {"db": nearby_doctors_from_db, "index": index.search}
+        timings = {name: [] for name in searches}
+        results = []
+        for _ in range(options["queries"]):
+            lat = CENTER[0] + random.uniform(-0.5, 0.5)
+            lng = CENTER[1] + random.uniform(-0.5, 0.5)
+            matches = {}
+            for name, search in searches.items():
+                start = time.perf_counter()
+                matches[name] = search(lat, lng, options["radius_km"], limit=10)
+                timings[name].append((time.perf_counter() - start) * 1000)
+            if [doctor_id for doctor_id, _ in matches["db"]] != [doctor_id for doctor_id, _ in matches["index"]]:
+                self.stderr.write(f"Index and database disagree at ({lat:.4f}, {lng:.4f})")
+            results.append(len(matches["db"]))
+
+        columns = []
+        for name in searches:
+            samples = sorted(timings[name])
+            p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+            columns.append(f"{statistics.mean(samples):>{12 if name == 'db' else 15}.3f}{p95:>{11 if name == 'db' else 14}.3f}")
+        memory_mb = index.memory_footprint()["total_bytes"] / 1024 / 1024
+        self.stdout.write(f"{size:>10}{statistics.mean(results):>10.1f}{''.join(columns)}{index.build_seconds:>9.2f}{memory_mb:>10.2f}")
+
+    def explain(self, radius_km):
+        queryset = Doctor.objects.filter(latitude__gte=CENTER[0] - radius_km / KM_PER_DEGREE_LATITUDE, latitude__lte=CENTER[0] + radius_km / KM_PER_DEGREE_LATITUDE, is_available=True)
+        sql, params = queryset.order_by().values_list("id", "latitude", "longitude").query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            plan = " / ".join(row[-1] for row in cursor.fetchall())
+        self.stdout.write(f"Query plan: {plan}")
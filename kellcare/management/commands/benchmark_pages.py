@@ -0,0 +1,58 @@
+import statistics
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+
+from kellcare import views
+from kellcare.api_client import get_client_stats
+
+PAGES = {
+    "home": views.home,
+    "urgent_care": views.urgent_care,
+    "locations": views.locations,
+    "nursing_homes": views.nursing_homes,
+}
+
+
+class Command(BaseCommand):
+    help = "Compare page render latency for the in-process and HTTP API client transports"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pages", nargs="+", choices=sorted(PAGES), default=sorted(PAGES), help="Pages to render")
+        parser.add_argument("--transports", nargs="+", choices=["inprocess", "http"], default=["inprocess", "http"], help="Transports to compare")
+        parser.add_argument("--iterations", type=int, default=20, help="Timed renders per page and transport")
+        parser.add_argument("--warmup", type=int, default=2, help="Untimed renders before measuring")
+        parser.add_argument(
+            "--base-url",
+            type=str,
+            default="http://127.0.0.1:8000",
+            help="Server the HTTP transport talks to (must be running, e.g. via runserver)",
+        )
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        host = options["base_url"].split("://", 1)[-1].rstrip("/")
+
+        self.stdout.write(f"{'page':<16}{'transport':<12}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+        for page in options["pages"]:
+            view = PAGES[page]
+            for transport in options["transports"]:
+                with override_settings(KELLCARE_API_TRANSPORT=transport):
+                    timings = []
+                    for i in range(options["warmup"] + options["iterations"]):
+                        request = factory.get("/", HTTP_HOST=host)
+                        request.user = AnonymousUser()
+                        start = time.perf_counter()
+                        view(request)
+                        if i >= options["warmup"]:
+                            timings.append((time.perf_counter() - start) * 1000)
+
+                timings.sort()
+                p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                self.stdout.write(f"{page:<16}{transport:<12}{statistics.mean(timings):>10.2f}{statistics.median(timings):>10.2f}{p95:>10.2f}")
+
+        if "http" in options["transports"]:
+            self.stdout.write(f"HTTP session pool: {get_client_stats()}")
+            self.stdout.write(self.style.WARNING(f"HTTP numbers assume a server is listening on {options['base_url']}"))
@@ -0,0 +1,106 @@
+import datetime
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from kellcare.api_views import AppointmentViewSet
+from kellcare.models import Appointment, Doctor, Patient
+from kellcare.pagination import KeysetPagination
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Compare page-number and keyset (?cursor=) latency at increasing depth of /api/appointments/ on synthetic appointments (rolled back afterwards)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--appointments", type=int, default=100_000, help="Synthetic appointments to create")
+        parser.add_argument("--page-size", type=int, default=20, help="Rows per page")
+        parser.add_argument("--depths", type=int, nargs="+", default=[1, 10, 100, 1000, 4000], help="Page numbers to time")
+        parser.add_argument("--repeat", type=int, default=5, help="Timed requests per depth and mode")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                client = self.setup(options["appointments"])
+                self.measure(client, options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def setup(self, count):
+        user = User.objects.create_superuser("bench-pagination", "bench@example.com", None)
+        patients, doctors = list(Patient.objects.all()[:50]), list(Doctor.objects.all()[:50])
+        if not patients or not doctors:
+            raise SystemExit("Needs at least one patient and one doctor")
+        start = timezone.now() - datetime.timedelta(days=3650)
+        for offset in range(0, count, 5000):
+            Appointment.objects.bulk_create(
+                [
+                    Appointment(
+                        patient=random.choice(patients),
+                        doctor=random.choice(doctors),
+                        # Whole hours so many rows share an appointment_date and the id tie-breaker matters
+                        appointment_date=start + datetime.timedelta(hours=random.randint(0, 3650 * 24)),
+                        reason="Synthetic",
+                    )
+                    for _ in range(min(5000, count - offset))
+                ]
+            )
+        client = Client(HTTP_HOST="127.0.0.1")
+        client.force_login(user)
+        return client
+
+    def time_request(self, client, url, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 200, response.content[:200]
+        return statistics.median(timings)
+
+    def measure(self, client, options):
+        page_size = options["page_size"]
+        total = Appointment.objects.count()
+        self.stdout.write(f"{total} appointments, {page_size} per page")
+        self.stdout.write(f"{'page':>8}{'page number ms':>16}{'keyset ms':>12}")
+
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "PAGE_SIZE": page_size}):
+            # The keyset walk to each depth is untimed; it continues from the previous depth
+            url, page = f"/api/appointments/?cursor=&page_size={page_size}", 1
+            for depth in sorted(options["depths"]):
+                if (depth - 1) * page_size >= total:
+                    break
+                while page < depth:
+                    url, page = client.get(url).json()["next"], page + 1
+                offset_ms = self.time_request(client, f"/api/appointments/?page={depth}", options["repeat"])
+                keyset_ms = self.time_request(client, url, options["repeat"])
+                self.stdout.write(f"{depth:>8}{offset_ms:>16.2f}{keyset_ms:>12.2f}")
+
+        self.explain(url)
+
+    def explain(self, url):
+        """Query plan of the keyset query behind the deepest page"""
+        request = APIRequestFactory().get(url)
+        paginator = KeysetPagination()
+        paginator.keyset = AppointmentViewSet.keyset_ordering
+        paginator.fields = [Appointment._meta.get_field(name.lstrip("-")) for name in paginator.keyset]
+        _, values, reverse = paginator.decode_cursor(Request(request))
+        queryset = Appointment.objects.filter(paginator.seek_filter(values, reverse)).order_by("-appointment_date", "-id").values_list("id")[:21]
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            plan = " / ".join(row[-1] for row in cursor.fetchall())
+        self.stdout.write(f"Keyset query plan: {plan}")
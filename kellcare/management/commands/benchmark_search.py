@@ -0,0 +1,91 @@
+import datetime
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from kellcare.models import Appointment, Doctor, Patient
+from kellcare.utils.fulltext import FULLTEXT_INDEXES, fulltext_available
+
+REASON_WORDS = (
+    "annual checkup follow up chest pain headache migraine rash fever cough back knee injury "
+    "vaccination prescription refill blood pressure diabetes review allergy asthma fatigue dizziness"
+).split()
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Compare ?search= latency on /api/appointments/ for the FTS5 index and the LIKE scan on synthetic appointments (rolled back afterwards)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--appointments", type=int, nargs="+", default=[10_000, 100_000], help="Table sizes to measure")
+        parser.add_argument("--queries", nargs="+", default=["migraine", "blood press", "vacc"], help="Search strings to time")
+        parser.add_argument("--repeat", type=int, default=5, help="Timed requests per query and backend")
+
+    def handle(self, *args, **options):
+        if not fulltext_available():
+            raise CommandError("Full-text search is not available (needs SQLite with FTS5 and migration 0009)")
+        try:
+            with transaction.atomic():
+                client = self.client()
+                created = 0
+                self.stdout.write(f"{'appointments':>13}  {'query':<14}{'matches':>9}{'fts ms':>9}{'like ms':>10}")
+                for size in sorted(options["appointments"]):
+                    self.create_appointments(size - created)
+                    created = size
+                    # bulk_create skips the sync signals
+                    FULLTEXT_INDEXES["appointments"].rebuild()
+                    for query in options["queries"]:
+                        self.measure(client, size, query, options["repeat"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def client(self):
+        user = User.objects.create_superuser("bench-search", "bench@example.com", None)
+        client = Client(HTTP_HOST="127.0.0.1")
+        client.force_login(user)
+        return client
+
+    def create_appointments(self, count):
+        patients, doctors = list(Patient.objects.all()[:50]), list(Doctor.objects.all()[:50])
+        if not patients or not doctors:
+            raise CommandError("Needs at least one patient and one doctor")
+        start = timezone.now() - datetime.timedelta(days=3650)
+        for offset in range(0, count, 5000):
+            Appointment.objects.bulk_create(
+                [
+                    Appointment(
+                        patient=random.choice(patients),
+                        doctor=random.choice(doctors),
+                        appointment_date=start + datetime.timedelta(minutes=random.randint(0, 3650 * 24 * 60)),
+                        reason=" ".join(random.sample(REASON_WORDS, 4)),
+                    )
+                    for _ in range(min(5000, count - offset))
+                ]
+            )
+
+    def time_search(self, client, query, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = client.get("/api/appointments/", {"search": query})
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings), response.json()["count"]
+
+    def measure(self, client, size, query, repeat):
+        fts_ms, matches = self.time_search(client, query, repeat)
+        with override_settings(KELLCARE_FULLTEXT_SEARCH=False):
+            like_ms, like_matches = self.time_search(client, query, repeat)
+        self.stdout.write(f"{size:>13}  {query:<14}{matches:>9}{fts_ms:>9.2f}{like_ms:>10.2f}")
+        if matches != like_matches:
+            # LIKE matches substrings anywhere; full-text search matches word prefixes
+            self.stdout.write(self.style.WARNING(f"{'':>15}LIKE found {like_matches}"))
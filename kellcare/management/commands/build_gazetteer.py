@@ -0,0 +1,47 @@
+import os
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from kellcare.utils.gazetteer import LocalGazetteer, reset_gazetteer
+
+
+class Command(BaseCommand):
+    help = "Build the local gazetteer index from a CSV of postal codes, cities and street centroids"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--csv", type=str, default=None, help="Gazetteer CSV (defaults to KELLCARE_GAZETTEER_CSV)")
+        parser.add_argument("--output", type=str, default=None, help="Index file (defaults to KELLCARE_GAZETTEER_INDEX or <csv>.idx)")
+        parser.add_argument("--benchmark", nargs="*", metavar="ADDRESS", help="Time lookups of these addresses against the new index")
+        parser.add_argument("--iterations", type=int, default=1000, help="Lookups per address when benchmarking")
+
+    def handle(self, *args, **options):
+        csv_path = options["csv"] or settings.KELLCARE_GAZETTEER_CSV
+        if not os.path.exists(csv_path):
+            raise CommandError(f"Gazetteer CSV {csv_path} does not exist")
+        index_path = options["output"] or settings.KELLCARE_GAZETTEER_INDEX or os.path.splitext(csv_path)[0] + ".idx"
+
+        start = time.perf_counter()
+        gazetteer = LocalGazetteer.from_csv(csv_path)
+        gazetteer.save(index_path)
+        reset_gazetteer()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Indexed {len(gazetteer)} entries into {index_path} ({os.path.getsize(index_path) / 1024:.1f} KiB) in {time.perf_counter() - start:.2f}s"
+            )
+        )
+
+        start = time.perf_counter()
+        LocalGazetteer.load(csv_path, index_path)
+        self.stdout.write(f"Index loads in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        for address in options["benchmark"] or []:
+            timings = []
+            for _ in range(options["iterations"]):
+                start = time.perf_counter()
+                location = gazetteer.geocode(address)
+                timings.append((time.perf_counter() - start) * 1_000_000)
+            match = f"{location.address} ({location.latitude}, {location.longitude}, {location.raw['kind']})" if location else "no match"
+            self.stdout.write(f"{address!r}: {match}; mean {statistics.mean(timings):.1f} µs, max {max(timings):.1f} µs")
@@ -0,0 +1,66 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from kellcare.models import GeocodingJob
+from kellcare.utils.geocoding_jobs import TARGETS, claim_job, claim_next_job, create_job, job_status, run_job
+
+
+class Command(BaseCommand):
+    help = "Run resumable bulk geocoding jobs (new, resumed by id, or as a polling worker)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--targets", nargs="+", choices=sorted(TARGETS), default=sorted(TARGETS), help="Rows to geocode for a new job")
+        parser.add_argument("--service", type=str, default="nominatim", help="Geocoding service for a new job")
+        parser.add_argument("--only-missing", action="store_true", help="Skip rows that already have coordinates")
+        parser.add_argument("--force", action="store_true", help="Also re-geocode rows whose address is unchanged since their coordinates were set")
+        parser.add_argument("--chunk-size", type=int, default=None, help="Rows per checkpoint")
+        parser.add_argument("--resume", type=int, metavar="JOB_ID", help="Resume an existing job from its last checkpoint")
+        parser.add_argument("--worker", action="store_true", help="Keep running jobs queued by the API (and jobs abandoned by dead workers)")
+        parser.add_argument("--poll-interval", type=float, default=5.0, help="Seconds between checks for new jobs in --worker mode")
+
+    def handle(self, *args, **options):
+        if options["worker"]:
+            self.stdout.write("Waiting for geocoding jobs (Ctrl+C to stop)")
+            while True:
+                job = claim_next_job()
+                if job is None:
+                    time.sleep(options["poll_interval"])
+                    continue
+                self.report(run_job(job))
+
+        if options["resume"]:
+            try:
+                job = GeocodingJob.objects.get(pk=options["resume"])
+            except GeocodingJob.DoesNotExist:
+                raise CommandError(f"Geocoding job {options['resume']} does not exist")
+            if job.status == "completed":
+                raise CommandError(f"Geocoding job {job.pk} already completed")
+            if not claim_job(job):
+                raise CommandError(f"Geocoding job {job.pk} is already running (last heartbeat {job.heartbeat_at:%Y-%m-%d %H:%M:%S})")
+        else:
+            job = create_job(
+                service=options["service"],
+                targets=options["targets"],
+                only_missing=options["only_missing"],
+                chunk_size=options["chunk_size"],
+                force=options["force"],
+            )
+            # Claim it before a --worker polling for pending jobs can
+            claim_job(job)
+            self.stdout.write(f"Created geocoding job {job.pk}")
+
+        self.report(run_job(job))
+
+    def report(self, job):
+        status = job_status(job)
+        style = self.style.SUCCESS if job.status == "completed" else self.style.ERROR
+        self.stdout.write(style(f"Job {job.pk} {job.status}: {status['processed']}/{status['total']} rows in {status['elapsed_seconds']}s ({status['rows_per_second']} rows/s)"))
+        for name, progress in status["progress"].items():
+            self.stdout.write(f"  {name}: {progress['updated']} updated, {progress['failed']} failed, {progress.get('skipped', 0)} unchanged")
+        dedup = status["dedup"]
+        self.stdout.write(
+            f"  {dedup['lookups']} provider lookups and {dedup.get('cache_hits', 0)} cache hits for {dedup['rows']} rows (dedup ratio {dedup['dedup_ratio']:.1%}, {dedup['saved_calls']} remote calls saved)"
+        )
+        if job.error:
+            self.stdout.write(self.style.ERROR(f"  {job.error} (resume with --resume {job.pk})"))
@@ -0,0 +1,25 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from kellcare.utils.spatial_index import DoctorSpatialIndex
+
+
+class Command(BaseCommand):
+    help = "Build the in-memory doctor spatial index and report its size, build time and consistency with the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cell-degrees", type=float, default=None, help="Grid cell size (defaults to KELLCARE_DOCTOR_INDEX_CELL_DEGREES)")
+        parser.add_argument("--check", action="store_true", help="Compare the index with the database and fail on differences")
+
+    def handle(self, *args, **options):
+        index = DoctorSpatialIndex(options["cell_degrees"])
+        index.build()
+        self.stdout.write(json.dumps(index.stats(), indent=2))
+
+        if options["check"]:
+            report = index.check_consistency()
+            self.stdout.write(json.dumps(report, indent=2))
+            if not report["consistent"]:
+                raise CommandError("Doctor spatial index does not match the database")
+            self.stdout.write(self.style.SUCCESS("Doctor spatial index matches the database"))
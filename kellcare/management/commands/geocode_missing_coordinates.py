@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from kellcare.models import Doctor, Patient
+from kellcare.utils.geocoding_queue import needs_coordinates, resolve_coordinates
+
+MODELS = {"doctors": Doctor, "patients": Patient}
+
+# Rows read per query
+CHUNK_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = "Geocode doctors and patients whose coordinates are missing or were geocoded from an older address (run from cron or a worker)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--models", nargs="+", choices=sorted(MODELS), default=sorted(MODELS), help="Which rows to geocode")
+        parser.add_argument("--service", type=str, default=None, help="Geocoding service (defaults to KELLCARE_GEOCODE_SERVICE)")
+        parser.add_argument("--limit", type=int, default=None, help="Maximum rows to geocode per model")
+
+    def handle(self, *args, **options):
+        for name in options["models"]:
+            # Outdated coordinates can only be told apart in Python (fingerprint of the normalized address),
+            # so rows are read in primary-key order, CHUNK_SIZE at a time, and checked here
+            model = MODELS[name]
+            rows = model.objects.exclude(address="").order_by("pk").only("id", "address", "latitude", "longitude", "address_fingerprint")
+            limit = options["limit"]
+
+            resolved = failed = 0
+            last_pk = 0
+            while limit is None or resolved + failed < limit:
+                chunk = list(rows.filter(pk__gt=last_pk)[:CHUNK_SIZE])
+                if not chunk:
+                    break
+                last_pk = chunk[-1].pk
+                for instance in chunk:
+                    if not needs_coordinates(instance):
+                        continue
+                    if limit is not None and resolved + failed >= limit:
+                        break
+                    result = resolve_coordinates(instance, service=options["service"])
+                    if result["success"]:
+                        resolved += 1
+                    else:
+                        failed += 1
+                        self.stdout.write(self.style.WARNING(f"{name} #{instance.pk}: {result['error']}"))
+
+            self.stdout.write(self.style.SUCCESS(f"{name}: {resolved} geocoded, {failed} failed"))
@@ -0,0 +1,102 @@
+import csv
+import json
+import random
+from array import array
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from kellcare.models import NetworkReport
+from kellcare.utils.network_planning import claim_pending_report, load_specialist_indexes, nearest_specialists, patient_coordinate_chunks, run_report
+from kellcare.utils.spatial_index import SPECIALIZATIONS
+
+
+class Command(BaseCommand):
+    help = "Assign every patient its nearest available doctors per specialization and report doctor catchments"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--k", type=int, default=1, help="Doctors to assign per patient and specialization")
+        parser.add_argument("--specializations", nargs="+", choices=SPECIALIZATIONS, default=None, help="Specializations to report (default: all)")
+        parser.add_argument("--chunk-size", type=int, default=50_000, help="Patients held in memory at a time")
+        parser.add_argument("--assignments", type=str, default=None, help="CSV file for the nearest-k assignments (patient_id,specialization,rank,doctor_id,distance_km)")
+        parser.add_argument("--report", type=str, default=None, help="JSON file for the catchment report (printed when omitted)")
+        parser.add_argument(
+            "--synthetic-patients",
+            type=int,
+            default=0,
+            help="Use this many random patients spread over the doctors' bounding box instead of the patient table (for timing)",
+        )
+        parser.add_argument("--store", action="store_true", help="Save the report for /api/stats/nearest-specialists/ (all or one specialization)")
+        parser.add_argument("--run-pending", action="store_true", help="Build the reports staff queued through the API, then exit")
+
+    def synthetic_chunks(self, count, chunk_size, indexes):
+        latitudes = [lat for index in indexes.values() for lat in index.latitudes]
+        longitudes = [lng for index in indexes.values() for lng in index.longitudes]
+        if not latitudes:
+            return
+        lat_range, lng_range = (min(latitudes), max(latitudes)), (min(longitudes), max(longitudes))
+        for start in range(0, count, chunk_size):
+            size = min(chunk_size, count - start)
+            yield (
+                array("q", range(start + 1, start + size + 1)),
+                array("d", (random.uniform(*lat_range) for _ in range(size))),
+                array("d", (random.uniform(*lng_range) for _ in range(size))),
+            )
+
+    def handle(self, *args, **options):
+        if options["run_pending"]:
+            while (report := claim_pending_report()) is not None:
+                run_report(report)
+                style = self.style.SUCCESS if report.status == "completed" else self.style.ERROR
+                self.stdout.write(style(f"Report #{report.pk} (k={report.k}, {report.specialization or 'all'}): {report.status}"))
+            return
+
+        if options["store"]:
+            if options["synthetic_patients"]:
+                raise CommandError("--store cannot be combined with --synthetic-patients")
+            if options["specializations"] and len(options["specializations"]) > 1:
+                raise CommandError("--store takes all specializations or exactly one")
+
+        started_at = timezone.now()
+        indexes = load_specialist_indexes(options["specializations"])
+        if options["synthetic_patients"]:
+            chunks = self.synthetic_chunks(options["synthetic_patients"], options["chunk_size"], indexes)
+        else:
+            chunks = patient_coordinate_chunks(options["chunk_size"])
+
+        writer = handle = None
+        on_assignment = None
+        if options["assignments"]:
+            handle = open(options["assignments"], "w", newline="")
+            writer = csv.writer(handle)
+            writer.writerow(["patient_id", "specialization", "rank", "doctor_id", "distance_km"])
+
+            def on_assignment(patient_id, specialization, matches):
+                writer.writerows((patient_id, specialization, rank, doctor_id, f"{distance:.3f}") for rank, (doctor_id, distance) in enumerate(matches, start=1))
+
+        try:
+            report = nearest_specialists(chunks, indexes, k=options["k"], on_assignment=on_assignment)
+        finally:
+            if handle is not None:
+                handle.close()
+
+        if options["store"]:
+            stored = NetworkReport.objects.create(
+                k=options["k"],
+                specialization=options["specializations"][0] if options["specializations"] else "",
+                status="completed",
+                report=report,
+                started_at=started_at,
+                finished_at=timezone.now(),
+            )
+            self.stdout.write(f"Stored report #{stored.pk}")
+
+        if options["report"]:
+            with open(options["report"], "w") as output:
+                json.dump(report, output, indent=2)
+        else:
+            self.stdout.write(json.dumps(report, indent=2))
+
+        self.stdout.write(
+            self.style.SUCCESS(f"{report['patients']} patients x {len(indexes)} specializations (k={report['k']}) in {report['elapsed_seconds']}s")
+        )
@@ -0,0 +1,37 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from kellcare.utils.fulltext import FULLTEXT_INDEXES, fulltext_available
+
+
+class Command(BaseCommand):
+    help = "Report or rebuild the full-text search tables (needed after bulk writes, which bypass the sync signals)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("indexes", nargs="*", help=f"Indexes to process: {', '.join(FULLTEXT_INDEXES)} (default: all)")
+        parser.add_argument("--rebuild", action="store_true", help="Re-read every row from the model tables")
+        parser.add_argument("--check", action="store_true", help="Fail if an index holds a different number of rows than its table")
+
+    def handle(self, *args, **options):
+        if not fulltext_available():
+            raise CommandError("Full-text search is not available (needs SQLite with FTS5, migration 0009 and KELLCARE_FULLTEXT_SEARCH)")
+
+        unknown = set(options["indexes"]) - set(FULLTEXT_INDEXES)
+        if unknown:
+            raise CommandError(f"Unknown indexes: {', '.join(sorted(unknown))}")
+
+        report = {}
+        for name in options["indexes"] or FULLTEXT_INDEXES:
+            index = FULLTEXT_INDEXES[name]
+            if options["rebuild"]:
+                index.rebuild()
+            report[name] = {"indexed": index.indexed_rows(), "rows": index.model._base_manager.count()}
+        self.stdout.write(json.dumps(report, indent=2))
+
+        stale = [name for name, counts in report.items() if counts["indexed"] != counts["rows"]]
+        if options["check"] and stale:
+            raise CommandError(f"Out of sync: {', '.join(stale)} (run with --rebuild)")
+        if options["rebuild"]:
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {', '.join(report)}"))
+
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kellcare', '0002_doctor_latitude_doctor_longitude_patient_latitude_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodeCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('forward', 'Address to coordinates'), ('reverse', 'Coordinates to address')], max_length=10)),
+                ('provider', models.CharField(max_length=20)),
+                ('query_hash', models.CharField(help_text='SHA-256 of the normalized query', max_length=64)),
+                ('normalized_query', models.TextField()),
+                ('success', models.BooleanField(default=True)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('address', models.TextField(blank=True, help_text='Formatted address returned by the provider')),
+                ('error', models.CharField(blank=True, max_length=200)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'unique_together': {('kind', 'provider', 'query_hash')},
+            },
+        ),
+    ]
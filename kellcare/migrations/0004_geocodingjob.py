@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('kellcare', '0003_geocodecacheentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodingJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], db_index=True, default='pending', max_length=20)),
+                ('service', models.CharField(default='nominatim', max_length=20)),
+                ('targets', models.JSONField(default=list, help_text='Row types to geocode, e.g. ["doctors", "patients"]')),
+                ('only_missing', models.BooleanField(default=False, help_text='Skip rows that already have coordinates')),
+                ('chunk_size', models.PositiveIntegerField(default=100)),
+                ('progress', models.JSONField(default=dict, help_text='Checkpoint and counters per target')),
+                ('errors', models.JSONField(default=list, help_text='Most recent per-row errors')),
+                ('error', models.TextField(blank=True, help_text='Why the job stopped, if it failed')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kellcare', '0004_geocodingjob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(fields=['latitude', 'longitude'], name='doctor_lat_lng_idx'),
+        ),
+    ]
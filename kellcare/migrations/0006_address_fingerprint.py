@@ -0,0 +1,94 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:21
+
+from django.db import migrations, models
+
+import hashlib
+import re
+
+# Frozen copy of kellcare.utils.geocode_cache.normalize_address/address_fingerprint as of this
+# migration; later changes to the live functions must not change what it writes.
+UNIT = r"(?:(?:suite|ste|apt|apartment|unit|room|rm|floor|bldg|building)\.?\s*#?\s*(?=[\w-]*\d)[\w-]+|#\s*[\w-]+)"
+TRAILING_UNIT_PATTERN = re.compile(rf"(?<=\S)\s+{UNIT}\s*$")
+UNIT_PART_PATTERN = re.compile(rf"^\s*{UNIT}\s*$")
+PUNCTUATION_PATTERN = re.compile(r"[^\w\s]")
+STREET_ABBREVIATIONS = {
+    "street": "st",
+    "avenue": "ave",
+    "road": "rd",
+    "drive": "dr",
+    "boulevard": "blvd",
+    "lane": "ln",
+    "court": "ct",
+    "place": "pl",
+    "highway": "hwy",
+    "parkway": "pkwy",
+    "north": "n",
+    "south": "s",
+    "east": "e",
+    "west": "w",
+}
+
+BATCH_SIZE = 1000
+
+
+def normalize_address(address):
+    parts = (address or "").lower().split(",")
+    while len(parts) > 1 and UNIT_PART_PATTERN.match(parts[0]):
+        parts.pop(0)
+    street, rest = parts[0], parts[1:]
+    while True:
+        stripped = TRAILING_UNIT_PATTERN.sub("", street)
+        if stripped == street:
+            break
+        street = stripped
+    while rest and UNIT_PART_PATTERN.match(rest[0]):
+        rest.pop(0)
+    text = PUNCTUATION_PATTERN.sub(" ", " ".join([street, *rest]))
+    return " ".join(STREET_ABBREVIATIONS.get(word, word) for word in text.split())
+
+
+def address_fingerprint(address):
+    normalized = normalize_address(address)
+    return hashlib.sha256(normalized.encode()).hexdigest()[:32] if normalized else ""
+
+
+def fingerprint_geocoded_rows(apps, schema_editor):
+    """Assume existing coordinates were geocoded from the current address"""
+    for model_name in ("Doctor", "Patient"):
+        model = apps.get_model("kellcare", model_name)
+        rows = model.objects.filter(latitude__isnull=False, longitude__isnull=False).only("id", "address").order_by("pk")
+        batch = []
+        for row in rows.iterator(chunk_size=BATCH_SIZE):
+            row.address_fingerprint = address_fingerprint(row.address)
+            batch.append(row)
+            if len(batch) == BATCH_SIZE:
+                model.objects.bulk_update(batch, ["address_fingerprint"], batch_size=BATCH_SIZE)
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, ["address_fingerprint"], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kellcare', '0005_doctor_lat_lng_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctor',
+            name='address_fingerprint',
+            field=models.CharField(blank=True, editable=False, help_text='Fingerprint of the address the coordinates were geocoded from', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='geocodingjob',
+            name='force',
+            field=models.BooleanField(default=False, help_text='Re-geocode rows whose address has not changed since their coordinates were set'),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='address_fingerprint',
+            field=models.CharField(blank=True, editable=False, help_text='Fingerprint of the address the coordinates were geocoded from', max_length=32),
+        ),
+        migrations.RunPython(fingerprint_geocoded_rows, migrations.RunPython.noop),
+    ]
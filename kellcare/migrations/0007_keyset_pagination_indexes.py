@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kellcare', '0006_address_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['appointment_date', 'id'], name='appointment_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contactmessage',
+            index=models.Index(fields=['created_at', 'id'], name='contact_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['created_at', 'id'], name='patient_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kellcare', '0007_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['status', 'appointment_date'], name='appointment_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'appointment_date'], name='appointment_doctor_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['patient', 'appointment_date'], name='appointment_patient_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contactmessage',
+            index=models.Index(condition=models.Q(('is_read', False)), fields=['created_at'], name='contact_unread_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(condition=models.Q(('is_available', True)), fields=['specialization'], name='doctor_available_spec_idx'),
+        ),
+    ]
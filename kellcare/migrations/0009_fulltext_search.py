@@ -0,0 +1,67 @@
+from django.db import migrations
+
+# FTS5 tables for kellcare.utils.fulltext (rowid = model primary key), with the
+# SELECTs used to fill them. Prefix indexes of 2 and 3 characters keep
+# typeahead-style prefix queries from scanning the whole term list.
+TABLES = {
+    "kellcare_doctors_fts": (
+        ("name", "specialization", "department"),
+        "SELECT t.id, u.first_name || ' ' || u.last_name, t.specialization, COALESCE(d.name, '') "
+        "FROM kellcare_doctor t JOIN auth_user u ON u.id = t.user_id LEFT JOIN kellcare_department d ON d.id = t.department_id",
+    ),
+    "kellcare_patients_fts": (
+        ("name", "patient_id", "phone"),
+        "SELECT t.id, u.first_name || ' ' || u.last_name, t.patient_id, t.phone FROM kellcare_patient t JOIN auth_user u ON u.id = t.user_id",
+    ),
+    "kellcare_appointments_fts": (
+        ("patient", "doctor", "reason"),
+        "SELECT t.id, pu.first_name || ' ' || pu.last_name, du.first_name || ' ' || du.last_name, t.reason "
+        "FROM kellcare_appointment t "
+        "JOIN kellcare_patient p ON p.id = t.patient_id JOIN auth_user pu ON pu.id = p.user_id "
+        "JOIN kellcare_doctor d ON d.id = t.doctor_id JOIN auth_user du ON du.id = d.user_id",
+    ),
+    "kellcare_contact_messages_fts": (
+        ("name", "email", "subject", "message"),
+        "SELECT t.id, t.name, t.email, t.subject, t.message FROM kellcare_contactmessage t",
+    ),
+}
+
+
+def fts5_supported(cursor):
+    try:
+        cursor.execute("CREATE VIRTUAL TABLE temp.kellcare_fts5_probe USING fts5(x)")
+        cursor.execute("DROP TABLE temp.kellcare_fts5_probe")
+        return True
+    except Exception:
+        return False
+
+
+def create_search_tables(apps, schema_editor):
+    """Create and fill the FTS5 tables (skipped on other databases or SQLite builds without FTS5)"""
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        if not fts5_supported(cursor):
+            return
+        for table, (columns, source) in TABLES.items():
+            cursor.execute(f"CREATE VIRTUAL TABLE {table} USING fts5({', '.join(columns)}, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')")
+            cursor.execute(f"INSERT INTO {table} (rowid, {', '.join(columns)}) {source}")
+
+
+def drop_search_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table in TABLES:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('kellcare', '0008_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_tables, drop_search_tables),
+    ]
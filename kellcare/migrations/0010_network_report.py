@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:13
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('kellcare', '0009_fulltext_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NetworkReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('k', models.PositiveSmallIntegerField(default=1, help_text='Doctors assigned per patient and specialization')),
+                ('specialization', models.CharField(blank=True, help_text='Specialization reported, blank for all', max_length=50)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('report', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, help_text='Why the build stopped, if it failed')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['k', 'specialization', 'status', '-finished_at'], name='network_report_latest_idx')],
+            },
+        ),
+    ]
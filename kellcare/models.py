@@ -42,6 +42,7 @@ class Doctor(models.Model):
     address = models.TextField()
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, help_text="Latitude coordinate for address")
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, help_text="Longitude coordinate for address")
+    address_fingerprint = models.CharField(max_length=32, blank=True, editable=False, help_text="Fingerprint of the address the coordinates were geocoded from")
     experience_years = models.PositiveIntegerField(default=0)
     consultation_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     is_available = models.BooleanField(default=True)
@@ -54,6 +55,13 @@ class Doctor(models.Model):
 
     class Meta:
         ordering = ["user__first_name", "user__last_name"]
+        indexes = [
+            # Bounding-box prefilter for /api/doctors/nearby/
+            models.Index(fields=["latitude", "longitude"], name="doctor_lat_lng_idx"),
+            # available and by_specialization actions. Partial, because boolean filters
+            # compile to a bare WHERE "is_available", which only a matching index condition can serve
+            models.Index(fields=["specialization"], condition=models.Q(is_available=True), name="doctor_available_spec_idx"),
+        ]
 
 
 class Patient(models.Model):
@@ -87,6 +95,7 @@ class Patient(models.Model):
     address = models.TextField()
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, help_text="Latitude coordinate for address")
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True, help_text="Longitude coordinate for address")
+    address_fingerprint = models.CharField(max_length=32, blank=True, editable=False, help_text="Fingerprint of the address the coordinates were geocoded from")
     medical_history = models.TextField(blank=True)
     allergies = models.TextField(blank=True)
     current_medications = models.TextField(blank=True)
@@ -99,6 +108,10 @@ class Patient(models.Model):
 
     class Meta:
         ordering = ["user__first_name", "user__last_name"]
+        indexes = [
+            # Keyset pagination (?cursor=) seeks on (created_at, id)
+            models.Index(fields=["created_at", "id"], name="patient_created_id_idx"),
+        ]
 
 
 class Appointment(models.Model):
@@ -130,6 +143,15 @@ class Appointment(models.Model):
 
     class Meta:
         ordering = ["-appointment_date"]
+        indexes = [
+            # Keyset pagination (?cursor=) seeks on (appointment_date, id)
+            models.Index(fields=["appointment_date", "id"], name="appointment_date_id_idx"),
+            # by_status and ?status= lists, newest first; also covers the per-status counts
+            models.Index(fields=["status", "appointment_date"], name="appointment_status_date_idx"),
+            # Per-doctor and per-patient appointment lists, newest first
+            models.Index(fields=["doctor", "appointment_date"], name="appointment_doctor_date_idx"),
+            models.Index(fields=["patient", "appointment_date"], name="appointment_patient_date_idx"),
+        ]
 
 
 class ContactMessage(models.Model):
@@ -148,3 +170,125 @@ class ContactMessage(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # Keyset pagination (?cursor=) seeks on (created_at, id)
+            models.Index(fields=["created_at", "id"], name="contact_created_id_idx"),
+            # unread action, newest first (partial for the same reason as doctor_available_spec_idx)
+            models.Index(fields=["created_at"], condition=models.Q(is_read=False), name="contact_unread_created_idx"),
+        ]
+
+
+class GeocodeCacheEntry(models.Model):
+    """Stored geocoding result, keyed by normalized query and provider"""
+
+    KIND_CHOICES = [
+        ("forward", "Address to coordinates"),
+        ("reverse", "Coordinates to address"),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    provider = models.CharField(max_length=20)
+    query_hash = models.CharField(max_length=64, help_text="SHA-256 of the normalized query")
+    normalized_query = models.TextField()
+    success = models.BooleanField(default=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    address = models.TextField(blank=True, help_text="Formatted address returned by the provider")
+    error = models.CharField(max_length=200, blank=True)
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.provider} {self.kind}: {self.normalized_query}"
+
+    class Meta:
+        ordering = ["-created_at"]
+        unique_together = [("kind", "provider", "query_hash")]
+
+
+class GeocodingJob(models.Model):
+    """Resumable bulk geocoding run over doctors and/or patients"""
+
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("completed", "Completed"),
+        ("failed", "Failed"),
+    ]
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending", db_index=True)
+    service = models.CharField(max_length=20, default="nominatim")
+    targets = models.JSONField(default=list, help_text='Row types to geocode, e.g. ["doctors", "patients"]')
+    only_missing = models.BooleanField(default=False, help_text="Skip rows that already have coordinates")
+    force = models.BooleanField(default=False, help_text="Re-geocode rows whose address has not changed since their coordinates were set")
+    chunk_size = models.PositiveIntegerField(default=100)
+    progress = models.JSONField(default=dict, help_text="Checkpoint and counters per target")
+    errors = models.JSONField(default=list, help_text="Most recent per-row errors")
+    error = models.TextField(blank=True, help_text="Why the job stopped, if it failed")
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Geocoding job #{self.pk} ({self.status})"
+
+    class Meta:
+        ordering = ["-created_at"]
+
+
+class NetworkReport(models.Model):
+    """
+    Stored nearest-specialist catchment report (kellcare.utils.network_planning)
+
+    Built by `manage.py nearest_specialists --store` or a staff refresh of
+    /api/stats/nearest-specialists/; the endpoint only reads the latest completed one.
+    """
+
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("running", "Running"),
+        ("completed", "Completed"),
+        ("failed", "Failed"),
+    ]
+
+    k = models.PositiveSmallIntegerField(default=1, help_text="Doctors assigned per patient and specialization")
+    specialization = models.CharField(max_length=50, blank=True, help_text="Specialization reported, blank for all")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    report = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, help_text="Why the build stopped, if it failed")
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Nearest-specialist report #{self.pk} (k={self.k}, {self.specialization or 'all'}, {self.status})"
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["k", "specialization", "status", "-finished_at"], name="network_report_latest_idx")]
+
+
+
+class IndexChange(models.Model):
+    """
+    A doctor or patient written by some process (kellcare.utils.index_changes)
+
+    The in-memory indexes of every process read these in id order to re-read the
+    written rows, instead of rebuilding; the auto-increment id is the sequence.
+    """
+
+    KIND_CHOICES = [
+        ("doctor", "Doctor"),
+        ("patient", "Patient"),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.kind} #{self.object_id} changed"
@@ -0,0 +1,299 @@
+"""
+Pagination classes for the KellCare API
+
+List endpoints page by number by default, with totals from
+kellcare.utils.row_counts (exact, cached or estimated depending on table size;
+``count_exact`` says which). Large collections (appointments,
+patients, contact messages) also accept ``?cursor`` for keyset pagination:
+each page is fetched with ``WHERE (key, id) < (last key, last id)`` on an
+index instead of an OFFSET, so it costs the same at any depth and rows inserted
+while a client walks the list never shift or repeat entries.
+"""
+
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from .utils.row_counts import EXACT, count_rows
+
+
+class EstimatedCountPage(Page):
+    """Page that knows from its own fetch whether another page follows"""
+
+    more = None
+
+    def has_next(self):
+        return super().has_next() if self.more is None else self.more
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Django paginator whose ``count`` comes from count_rows()
+
+    ``count_mode`` is "exact", "cached" or "estimate". A cached or estimated
+    count may be below the real one, so pages are then never validated or cut
+    against it: each page fetches one row more than it shows to tell whether
+    another follows, and pages past the real end come back empty instead of
+    raising. ``count`` is raised to the rows a page has shown to exist, and
+    becomes exact once a page reaches the end.
+    """
+
+    @cached_property
+    def counted(self):
+        return count_rows(self.object_list)
+
+    @property
+    def count(self):
+        return self.counted[0]
+
+    @property
+    def count_mode(self):
+        return self.counted[1]
+
+    @property
+    def count_exact(self):
+        return self.count_mode == EXACT
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # Past an inexact count is not past the end of the list
+            if self.count_exact or int(number) < 1:
+                raise
+            return int(number)
+
+    def page(self, number):
+        if self.count_exact:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom : bottom + self.per_page + self.orphans + 1])
+        more = len(rows) > self.per_page + self.orphans
+        if more:
+            rows = rows[: self.per_page]
+            # At least one row follows this page
+            self.counted = (max(self.count, bottom + self.per_page + 1), self.count_mode)
+        elif rows or number == 1:
+            # This page reached the end of the list
+            self.counted = (bottom + len(rows), EXACT)
+        self.__dict__.pop("num_pages", None)
+
+        object_list = rows
+        if hasattr(self.object_list, "query"):
+            # Keep a queryset (the admin's list_editable formset needs one) without fetching again
+            object_list = self.object_list[bottom : bottom + len(rows)]
+            object_list._result_cache = rows
+        page = self._get_page(object_list, number, self)
+        page.more = more
+        return page
+
+    def _get_page(self, *args, **kwargs):
+        return EstimatedCountPage(*args, **kwargs)
+
+
+class CountedPageNumberPagination(PageNumberPagination):
+    """PageNumberPagination reporting whether ``count`` is exact"""
+
+    django_paginator_class = EstimatedCountPaginator
+
+    def get_paginated_response(self, data):
+        paginator = self.page.paginator
+        return Response(
+            {
+                "count": paginator.count,
+                "count_exact": paginator.count_exact,
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema["properties"]["count_exact"] = {"type": "boolean", "example": True}
+        return response_schema
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination over a view's ``keyset_ordering``
+
+    ``keyset_ordering`` names a column and ends with the primary key as the
+    tie-breaker, e.g. ``("-appointment_date", "-id")``. ``?ordering=`` may flip
+    the direction when it names the same column; any other ordering is ignored
+    because only the keyset order can be resumed from a cursor.
+
+    Cursors are opaque base64 tokens holding the boundary row's key values and
+    the direction to read in; ``next`` and ``previous`` links are returned with
+    each page, and ``?cursor=`` (empty) starts at the first page.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    invalid_cursor_message = "Invalid cursor"
+
+    def get_keyset(self, request, view):
+        keyset = tuple(getattr(view, "keyset_ordering", ("-id",)))
+        ordering = request.query_params.get(api_settings.ORDERING_PARAM, "").split(",")[0].strip()
+        if len(keyset) > 1 and ordering.lstrip("-") == keyset[0].lstrip("-"):
+            descending = ordering.startswith("-")
+            keyset = tuple(("-" if descending else "") + field.lstrip("-") for field in keyset)
+        return keyset
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return api_settings.PAGE_SIZE or self.max_page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, values, reverse):
+        payload = json.dumps({"v": values, "r": int(reverse)}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param, "")
+        if not token:
+            return None, None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+            raw, reverse = payload["v"], bool(payload["r"])
+            if not isinstance(raw, list) or len(raw) != len(self.fields):
+                raise ValueError
+            values = [field.to_python(value) for field, value in zip(self.fields, raw)]
+        except (binascii.Error, ValueError, TypeError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return raw, values, reverse
+
+    def seek_filter(self, values, reverse):
+        """
+        ``(key, id)`` strictly after ``values`` in reading order
+
+        Written as ``key <= v AND (key < v OR id < i)`` so the leading column
+        bounds an index range scan.
+        """
+        condition = None
+        for position in range(len(self.keyset) - 1, -1, -1):
+            name, descending = self.keyset[position].lstrip("-"), self.keyset[position].startswith("-")
+            beyond = Q(**{f"{name}__{'lt' if descending != reverse else 'gt'}": values[position]})
+            if condition is None:
+                condition = beyond
+            else:
+                bound = Q(**{f"{name}__{'lte' if descending != reverse else 'gte'}": values[position]})
+                condition = bound & (beyond | condition)
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.keyset = self.get_keyset(request, view)
+        self.fields = [queryset.model._meta.get_field(name.lstrip("-")) for name in self.keyset]
+        self.page_size = self.get_page_size(request)
+        raw, values, reverse = self.decode_cursor(request)
+
+        order = [name.lstrip("-") if name.startswith("-") == reverse else "-" + name.lstrip("-") for name in self.keyset]
+        queryset = queryset.order_by(*order)
+        if values is not None:
+            queryset = queryset.filter(self.seek_filter(values, reverse))
+
+        # One extra row tells whether another page follows in the reading direction
+        rows = list(queryset[: self.page_size + 1])
+        more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.has_next = more if not reverse else values is not None
+        self.has_previous = values is not None if not reverse else more
+        # An empty page (rows deleted since the cursor was issued) links back from the cursor itself
+        self.first = self.boundary(rows[0]) if rows else raw
+        self.last = self.boundary(rows[-1]) if rows else raw
+        return rows
+
+    def boundary(self, obj):
+        return [self.serialize(field, obj) for field in self.fields]
+
+    @staticmethod
+    def serialize(field, obj):
+        value = field.value_from_object(obj)
+        return value.isoformat() if hasattr(value, "isoformat") else value
+
+    def get_link(self, values, reverse):
+        if values is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, self.encode_cursor(values, reverse))
+
+    def get_next_link(self):
+        return self.get_link(self.last, False) if self.has_next else None
+
+    def get_previous_link(self):
+        return self.get_link(self.first, True) if self.has_previous else None
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "previous": self.get_previous_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Keyset pagination cursor (send it empty for the first page)",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": f"Results per page for cursor pagination (at most {self.max_page_size})",
+                "schema": {"type": "integer"},
+            },
+        ]
+
+
+class KeysetOptInPagination(CountedPageNumberPagination):
+    """
+    Page-number pagination, switching to KeysetPagination when ``?cursor`` is present
+
+    Keeps ``?page=`` responses (with their count) unchanged for existing
+    clients while letting large-history consumers opt into constant-cost pages.
+    """
+
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.keyset_class.cursor_query_param in request.query_params:
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + self.keyset_class().get_schema_operation_parameters(view)
@@ -0,0 +1,72 @@
+"""
+Full-text search and autocomplete API views
+"""
+
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from .utils.autocomplete import KINDS, get_autocomplete_index
+from .utils.fulltext import FULLTEXT_INDEXES, fulltext_available, match_expression
+
+SEARCH_MAX_LIMIT = 50
+AUTOCOMPLETE_MAX_LIMIT = 25
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def search(request):
+    """
+    Ranked full-text search with highlighted matches
+
+    GET /api/search/?q=jo smi&types=doctors,patients&limit=10
+
+    Every word must match the start of a word in the record. Results for each type
+    are best-first, with the matched terms wrapped in <mark> in each column that matched.
+    """
+    if not fulltext_available():
+        return Response({"error": "Full-text search is not available"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    query = request.query_params.get("q", "")
+    expression = match_expression(query)
+    if expression is None:
+        return Response({"error": "q is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    types = [name for name in request.query_params.get("types", "").split(",") if name] or list(FULLTEXT_INDEXES)
+    unknown = [name for name in types if name not in FULLTEXT_INDEXES]
+    if unknown:
+        return Response({"error": f"Unknown types: {', '.join(unknown)}", "types": list(FULLTEXT_INDEXES)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        limit = min(max(int(request.query_params.get("limit", 10)), 1), SEARCH_MAX_LIMIT)
+    except ValueError:
+        return Response({"error": "limit must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({"query": query, "results": {name: FULLTEXT_INDEXES[name].search(expression, limit) for name in types}})
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def autocomplete(request):
+    """
+    Typeahead suggestions for doctors and patients, served from memory
+
+    GET /api/autocomplete/?q=jo&types=doctor,patient&limit=10
+
+    Every word must start a word of the name, the patient id or the phone number
+    ("jo sm", "P-00", "555-01"). An empty q returns no results rather than an error,
+    so clients can call it on every keystroke.
+    """
+    query = request.query_params.get("q", "")
+    types = [name for name in request.query_params.get("types", "").split(",") if name] or list(KINDS)
+    unknown = [name for name in types if name not in KINDS]
+    if unknown:
+        return Response({"error": f"Unknown types: {', '.join(unknown)}", "types": list(KINDS)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        limit = min(max(int(request.query_params.get("limit", 10)), 1), AUTOCOMPLETE_MAX_LIMIT)
+    except ValueError:
+        return Response({"error": "limit must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({"query": query, "results": get_autocomplete_index().search(query, kinds=types, limit=limit)})
@@ -1,9 +1,57 @@
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from django.contrib.auth.models import User
 from .models import Department, Doctor, Patient, Appointment, ContactMessage
 
 
-class UserSerializer(serializers.ModelSerializer):
+def parse_field_list(value):
+    """Split a comma-separated ``?fields=``/``?expand=`` value into a set of names"""
+    return {name.strip() for name in (value or "").split(",") if name.strip()}
+
+
+class SparseFieldsetMixin:
+    """
+    Serializer mixin honouring the ``?fields=`` and ``?expand=`` query parameters
+
+    ``fields`` keeps only the listed fields. ``expand`` swaps in the nested
+    serializers declared in ``expandable_fields`` (name -> zero-argument factory).
+    ``field_dependencies`` lists the model columns read by SerializerMethodFields,
+    so viewsets can still restrict the SQL columns when those fields are selected.
+    Only the top-level serializer of a read request is pruned; nested serializers
+    and writes are left alone so validation always sees every field. Unknown
+    names in either parameter are rejected with a 400 listing them.
+    """
+
+    expandable_fields = {}
+    field_dependencies = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is None or not hasattr(request, "query_params") or request.method not in SAFE_METHODS:
+            return
+
+        expand = parse_field_list(request.query_params.get("expand"))
+        requested = parse_field_list(request.query_params.get("fields"))
+        errors = {}
+        unknown = expand - set(self.expandable_fields)
+        if unknown:
+            errors["expand"] = f"Unknown fields: {', '.join(sorted(unknown))} (expandable: {', '.join(sorted(self.expandable_fields)) or 'none'})"
+        unknown = requested - set(self.fields) - expand
+        if unknown:
+            errors["fields"] = f"Unknown fields: {', '.join(sorted(unknown))} (available: {', '.join(sorted(self.fields))})"
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        for name in expand:
+            self.fields[name] = self.expandable_fields[name]()
+
+        if requested:
+            for name in set(self.fields) - requested - expand:
+                self.fields.pop(name)
+
+
+class UserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for User model"""
 
     class Meta:
@@ -12,7 +60,7 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "date_joined"]
 
 
-class DepartmentSerializer(serializers.ModelSerializer):
+class DepartmentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for Department model"""
 
     class Meta:
@@ -21,12 +69,14 @@ class DepartmentSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "created_at"]
 
 
-class DoctorSerializer(serializers.ModelSerializer):
+class DoctorSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for Doctor model"""
 
     user = UserSerializer(read_only=True)
     department_name = serializers.CharField(source="department.name", read_only=True)
 
+    expandable_fields = {"department": lambda: DepartmentSerializer(read_only=True)}
+
     class Meta:
         model = Doctor
         fields = "__all__"
@@ -61,12 +111,14 @@ class DoctorCreateSerializer(serializers.ModelSerializer):
         return doctor
 
 
-class PatientSerializer(serializers.ModelSerializer):
+class PatientSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for Patient model"""
 
     user = UserSerializer(read_only=True)
     age = serializers.SerializerMethodField()
 
+    field_dependencies = {"age": ["date_of_birth"]}
+
     class Meta:
         model = Patient
         fields = "__all__"
@@ -110,7 +162,7 @@ class PatientCreateSerializer(serializers.ModelSerializer):
         return patient
 
 
-class AppointmentSerializer(serializers.ModelSerializer):
+class AppointmentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for Appointment model"""
 
     patient_name = serializers.CharField(source="patient.user.get_full_name", read_only=True)
@@ -118,6 +170,11 @@ class AppointmentSerializer(serializers.ModelSerializer):
     patient_id = serializers.CharField(source="patient.patient_id", read_only=True)
     doctor_specialization = serializers.CharField(source="doctor.specialization", read_only=True)
 
+    expandable_fields = {
+        "patient": lambda: PatientListSerializer(read_only=True),
+        "doctor": lambda: DoctorListSerializer(read_only=True),
+    }
+
     class Meta:
         model = Appointment
         fields = "__all__"
@@ -132,7 +189,7 @@ class AppointmentCreateSerializer(serializers.ModelSerializer):
         fields = ["patient", "doctor", "appointment_date", "duration", "reason"]
 
 
-class ContactMessageSerializer(serializers.ModelSerializer):
+class ContactMessageSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for ContactMessage model"""
 
     class Meta:
@@ -142,23 +199,31 @@ class ContactMessageSerializer(serializers.ModelSerializer):
 
 
 # Specialized serializers for different use cases
-class DoctorListSerializer(serializers.ModelSerializer):
+class DoctorListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Simplified serializer for doctor lists"""
 
     name = serializers.CharField(source="user.get_full_name", read_only=True)
     department_name = serializers.CharField(source="department.name", read_only=True)
 
+    expandable_fields = {
+        "user": lambda: UserSerializer(read_only=True),
+        "department": lambda: DepartmentSerializer(read_only=True),
+    }
+
     class Meta:
         model = Doctor
-        fields = ["id", "name", "specialization", "department_name", "consultation_fee", "is_available", "photo"]
+        fields = ["id", "name", "specialization", "department_name", "consultation_fee", "is_available", "photo", "address", "latitude", "longitude"]
 
 
-class PatientListSerializer(serializers.ModelSerializer):
+class PatientListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Simplified serializer for patient lists"""
 
     name = serializers.CharField(source="user.get_full_name", read_only=True)
     age = serializers.SerializerMethodField()
 
+    expandable_fields = {"user": lambda: UserSerializer(read_only=True)}
+    field_dependencies = {"age": ["date_of_birth"]}
+
     class Meta:
         model = Patient
         fields = ["id", "name", "patient_id", "gender", "age", "phone"]
@@ -170,12 +235,17 @@ class PatientListSerializer(serializers.ModelSerializer):
         return today.year - obj.date_of_birth.year - ((today.month, today.day) < (obj.date_of_birth.month, obj.date_of_birth.day))
 
 
-class AppointmentListSerializer(serializers.ModelSerializer):
+class AppointmentListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Simplified serializer for appointment lists"""
 
     patient_name = serializers.CharField(source="patient.user.get_full_name", read_only=True)
     doctor_name = serializers.CharField(source="doctor.user.get_full_name", read_only=True)
 
+    expandable_fields = {
+        "patient": lambda: PatientListSerializer(read_only=True),
+        "doctor": lambda: DoctorListSerializer(read_only=True),
+    }
+
     class Meta:
         model = Appointment
         fields = ["id", "patient_name", "doctor_name", "appointment_date", "status", "reason"]
@@ -0,0 +1,159 @@
+"""
+Signal receivers keeping derived data in sync with model writes
+"""
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from .api_client import invalidate_response_cache
+from .models import Appointment, ContactMessage, Department, Doctor, Patient
+from .stats_views import invalidate_summary_stats
+from .utils.autocomplete import autocomplete_index
+from .utils.fulltext import FULLTEXT_INDEX_BY_MODEL, refresh_department, refresh_user, reset_fulltext_available
+from .utils.geocoding_queue import enqueue_missing_coordinates, needs_coordinates
+from .utils.index_changes import record_index_changes
+from .utils.row_counts import adjust_table_count
+from .utils.spatial_index import doctor_index
+
+# API resources whose payloads embed data from each model
+# (e.g. doctor lists show department names, appointment lists show doctor and patient names)
+CACHED_RESOURCES_BY_MODEL = {
+    Department: ("departments", "doctors", "stats"),
+    Doctor: ("doctors", "appointments", "stats"),
+    Patient: ("patients", "appointments"),
+    Appointment: ("appointments", "doctors", "patients"),
+    User: ("doctors", "patients", "appointments", "users"),
+}
+
+# Fields no cached payload shows; saves touching only these leave the caches alone
+# (every login saves User.last_login)
+UNCACHED_FIELDS = {
+    User: {"last_login"},
+}
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_api_response_cache(sender, update_fields=None, **kwargs):
+    """Drop cached API responses that may include the written row"""
+    if update_fields is not None and set(update_fields) <= UNCACHED_FIELDS.get(sender, set()):
+        return
+    resources = CACHED_RESOURCES_BY_MODEL.get(sender)
+    if resources:
+        invalidate_response_cache(*resources)
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+def invalidate_stats_cache(sender, **kwargs):
+    """Recompute summary stats on the next request after a write"""
+    invalidate_summary_stats()
+
+
+# IndexChange kind of the models the in-memory indexes hold
+INDEX_CHANGE_KINDS = {Doctor: "doctor", Patient: "patient"}
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+@receiver(post_save, sender=Patient)
+@receiver(post_delete, sender=Patient)
+def record_index_change(sender, instance, **kwargs):
+    """Tell the in-memory indexes of other processes to re-read the written row"""
+    record_index_changes(INDEX_CHANGE_KINDS[sender], [instance.pk])
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+def update_doctor_spatial_index(sender, instance, **kwargs):
+    """Re-read the doctor into the in-memory spatial index once the write commits"""
+    doctor_index.refresh_on_commit([instance.pk])
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+@receiver(post_save, sender=Patient)
+@receiver(post_delete, sender=Patient)
+def update_autocomplete_index(sender, instance, **kwargs):
+    """Re-read the doctor or patient into the in-memory autocomplete index once the write commits"""
+    if sender is Doctor:
+        autocomplete_index.refresh_on_commit(doctor_ids=[instance.pk])
+    else:
+        autocomplete_index.refresh_on_commit(patient_ids=[instance.pk])
+
+
+@receiver(post_save, sender=User)
+def update_autocomplete_names(sender, instance, created, update_fields=None, **kwargs):
+    """Autocomplete labels and name keys come from the user"""
+    if created or (update_fields is not None and not {"first_name", "last_name"} & set(update_fields)):
+        return
+    doctor_ids = list(Doctor.objects.filter(user=instance).values_list("id", flat=True))
+    patient_ids = list(Patient.objects.filter(user=instance).values_list("id", flat=True))
+    record_index_changes("doctor", doctor_ids)
+    record_index_changes("patient", patient_ids)
+    autocomplete_index.refresh_on_commit(doctor_ids=doctor_ids, patient_ids=patient_ids)
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_save, sender=Patient)
+def regeocode_changed_address(sender, instance, update_fields=None, **kwargs):
+    """Queue background geocoding when a saved address no longer matches its fingerprint"""
+    if update_fields is not None and "address" not in update_fields:
+        return
+    if needs_coordinates(instance):
+        transaction.on_commit(lambda: enqueue_missing_coordinates(sender, [instance.pk]))
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_save, sender=Patient)
+@receiver(post_save, sender=ContactMessage)
+def count_created_row(sender, created, **kwargs):
+    """Add a new row to the cached table count used by list pagination"""
+    if created:
+        transaction.on_commit(lambda: adjust_table_count(sender, 1))
+
+
+@receiver(post_delete, sender=Appointment)
+@receiver(post_delete, sender=Patient)
+@receiver(post_delete, sender=ContactMessage)
+def count_deleted_row(sender, **kwargs):
+    """Remove a deleted row from the cached table count used by list pagination"""
+    transaction.on_commit(lambda: adjust_table_count(sender, -1))
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+@receiver(post_save, sender=Patient)
+@receiver(post_delete, sender=Patient)
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+@receiver(post_save, sender=ContactMessage)
+@receiver(post_delete, sender=ContactMessage)
+def update_fulltext_index(sender, instance, **kwargs):
+    """Re-read the written row into its full-text search table"""
+    FULLTEXT_INDEX_BY_MODEL[sender].refresh([instance.pk])
+
+
+@receiver(post_save, sender=User)
+def update_fulltext_names(sender, instance, created, update_fields=None, **kwargs):
+    """Names shown in doctor, patient and appointment search come from the user"""
+    if created or (update_fields is not None and not {"first_name", "last_name"} & set(update_fields)):
+        return
+    refresh_user(instance)
+
+
+@receiver(post_save, sender=Department)
+def update_fulltext_department(sender, instance, created, **kwargs):
+    """Doctor search includes the department name"""
+    if not created:
+        refresh_department(instance)
+
+
+@receiver(post_migrate)
+def recheck_fulltext_tables(sender, **kwargs):
+    """Migrations may have created or dropped the full-text search tables"""
+    reset_fulltext_available()
@@ -0,0 +1,120 @@
+"""
+Aggregate statistics API views
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from .models import Department, Doctor
+from .utils.network_planning import latest_report, request_report, start_report_in_background
+
+SUMMARY_CACHE_KEY = "kellcare:stats:summary"
+NEAREST_SPECIALISTS_MAX_K = 5
+
+
+def compute_summary_stats():
+    """
+    Compute network-wide counts with one aggregate query per table
+
+    Returns:
+        dict: doctor/department totals and the per-specialization breakdown
+    """
+    doctor_totals = Doctor.objects.order_by().aggregate(total=Count("id"), available=Count("id", filter=Q(is_available=True)))
+    labels = dict(Doctor.SPECIALIZATION_CHOICES)
+    specializations = (
+        Doctor.objects.order_by()
+        .values("specialization")
+        .annotate(count=Count("id"), available_count=Count("id", filter=Q(is_available=True)))
+        .order_by("-count", "specialization")
+    )
+
+    return {
+        "total_doctors": doctor_totals["total"],
+        "available_doctors": doctor_totals["available"],
+        "total_departments": Department.objects.order_by().count(),
+        "specializations": [
+            {
+                "specialization": row["specialization"],
+                "label": labels.get(row["specialization"], row["specialization"]),
+                "count": row["count"],
+                "available_count": row["available_count"],
+            }
+            for row in specializations
+        ],
+        "generated_at": timezone.now().isoformat(),
+    }
+
+
+def get_summary_stats():
+    """Return summary stats from the cache, computing them on a miss"""
+    stats = cache.get(SUMMARY_CACHE_KEY)
+    if stats is None:
+        stats = compute_summary_stats()
+        cache.set(SUMMARY_CACHE_KEY, stats, timeout=getattr(settings, "KELLCARE_STATS_CACHE_TTL", 300))
+    return stats
+
+
+def invalidate_summary_stats():
+    """Drop cached summary stats after a Doctor or Department write"""
+    cache.delete(SUMMARY_CACHE_KEY)
+
+
+@api_view(["GET"])
+@permission_classes([])  # No authentication required
+def stats_summary(request):
+    """
+    Get network-wide doctor and department statistics
+
+    GET /api/stats/summary/
+    """
+    return Response(get_summary_stats())
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def nearest_specialists_report(request):
+    """
+    Get nearest-doctor catchments for every patient, per specialization
+
+    GET /api/stats/nearest-specialists/?k=1&specialization=cardiology&refresh=1
+
+    Serves the latest stored report; building one takes minutes on large tables, so
+    it happens in `manage.py nearest_specialists --store` or, for staff passing
+    refresh=1, in a background build (202 with the queued report's status).
+    """
+    try:
+        k = int(request.query_params.get("k", 1))
+    except ValueError:
+        return Response({"error": "k must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+    if not 1 <= k <= NEAREST_SPECIALISTS_MAX_K:
+        return Response({"error": f"k must be between 1 and {NEAREST_SPECIALISTS_MAX_K}"}, status=status.HTTP_400_BAD_REQUEST)
+
+    specialization = request.query_params.get("specialization") or None
+    if specialization and specialization not in dict(Doctor.SPECIALIZATION_CHOICES):
+        return Response({"error": f"Unknown specialization: {specialization}"}, status=status.HTTP_400_BAD_REQUEST)
+
+    if request.query_params.get("refresh"):
+        if not request.user.is_staff:
+            return Response({"error": "Only staff can rebuild the report"}, status=status.HTTP_403_FORBIDDEN)
+        queued, created = request_report(k=k, specialization=specialization, user=request.user)
+        if created and settings.KELLCARE_NETWORK_REPORT_IN_BACKGROUND:
+            start_report_in_background(queued)
+        return Response(_report_status(queued), status=status.HTTP_202_ACCEPTED)
+
+    stored = latest_report(k=k, specialization=specialization)
+    if stored is None:
+        return Response(
+            {"error": "No report has been built for these options yet; run `manage.py nearest_specialists --store` or ask staff to refresh"},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+    return Response({**stored.report, "generated_at": stored.finished_at.isoformat()})
+
+
+def _report_status(report):
+    return {"report_id": report.pk, "status": report.status, "k": report.k, "specialization": report.specialization or None, "created_at": report.created_at.isoformat()}
@@ -1,3 +1,1197 @@
-from django.test import TestCase
+import difflib
+import io
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from datetime import date, timedelta
+from functools import partial
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import requests
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from geopy.exc import GeocoderTimedOut
+
+from .admin import AppointmentAdmin
+from .api_client import (
+    APIClient,
+    AsyncAPIClient,
+    CircuitOpenError,
+    HTTPTransport,
+    InProcessTransport,
+    ResponseCache,
+    TransportUnavailable,
+    _get_fan_out_executor,
+    fan_out,
+    get_client_stats,
+    http_session_pool,
+)
+from .models import Appointment, ContactMessage, Department, Doctor, GeocodingJob, NetworkReport, Patient
+from .pagination import EstimatedCountPaginator
+from .stats_views import get_summary_stats
+from .utils import geocoding
+from .utils.autocomplete import AutocompleteIndex, autocomplete_index
+from .utils.doctor_search import nearby_doctors_from_db
+from .utils.fulltext import FULLTEXT_INDEXES, fulltext_available, reset_fulltext_available
+from .utils.gazetteer import FUZZY_CANDIDATES, LocalGazetteer
+from .utils.geo import EARTH_RADIUS_KM, haversine_km, haversine_km_batch
+from .utils.geocode_cache import geocode_cache, normalize_address
+from .utils.geocoding_jobs import _process_chunk, claim_job, claim_next_job, create_job, run_job, start_job_in_background
+from .utils.geocoding_queue import GeocodingQueue
+from .utils.index_changes import record_index_changes
+from .utils.rate_limiter import RateLimitExceeded, TokenBucketLimiter
+from .utils.spatial_index import DoctorSpatialIndex, doctor_index
+
+# A query-plan step reading a whole table ("SCAN kellcare_appointment"); index scans name the index
+FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)$")
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN output is SQLite-specific")
+class HotQueryPlanTests(TestCase):
+    """
+    Query-plan regression suite for the hot viewset queries
+
+    Every SELECT an endpoint runs against the kellcare tables is passed through
+    EXPLAIN QUERY PLAN; a full table scan fails the test, and endpoints built
+    around a composite index must still use it.
+    """
+
+    # (url, indexes the plans must use); "{doctor}" and "{patient}" are filled in with fixture ids
+    HOT_ENDPOINTS = [
+        ("/api/appointments/today/", ["appointment_date_id_idx"]),
+        ("/api/appointments/upcoming/", []),
+        ("/api/appointments/by_status/?status=scheduled", ["appointment_status_date_idx"]),
+        ("/api/appointments/by_status/", ["appointment_status_date_idx"]),
+        ("/api/appointments/?status=confirmed", ["appointment_status_date_idx"]),
+        ("/api/appointments/?doctor={doctor}", ["appointment_doctor_date_idx"]),
+        ("/api/appointments/?patient={patient}", ["appointment_patient_date_idx"]),
+        ("/api/appointments/?cursor=", ["appointment_date_id_idx"]),
+        ("/api/doctors/{doctor}/appointments/", ["appointment_doctor_date_idx"]),
+        ("/api/patients/{patient}/appointments/", ["appointment_patient_date_idx"]),
+        ("/api/patients/?cursor=", ["patient_created_id_idx"]),
+        ("/api/doctors/available/", ["doctor_available_spec_idx"]),
+        ("/api/doctors/by_specialization/?spec=cardiology", ["doctor_available_spec_idx"]),
+        ("/api/contact-messages/unread/", ["contact_unread_created_idx"]),
+        ("/api/contact-messages/?cursor=", ["contact_created_id_idx"]),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("plans", "plans@example.com", "plans")
+        specializations = ["cardiology", "neurology", "pediatrics"]
+        doctors = [
+            Doctor.objects.create(
+                user=User.objects.create(username=f"doctor{i}", first_name=f"Doc{i}"),
+                license_number=f"LIC{i}",
+                specialization=specializations[i % len(specializations)],
+                phone="555-0100",
+                address="",
+                is_available=i % 4 != 0,
+            )
+            for i in range(6)
+        ]
+        patients = [
+            Patient.objects.create(
+                user=User.objects.create(username=f"patient{i}", first_name=f"Pat{i}"),
+                patient_id=f"P{i:04d}",
+                date_of_birth=date(1980, 1, 1),
+                gender="F",
+                phone="555-0200",
+                emergency_contact="Contact",
+                emergency_phone="555-0300",
+                address="",
+            )
+            for i in range(6)
+        ]
+        now = timezone.now()
+        statuses = [choice for choice, _ in Appointment.STATUS_CHOICES]
+        Appointment.objects.bulk_create(
+            Appointment(
+                patient=patients[i % len(patients)],
+                doctor=doctors[i % len(doctors)],
+                appointment_date=now + timedelta(hours=i * 7 - 100),
+                reason="Checkup",
+                status=statuses[i % len(statuses)],
+            )
+            for i in range(40)
+        )
+        ContactMessage.objects.bulk_create(
+            ContactMessage(name=f"Visitor {i}", email="visitor@example.com", subject="Hello", message="Hi", is_read=i % 2 == 0) for i in range(6)
+        )
+        cls.doctor, cls.patient = doctors[1], patients[1]
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def query_plans(self, url):
+        """(sql, plan steps) for every SELECT on a kellcare table the endpoint runs"""
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content[:500])
+
+        plans = []
+        with connection.cursor() as cursor:
+            for query in captured.captured_queries:
+                sql = query["sql"]
+                if not sql.startswith("SELECT") or "kellcare_" not in sql:
+                    continue
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                plans.append((sql, [row[-1] for row in cursor.fetchall()]))
+        self.assertTrue(plans, f"{url} ran no queries on the kellcare tables")
+        return plans
+
+    def test_hot_queries_use_indexes(self):
+        for url, indexes in self.HOT_ENDPOINTS:
+            url = url.format(doctor=self.doctor.pk, patient=self.patient.pk)
+            with self.subTest(url=url):
+                plans = self.query_plans(url)
+                for sql, plan in plans:
+                    scans = [step for step in plan if FULL_SCAN.match(step)]
+                    self.assertFalse(scans, f"{url} scans a whole table:\n{sql}\n" + "\n".join(plan))
+                steps = "\n".join(step for _, plan in plans for step in plan)
+                for index in indexes:
+                    self.assertIn(index, steps, f"{url} no longer uses {index}:\n{steps}")
+
+    def test_keyset_pages_seek_on_the_index(self):
+        first = self.client.get("/api/appointments/?cursor=&page_size=5").json()
+        plans = self.query_plans(first["next"])
+        steps = "\n".join(step for _, plan in plans for step in plan)
+        self.assertIn("appointment_date_id_idx (appointment_date<?)", steps)
+        self.assertNotIn("USE TEMP B-TREE FOR ORDER BY", steps)
+
+
+class AutocompleteTests(TestCase):
+    """/api/autocomplete/ and the admin autocomplete widgets, served by the in-memory index"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("typeahead", "typeahead@example.com", "typeahead")
+        cls.doctor = Doctor.objects.create(
+            user=User.objects.create(username="dr-oneill", first_name="Seán", last_name="O'Neill"),
+            license_number="LIC-A1",
+            specialization="cardiology",
+            phone="(555) 010-4477",
+            address="",
+        )
+        cls.patient = Patient.objects.create(
+            user=User.objects.create(username="pt-johnson", first_name="Mary-Jane", last_name="Johnson"),
+            patient_id="P-0042",
+            date_of_birth=date(1980, 1, 1),
+            gender="F",
+            phone="555-020-1234",
+            emergency_contact="Contact",
+            emergency_phone="555-0300",
+            address="",
+        )
+
+    def setUp(self):
+        # The index is per process; rebuild it from this test's data
+        autocomplete_index.build()
+        self.client.force_login(self.user)
+
+    def suggest(self, query, **params):
+        response = self.client.get("/api/autocomplete/", {"q": query, **params})
+        self.assertEqual(response.status_code, 200, response.content[:500])
+        return [(result["type"], result["id"]) for result in response.json()["results"]]
+
+    def test_matches_names_patient_ids_and_phones(self):
+        doctor, patient = ("doctor", self.doctor.pk), ("patient", self.patient.pk)
+        for query, expected in [
+            ("sea", [doctor]),
+            ("o'ne", [doctor]),
+            ("oneil", [doctor]),
+            ("mary j", [patient]),
+            ("maryjane", [patient]),
+            ("JOHNS", [patient]),
+            ("p-004", [patient]),
+            ("555-01", [doctor]),
+            ("555 020", [patient]),
+            ("555", [doctor, patient]),
+            ("mary smith", []),
+            ("", []),
+        ]:
+            with self.subTest(query=query):
+                self.assertEqual(sorted(self.suggest(query)), sorted(expected))
+        self.assertEqual(self.suggest("555", types="patient"), [patient])
+        self.assertEqual(self.client.get("/api/autocomplete/", {"q": "a", "types": "nurse"}).status_code, 400)
+
+    def test_index_follows_saves_and_deletes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.patient.user.last_name = "Whitfield"
+            self.patient.user.save()
+        self.assertEqual(self.suggest("johnson"), [])
+        self.assertEqual(self.suggest("whit"), [("patient", self.patient.pk)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor.delete()
+        self.assertEqual(self.suggest("sean"), [])
+        self.assertTrue(autocomplete_index.check_consistency()["consistent"])
+
+    def test_admin_autocomplete_uses_the_index(self):
+        # search_fields (icontains) would not find "Mary-Jane" from "maryjane"
+        response = self.client.get(
+            "/admin/autocomplete/", {"term": "maryjane j", "app_label": "kellcare", "model_name": "appointment", "field_name": "patient"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result["id"] for result in response.json()["results"]], [str(self.patient.pk)])
+
+
+
+@override_settings(KELLCARE_INDEX_SYNC_INTERVAL=0)
+class IndexChangeFollowingTests(TestCase):
+    """In-memory indexes apply other processes' writes row by row instead of rebuilding"""
+
+    def test_change_records_are_applied_without_a_rebuild(self):
+        # Stand-ins for the indexes of another worker process
+        doctors, names = DoctorSpatialIndex(), AutocompleteIndex()
+        doctors.build()
+        names.build()
+
+        doctor = Doctor.objects.create(
+            user=User.objects.create(username="follower", first_name="Ines", last_name="Follower"),
+            license_number="FOLLOW1",
+            specialization="cardiology",
+            phone="555-0100",
+            address="",
+            latitude=35.6,
+            longitude=-82.5,
+        )
+        doctors.ensure_fresh()
+        names.ensure_fresh()
+        self.assertEqual([doctor_id for doctor_id, _ in doctors.search(35.6, -82.5, 1)], [doctor.pk])
+        self.assertEqual([result["id"] for result in names.search("ines")], [doctor.pk])
+
+        doctor.delete()
+        doctors.ensure_fresh()
+        names.ensure_fresh()
+        self.assertEqual(doctors.search(35.6, -82.5, 1), [])
+        self.assertEqual(names.search("ines"), [])
+        self.assertEqual((doctors.counters["builds"], names.counters["builds"]), (1, 1))
+
+    def test_a_long_backlog_rebuilds_in_the_background(self):
+        index = DoctorSpatialIndex()
+        index.build()
+        with mock.patch("kellcare.utils.index_changes.MAX_CHANGES_PER_SYNC", 2), mock.patch.object(index, "rebuild_in_background") as rebuild:
+            record_index_changes("doctor", [1, 2, 3])
+            index.ensure_fresh()
+        rebuild.assert_called_once_with()
+        self.assertEqual(index.counters["builds"], 1)
+
+class FullTextSearchTests(TestCase):
+    """Full-text search ranks matches, escapes highlights and matches word prefixes"""
+
+    def setUp(self):
+        if not fulltext_available():
+            self.skipTest("SQLite FTS5 tables are not available")
+        self.client.force_login(User.objects.create_user("searcher"))
+
+    def message(self, name, subject, message):
+        return ContactMessage.objects.create(name=name, email="visitor@example.com", subject=subject, message=message)
+
+    def test_results_are_ranked_best_first(self):
+        weak = self.message("Ann Lee", "Question", "Some words about visiting hours, parking, billing and cardiology, among other things")
+        strong = self.message("Bob Ray", "Cardiology", "Cardiology referral for cardiology follow-up")
+        response = self.client.get("/api/search/", {"q": "cardio", "types": "contact_messages"})
+        self.assertEqual([result["id"] for result in response.json()["results"]["contact_messages"]], [strong.pk, weak.pk])
+
+        response = self.client.get("/api/contact-messages/", {"search": "cardio"})
+        self.assertEqual([row["id"] for row in response.json()["results"]], [strong.pk, weak.pk])
+
+    def test_highlights_are_html_escaped(self):
+        self.message("<b>Smith</b> & Sons", "Hello", "Hi")
+        response = self.client.get("/api/search/", {"q": "smith", "types": "contact_messages"})
+        (result,) = response.json()["results"]["contact_messages"]
+        self.assertEqual(result["highlights"], {"name": "&lt;b&gt;<mark>Smith</mark>&lt;/b&gt; &amp; Sons"})
+
+    def test_terms_match_the_start_of_words_only(self):
+        prefix = self.message("Smithers", "Hello", "Hi")
+        self.message("Goldsmith", "Hello", "Hi")
+        response = self.client.get("/api/contact-messages/", {"search": "smith"})
+        self.assertEqual([row["id"] for row in response.json()["results"]], [prefix.pk])
+
+    def test_availability_is_checked_again_after_its_ttl(self):
+        with mock.patch.object(FULLTEXT_INDEXES["doctors"], "table", "kellcare_missing_fts"):
+            self.assertTrue(fulltext_available())
+            with mock.patch("kellcare.utils.fulltext.AVAILABILITY_TTL", 0):
+                self.assertFalse(fulltext_available())
+        reset_fulltext_available()
+        self.assertTrue(fulltext_available())
+
+
+class ResponseCacheInvalidationTests(TestCase):
+    """Model writes bump the API response cache generations of the resources showing them"""
+
+    def generation(self, resource):
+        return cache.get(ResponseCache.GENERATION_KEY.format(resource), 0)
+
+    def test_login_does_not_invalidate(self):
+        user = User.objects.create_user("cached", password="cached-password")
+        before = self.generation("doctors")
+        self.assertTrue(self.client.login(username="cached", password="cached-password"))
+        self.assertEqual(self.generation("doctors"), before)
+
+        user.first_name = "Renamed"
+        user.save()
+        self.assertNotEqual(self.generation("doctors"), before)
+
+
+# Paths seen by recording_middleware
+RECORDED_PATHS = []
+
+
+def recording_middleware(get_response):
+    """Test middleware that records the path of every request it sees"""
+
+    def middleware(request):
+        RECORDED_PATHS.append(request.path)
+        return get_response(request)
+
+    return middleware
+
+
+class InProcessTransportTests(TestCase):
+    """In-process API calls go through the middleware chain like HTTP requests"""
+
+    def setUp(self):
+        # The handler loads MIDDLEWARE once; start each test with a fresh one
+        patcher = mock.patch("kellcare.api_client._request_handler", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        RECORDED_PATHS.clear()
+
+    @override_settings(MIDDLEWARE=[*settings.MIDDLEWARE, "kellcare.tests.recording_middleware"])
+    def test_middleware_runs_and_the_payload_matches_http(self):
+        data = InProcessTransport("http://testserver").request("GET", "/api/departments/", params={"page_size": 5})
+        self.assertEqual(RECORDED_PATHS, ["/api/departments/"])
+        self.assertEqual(data, self.client.get("/api/departments/", {"page_size": 5}).json())
+
+    def test_endpoints_outside_the_api_fall_back(self):
+        with self.assertRaises(TransportUnavailable):
+            InProcessTransport("http://testserver").request("GET", "/admin/")
+
+
+class AsyncAPIClientTests(SimpleTestCase):
+    """The async client keeps blocking cache reads off the event loop"""
+
+    async def test_cache_reads_run_in_a_worker_thread(self):
+        client = APIClient(transport="inprocess")
+        threads = []
+
+        def get_cached(endpoint, params=None):
+            threads.append(threading.get_ident())
+            return {"count": 0}
+
+        with mock.patch.object(client, "get_cached", side_effect=get_cached):
+            self.assertEqual(await AsyncAPIClient(client).get("/api/doctors/"), {"count": 0})
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], threading.get_ident())
+
+
+def http_response(status_code, payload=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(payload or {}).encode()
+    return response
+
+
+@override_settings(KELLCARE_API_RETRIES=2, KELLCARE_API_RETRY_BACKOFF=0, KELLCARE_API_BREAKER_THRESHOLD=2, KELLCARE_API_BREAKER_RESET=30.0)
+class HTTPRetryAndBreakerTests(SimpleTestCase):
+    """The HTTP transport retries idempotent calls and stops calling a failing host"""
+
+    def setUp(self):
+        http_session_pool.reset()
+        self.addCleanup(http_session_pool.reset)
+        self.transport = HTTPTransport("http://api.invalid")
+
+    def send(self, *outcomes):
+        return mock.patch.object(self.transport.session, "request", side_effect=outcomes)
+
+    def test_gets_are_retried_after_gateway_errors(self):
+        with self.send(http_response(503), http_response(200, {"count": 1})) as request:
+            self.assertEqual(self.transport.request("GET", "/api/doctors/"), {"count": 1})
+        self.assertEqual(request.call_count, 2)
+        self.assertEqual(http_session_pool.stats()["retries"], 1)
+        self.assertEqual(self.transport.breaker.state, "closed")
+
+    def test_posts_are_not_retried(self):
+        with self.send(requests.exceptions.ConnectionError, http_response(201)) as request, self.assertRaises(requests.exceptions.ConnectionError):
+            self.transport.request("POST", "/api/contact-messages/", data={})
+        self.assertEqual(request.call_count, 1)
+
+    def test_breaker_opens_half_opens_and_closes(self):
+        breaker = self.transport.breaker
+        with mock.patch("kellcare.api_client.time.monotonic", return_value=1000.0) as clock:
+            # Each call fails all three attempts, which counts as one failure
+            with self.send(*[requests.exceptions.ConnectionError] * 6) as request:
+                for _ in range(2):
+                    with self.assertRaises(requests.exceptions.ConnectionError):
+                        self.transport.request("GET", "/api/doctors/")
+            self.assertEqual((request.call_count, breaker.state, breaker.opens), (6, "open", 1))
+
+            with self.send() as request, self.assertRaises(CircuitOpenError):
+                self.transport.request("GET", "/api/doctors/")
+            request.assert_not_called()
+
+            # After the reset timeout one trial call goes through; a failed trial reopens the breaker
+            clock.return_value = 1031.0
+            self.assertEqual(breaker.state, "half_open")
+            with self.send(http_response(500)), self.assertRaises(requests.exceptions.HTTPError):
+                self.transport.request("GET", "/api/doctors/")
+            self.assertEqual(breaker.state, "open")
+
+            clock.return_value = 1062.0
+            self.assertTrue(breaker.allow_request())
+            self.assertFalse(breaker.allow_request())
+            breaker.record_success()
+            self.assertEqual((breaker.state, breaker.failures), ("closed", 0))
+            self.assertEqual(breaker.short_circuits, 2)
+
+
+class FanOutDeadlineTests(SimpleTestCase):
+    """Calls that miss a fan-out deadline stop waiting on the network and can't hog the worker pool"""
+
+    def test_http_timeouts_are_cut_to_the_deadline(self):
+        transport = HTTPTransport("http://api.invalid")
+        with mock.patch.object(transport.session, "request", side_effect=requests.exceptions.Timeout) as send:
+            results = fan_out({"doctors": partial(transport.request, "GET", "/api/doctors/")}, timeout=0.5)
+        self.assertIsNone(results["doctors"])
+        self.assertTrue(send.called)
+        self.assertTrue(all(call.kwargs["timeout"] <= 0.5 for call in send.call_args_list))
+
+    def test_late_calls_holding_every_worker_refuse_new_batches(self):
+        _get_fan_out_executor()
+        release = threading.Event()
+        self.addCleanup(release.set)
+        with mock.patch("kellcare.api_client._fan_out_workers", 1):
+            self.assertEqual(fan_out({"slow": release.wait}, timeout=0.05).late, ["slow"])
+            self.assertEqual(get_client_stats()["fan_out_abandoned"], 1)
+            self.assertEqual(fan_out({"quick": lambda: 1}).late, ["quick"])
+
+            release.set()
+            for _ in range(100):
+                if not get_client_stats()["fan_out_abandoned"]:
+                    break
+                time.sleep(0.01)
+            self.assertEqual(fan_out({"quick": lambda: 1}), {"quick": 1})
+
+
+class SummaryStatsCacheTests(TestCase):
+    """/api/stats/summary/ is served from the cache until a Doctor or Department write"""
+
+    def setUp(self):
+        cache.clear()
+
+    def summary(self):
+        response = self.client.get("/api/stats/summary/")
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_writes_invalidate_the_cached_stats(self):
+        self.assertEqual(self.summary()["total_doctors"], 0)
+        with self.assertNumQueries(0):
+            get_summary_stats()
+
+        doctor = Doctor.objects.create(user=User.objects.create(username="statsdoc"), license_number="STAT1", specialization="cardiology", phone="555-0100", address="")
+        self.assertEqual((self.summary()["total_doctors"], self.summary()["available_doctors"]), (1, 1))
+
+        doctor.is_available = False
+        doctor.save()
+        self.assertEqual(self.summary()["available_doctors"], 0)
+
+        department = Department.objects.create(name="Cardiology", description="Heart")
+        self.assertEqual(self.summary()["total_departments"], 1)
+        department.delete()
+        self.assertEqual(self.summary()["total_departments"], 0)
+
+        doctor.delete()
+        self.assertEqual((self.summary()["total_doctors"], self.summary()["specializations"]), (0, []))
+
+
+class SparseFieldsetTests(TestCase):
+    """?fields= and ?expand= prune list payloads and reject unknown names"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("sparse", "sparse@example.com", "sparse")
+        Doctor.objects.create(user=cls.user, license_number="LIC-S1", specialization="cardiology", phone="555-0100", address="")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_known_fields(self):
+        response = self.client.get("/api/doctors/", {"fields": "id,specialization", "expand": "department"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()["results"][0]), {"id", "specialization", "department"})
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get("/api/doctors/", {"fields": "id,bogus,nope"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("bogus, nope", response.json()["fields"])
+
+        response = self.client.get("/api/doctors/", {"expand": "bogus"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("bogus", response.json()["expand"])
+
+
+class NormalizeAddressTests(SimpleTestCase):
+    """Geocode cache keys (and address fingerprints) drop units but keep the street, locality, state and ZIP"""
+
+    def test_units_next_to_the_street_are_dropped(self):
+        for address in ["123 Medical Plaza, Suite 300", "123 medical plaza ste. 500", "123 Medical Plaza #12", "Suite 4, 123 Medical Plaza"]:
+            with self.subTest(address=address):
+                self.assertEqual(normalize_address(address), "123 medical plaza")
+
+    def test_state_abbreviation_and_zip_are_kept(self):
+        self.assertEqual(normalize_address("123 Main St, Orlando, FL 32801"), "123 main st orlando fl 32801")
+        self.assertNotEqual(normalize_address("123 Main St, Orlando, FL 32801"), normalize_address("123 Main St, Orlando, FL 32803"))
+
+    def test_street_names_containing_unit_words_are_kept(self):
+        self.assertEqual(normalize_address("1 Building 7 Way, Floor 2"), "1 building 7 way")
+        self.assertEqual(normalize_address("40 Floor 3 Road, Orlando, FL 32801"), "40 floor 3 rd orlando fl 32801")
+
+
+class GeocodeCacheTests(TestCase):
+    """The two-level geocode cache"""
+
+    def setUp(self):
+        geocode_cache.clear()
+
+    @override_settings(KELLCARE_REVERSE_GEOHASH_PRECISION=8)
+    def test_stats_report_the_cell_size_at_the_equator(self):
+        reverse = geocode_cache.stats()["reverse"]
+        self.assertEqual((reverse["cell_size_m"], reverse["cell_size_latitude"]), ((38.2, 19.0), 0.0))
+
+    @override_settings(KELLCARE_GEOCODE_NEGATIVE_TTL=60, KELLCARE_GEOCODE_CACHE_TTL=3600)
+    def test_not_found_results_expire_after_the_negative_ttl(self):
+        start = timezone.now()
+        found = {"success": True, "latitude": 35.6, "longitude": -82.5, "formatted_address": "1 Main St", "error": None}
+        missing = {"success": False, "latitude": None, "longitude": None, "formatted_address": None, "error": "Address not found"}
+        with mock.patch("kellcare.utils.geocode_cache.timezone.now", return_value=start) as now, mock.patch(
+            "kellcare.utils.geocode_cache.time.time", return_value=start.timestamp()
+        ) as clock:
+            geocode_cache.set("forward", "nominatim", "1 main st", found)
+            geocode_cache.set("forward", "nominatim", "9 nowhere rd", missing)
+            geocode_cache.set("forward", "nominatim", "5 slow rd", dict(missing, error="Geocoding service timeout"))
+            self.assertEqual(geocode_cache.get("forward", "nominatim", "9 nowhere rd")["error"], "Address not found")
+            self.assertIsNone(geocode_cache.get("forward", "nominatim", "5 slow rd"))
+
+            for later in (start + timedelta(seconds=61), start + timedelta(seconds=3601)):
+                now.return_value, clock.return_value = later, later.timestamp()
+                # Both the in-process LRU and, once that is cleared, the table honour the expiry
+                for clear_lru in (False, True):
+                    if clear_lru:
+                        geocode_cache.clear()
+                    with self.subTest(seconds=(later - start).seconds, clear_lru=clear_lru):
+                        self.assertIsNone(geocode_cache.get("forward", "nominatim", "9 nowhere rd"))
+                        cached = geocode_cache.get("forward", "nominatim", "1 main st")
+                        self.assertEqual(cached is None, later > start + timedelta(seconds=3600))
+
+
+@override_settings(KELLCARE_GEOCODE_IN_BACKGROUND=False)
+class BulkUpdateCoordinatesTests(TestCase):
+    """POST /api/geocode/bulk-update/ parses its flags and checks the service"""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("bulk", "bulk@example.com", "bulk"))
+
+    def test_string_flags_are_parsed(self):
+        response = self.client.post("/api/geocode/bulk-update/", {"only_missing": "false", "force": "true", "update_patients": "false"})
+        self.assertEqual(response.status_code, 202, response.content)
+        job = GeocodingJob.objects.get(pk=response.json()["job_id"])
+        self.assertEqual((job.only_missing, job.force, job.targets), (False, True, ["doctors"]))
+
+    def test_unknown_service_is_rejected(self):
+        response = self.client.post("/api/geocode/bulk-update/", {"service": "bogus"}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("service", response.json()["details"])
+        self.assertFalse(GeocodingJob.objects.exists())
+
+
+@override_settings(KELLCARE_GEOCODE_IN_BACKGROUND=False, KELLCARE_GEOCODE_RETRY_AFTER=60)
+class GeocodingQueueTests(TestCase):
+    """Rows without coordinates are geocoded from the queue or the command, and failures expire"""
+
+    def add_doctor(self, number):
+        return Doctor.objects.create(
+            user=User.objects.create(username=f"queue{number}"), license_number=f"QUEUE{number}", specialization="cardiology", phone="555-0100", address=f"{number} Main St"
+        )
+
+    def test_expired_failures_are_forgotten(self):
+        doctors = [self.add_doctor(number) for number in range(3)]
+        queue = GeocodingQueue()
+        failure = {"success": False, "error": "Address not found"}
+        with mock.patch("kellcare.utils.geocoding_queue.address_to_coordinates", return_value=failure), mock.patch("kellcare.utils.geocoding_queue.time.monotonic") as clock:
+            clock.return_value = 1000.0
+            queue.enqueue(Doctor, [doctors[0].pk, doctors[1].pk])
+            while queue.process_next(timeout=0):
+                pass
+            self.assertEqual(len(queue._failed_until), 2)
+            self.assertEqual(queue.enqueue(Doctor, [doctors[0].pk]), 0)
+
+            clock.return_value = 1061.0
+            queue.enqueue(Doctor, [doctors[2].pk])
+            self.assertEqual(queue._failed_until, {})
+
+    def test_command_reads_rows_in_chunks(self):
+        doctors = [self.add_doctor(number) for number in range(5)]
+        success = {"success": True, "latitude": 35.6, "longitude": -82.5}
+        with mock.patch("kellcare.management.commands.geocode_missing_coordinates.CHUNK_SIZE", 2), mock.patch(
+            "kellcare.utils.geocoding_queue.address_to_coordinates", return_value=success
+        ):
+            call_command("geocode_missing_coordinates", "--models", "doctors", "--limit", "4", stdout=io.StringIO())
+        geocoded = Doctor.objects.filter(latitude__isnull=False).order_by("pk").values_list("pk", flat=True)
+        self.assertEqual(list(geocoded), [doctor.pk for doctor in doctors[:4]])
+
+
+class GeocodingJobClaimTests(TestCase):
+    """A bulk geocoding job is run by one claimant at a time"""
+
+    def test_a_claimed_job_is_not_run_again(self):
+        job = create_job(targets=["doctors"])
+        self.assertTrue(claim_job(job))
+        self.assertIsNone(claim_next_job())
+        self.assertIsNone(start_job_in_background(GeocodingJob.objects.get(pk=job.pk)))
+        with self.assertRaisesMessage(CommandError, "already running"):
+            call_command("bulk_geocode", "--resume", str(job.pk), stdout=io.StringIO())
+
+    def test_jobs_with_a_stale_heartbeat_are_reclaimed(self):
+        job = create_job(targets=["doctors"])
+        GeocodingJob.objects.filter(pk=job.pk).update(status="running", heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(claim_next_job().pk, job.pk)
+        self.assertIsNone(claim_next_job())
+
+
+class GeocodingJobRunTests(TestCase):
+    """Bulk geocoding jobs look each address up once and report what reached the provider"""
+
+    def setUp(self):
+        cache.clear()
+        geocode_cache.clear()
+
+    def add_doctor(self, number, address):
+        return Doctor.objects.create(
+            user=User.objects.create(username=f"job{number}"), license_number=f"JOB{number}", specialization="cardiology", phone="555-0100", address=address
+        )
+
+    def lookup(self, address, service):
+        return {
+            "latitude": 35.6,
+            "longitude": -82.5,
+            "formatted_address": address,
+            "success": True,
+            "error": None,
+            "provider": "Nominatim",
+            "service_used": service,
+            "tried": [service],
+            "elapsed": 0.0,
+        }
+
+    def test_only_provider_calls_count_as_lookups(self):
+        self.add_doctor(1, "1 Main St, Asheville, NC 28801")
+        self.add_doctor(2, "1 Main Street, Asheville, NC 28801")
+        self.add_doctor(3, "9 Cached Rd, Asheville, NC 28801")
+        geocode_cache.set("forward", "nominatim", normalize_address("9 Cached Rd, Asheville, NC 28801"), self.lookup("9 Cached Rd", "nominatim"))
+
+        with mock.patch("kellcare.utils.geocoding._lookup", side_effect=self.lookup) as provider:
+            job = run_job(create_job(targets=["doctors"], chunk_size=2))
+        self.assertEqual(job.status, "completed")
+        self.assertEqual(provider.call_count, 1)
+        self.assertEqual({key: job.progress["dedup"][key] for key in ("rows", "lookups", "cache_hits", "saved_calls")}, {"rows": 3, "lookups": 1, "cache_hits": 1, "saved_calls": 2})
+
+    def test_rerun_skips_rows_geocoded_from_their_current_address(self):
+        doctors = [self.add_doctor(number, f"{number} Oak Ave, Asheville, NC 28801") for number in range(3)]
+        with mock.patch("kellcare.utils.geocoding._lookup", side_effect=self.lookup) as provider:
+            run_job(create_job(targets=["doctors"]))
+            self.assertEqual(provider.call_count, 3)
+
+            job = run_job(create_job(targets=["doctors"]))
+            self.assertEqual(provider.call_count, 3)
+            self.assertEqual((job.progress["doctors"]["skipped"], job.progress["doctors"]["updated"]), (3, 0))
+
+            Doctor.objects.filter(pk=doctors[0].pk).update(address="7 Elm St, Asheville, NC 28801")
+            job = run_job(create_job(targets=["doctors"]))
+            self.assertEqual(provider.call_count, 4)
+            self.assertEqual((job.progress["doctors"]["skipped"], job.progress["doctors"]["updated"]), (2, 1))
+
+            job = run_job(create_job(targets=["doctors"], force=True))
+            self.assertEqual(job.progress["doctors"]["updated"], 3)
+
+    def test_a_failed_job_resumes_from_its_checkpoint(self):
+        doctors = [self.add_doctor(number, f"{number} Pine St, Asheville, NC 28801") for number in range(5)]
+        chunks = []
+
+        def crash_on_second_chunk(job, name, rows, resolved, dedup):
+            chunks.append([row.pk for row in rows])
+            if len(chunks) == 2:
+                raise RuntimeError("worker died")
+            return _process_chunk(job, name, rows, resolved, dedup)
+
+        with mock.patch("kellcare.utils.geocoding._lookup", side_effect=self.lookup) as provider:
+            with mock.patch("kellcare.utils.geocoding_jobs._process_chunk", side_effect=crash_on_second_chunk), self.assertLogs("kellcare.utils.geocoding_jobs", "ERROR"):
+                job = run_job(create_job(targets=["doctors"], chunk_size=2))
+            self.assertEqual((job.status, job.error), ("failed", "worker died"))
+            self.assertEqual(job.progress["doctors"]["last_id"], doctors[1].pk)
+            self.assertEqual(Doctor.objects.filter(latitude__isnull=False).count(), 2)
+
+            call_command("bulk_geocode", "--resume", str(job.pk), stdout=io.StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, "completed")
+        # Only the rows after the checkpoint were looked up again
+        self.assertEqual(provider.call_count, 5)
+        self.assertEqual((job.progress["doctors"]["processed"], job.progress["doctors"]["updated"]), (5, 5))
+        self.assertFalse(Doctor.objects.filter(latitude__isnull=True).exists())
+        with self.assertRaisesMessage(CommandError, "already completed"):
+            call_command("bulk_geocode", "--resume", str(job.pk), stdout=io.StringIO())
+
+    def test_remembered_addresses_are_bounded(self):
+        for number in range(5):
+            self.add_doctor(number, f"{number} Main St, Asheville, NC 28801")
+        with mock.patch("kellcare.utils.geocoding_jobs.RESOLVED_MAX_ENTRIES", 2), mock.patch("kellcare.utils.geocoding._lookup", side_effect=self.lookup):
+            resolved = OrderedDict()
+            _process_chunk(create_job(targets=["doctors"]), "doctors", list(Doctor.objects.order_by("pk")), resolved, {"rows": 0, "lookups": 0, "cache_hits": 0})
+        self.assertEqual(list(resolved), [normalize_address("3 Main St, Asheville, NC 28801"), normalize_address("4 Main St, Asheville, NC 28801")])
+
+
+class GeocodeServiceValidationTests(TestCase):
+    """Geocoding endpoints only accept known services, and never register new ones"""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user("geocoder"))
+
+    def test_unknown_services_are_rejected(self):
+        requests = [
+            ("/api/geocode/address/", {"address": "1 Main St"}),
+            ("/api/geocode/reverse/", {"latitude": 35.6, "longitude": -82.5}),
+            ("/api/geocode/doctor/update/", {"doctor_id": 1}),
+            ("/api/geocode/patient/update/", {"patient_id": 1}),
+        ]
+        for url, body in requests:
+            for service in ("bogus1", ["x"]):
+                with self.subTest(url=url, service=service):
+                    response = self.client.post(url, {**body, "service": service}, content_type="application/json")
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn("service", response.json()["details"])
+        self.assertNotIn("bogus1", geocoding._services)
+
+    def test_get_geocode_service_rejects_unknown_names(self):
+        with self.assertRaises(ValueError):
+            geocoding.get_geocode_service("bogus1")
+        self.assertNotIn("bogus1", geocoding._services)
+
+
+class TokenBucketLimiterTests(SimpleTestCase):
+    """Geocoding callers queue for rate-limit tokens, and give up past their maximum wait"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.limiter = TokenBucketLimiter("test", rate=2.0, capacity=2.0, directory=directory.name)
+        clock = mock.patch("kellcare.utils.rate_limiter.time.time", return_value=1000.0)
+        self.clock = clock.start()
+        self.addCleanup(clock.stop)
+        sleep = mock.patch("kellcare.utils.rate_limiter.time.sleep")
+        self.sleep = sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def test_callers_wait_in_turn_after_a_burst(self):
+        self.assertEqual([self.limiter.acquire() for _ in range(2)], [0.0, 0.0])
+        # The bucket goes negative, so each caller waits for its own slot
+        self.assertEqual([self.limiter.acquire() for _ in range(2)], [0.5, 1.0])
+        self.assertEqual([call.args[0] for call in self.sleep.call_args_list], [0.5, 1.0])
+        self.assertEqual(self.limiter.stats()["waited"], 2)
+
+        # An idle bucket refills only up to its capacity
+        self.clock.return_value = 2000.0
+        self.assertEqual([self.limiter.acquire() for _ in range(3)], [0.0, 0.0, 0.5])
+
+    def test_waits_past_the_maximum_raise_without_reserving(self):
+        self.limiter.acquire()
+        self.limiter.acquire()
+        with self.assertRaises(RateLimitExceeded) as raised:
+            self.limiter.acquire(max_wait=0.25)
+        self.assertEqual((raised.exception.provider, raised.exception.wait), ("test", 0.5))
+        self.assertEqual(self.limiter.acquire(max_wait=0.5), 0.5)
+        self.assertEqual(self.limiter.stats()["rejected"], 1)
+
+    def test_geocoding_reports_a_rejected_wait(self):
+        service = geocoding.GeocodeService("nominatim")
+        with mock.patch.object(service.rate_limiter, "acquire", side_effect=RateLimitExceeded("nominatim", 30.0)), mock.patch.object(
+            service.geocoder, "geocode"
+        ) as provider:
+            result = service.get_coordinates("1 Main St, Asheville, NC")
+        provider.assert_not_called()
+        self.assertEqual((result["success"], result["error"]), (False, "Geocoding rate limit exceeded"))
+
+
+@override_settings(
+    GOOGLE_MAPS_API_KEY="test-key",
+    KELLCARE_GEOCODE_CHAIN=["nominatim", "google"],
+    KELLCARE_GEOCODE_FAILOVER=True,
+    KELLCARE_GEOCODE_BREAKER_FAILURES=2,
+    KELLCARE_GEOCODE_BREAKER_COOLDOWN=60,
+)
+class ProviderFailoverTests(TestCase):
+    """Lookups fail over to the next provider, and a failing provider is retried after its cooldown"""
+
+    def setUp(self):
+        geocode_cache.clear()
+        for patcher in (
+            mock.patch.dict(geocoding._services, clear=True),
+            mock.patch.dict("kellcare.utils.provider_health._health", clear=True),
+            mock.patch.object(TokenBucketLimiter, "acquire", return_value=0.0),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        clock = mock.patch("kellcare.utils.provider_health.time.monotonic", return_value=1000.0)
+        self.clock = clock.start()
+        self.addCleanup(clock.stop)
+
+        self.nominatim = geocoding.get_geocode_service("nominatim")
+        self.google = geocoding.get_geocode_service("google")
+        self.assertEqual(self.google.provider, "google")
+        found = SimpleNamespace(latitude=35.6, longitude=-82.5, address="1 Main St, Asheville, NC")
+        for service in (self.nominatim, self.google):
+            patcher = mock.patch.object(service.geocoder, "geocode", return_value=found)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def lookup(self, number):
+        return geocoding.address_to_coordinates(f"{number} Main St, Asheville, NC", service="nominatim", use_cache=False)
+
+    def test_failover_opens_the_breaker_and_half_open_trials_decide_recovery(self):
+        self.nominatim.geocoder.geocode.side_effect = GeocoderTimedOut
+        for number in range(2):
+            result = self.lookup(number)
+            self.assertEqual((result["success"], result["service_used"], result["tried"]), (True, "google", ["nominatim", "google"]))
+        self.assertEqual(self.nominatim.health.stats()["state"], "open")
+
+        # Open: nominatim is skipped without a call
+        self.assertEqual(self.lookup(2)["service_used"], "google")
+        self.assertEqual(self.nominatim.geocoder.geocode.call_count, 2)
+
+        # Half-open: the trial call fails and the breaker opens again
+        self.clock.return_value = 1061.0
+        self.assertEqual(self.lookup(3)["service_used"], "google")
+        self.assertEqual(self.nominatim.geocoder.geocode.call_count, 3)
+        self.assertEqual(self.nominatim.health.stats()["state"], "open")
+
+        # Half-open again: the provider has recovered, so the trial closes the breaker
+        self.nominatim.geocoder.geocode.side_effect = None
+        self.clock.return_value = 1122.0
+        self.assertEqual(self.lookup(4)["service_used"], "nominatim")
+        self.assertEqual(self.nominatim.health.stats()["state"], "closed")
+        self.assertEqual(self.lookup(5)["tried"], ["nominatim"])
+
+    def test_not_found_does_not_fail_over(self):
+        self.nominatim.geocoder.geocode.return_value = None
+        result = self.lookup(0)
+        self.assertEqual((result["error"], result["tried"]), ("Address not found", ["nominatim"]))
+        self.google.geocoder.geocode.assert_not_called()
+
+
+class LocalGazetteerTests(SimpleTestCase):
+    """The local gazetteer matches bounded candidate sets and only reads its index file"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.csv_path = os.path.join(directory.name, "gazetteer.csv")
+        self.index_path = os.path.join(directory.name, "gazetteer.idx")
+        rows = ["kind,name,city,state,postal_code,latitude,longitude", "street,Sweeten Creek Rd,Asheville,NC,28803,35.5300,-82.5200"]
+        # Filler streets that share trigrams with the real one
+        rows += [f"street,Creek {i} Rd,Asheville,NC,28803,35.{i:04d},-82.5000" for i in range(3000)]
+        # Near the pole a 10 km radius spans many 0.1-degree columns
+        rows.append("street,Polar Way,Alert,NU,,82.5000,-62.0000")
+        with open(self.csv_path, "w", encoding="utf-8") as handle:
+            handle.write("\n".join(rows) + "\n")
+
+    def test_fuzzy_matching_compares_a_bounded_candidate_set(self):
+        gazetteer = LocalGazetteer.from_csv(self.csv_path)
+        with mock.patch("kellcare.utils.gazetteer.difflib.get_close_matches", wraps=difflib.get_close_matches) as matcher:
+            location = gazetteer.geocode("70 Sweetn Creek Rd, Asheville")
+        self.assertEqual(location.address, "Sweeten Creek Rd, Asheville, NC 28803")
+        self.assertTrue(matcher.called)
+        self.assertTrue(all(len(call.args[1]) <= FUZZY_CANDIDATES for call in matcher.call_args_list))
+
+    def test_load_never_writes_an_index(self):
+        with self.assertLogs("kellcare.utils.gazetteer", "WARNING"):
+            LocalGazetteer.load(self.csv_path, self.index_path)
+        self.assertFalse(os.path.exists(self.index_path))
+
+        call_command("build_gazetteer", "--csv", self.csv_path, "--output", self.index_path, stdout=io.StringIO())
+        with open(self.index_path, encoding="utf-8") as handle:
+            self.assertEqual(json.load(handle)["version"], 2)
+        with mock.patch.object(LocalGazetteer, "from_csv") as from_csv:
+            gazetteer = LocalGazetteer.load(self.csv_path, self.index_path)
+        from_csv.assert_not_called()
+        self.assertEqual(gazetteer.geocode("Sweeten Creek Rd, Asheville").address, "Sweeten Creek Rd, Asheville, NC 28803")
+
+    @override_settings(KELLCARE_GAZETTEER_REVERSE_MAX_KM=10.0)
+    def test_reverse_searches_every_column_the_radius_reaches(self):
+        gazetteer = LocalGazetteer.from_csv(self.csv_path)
+        # 0.6 degrees of longitude is about 8 km at 82.5 degrees north
+        self.assertEqual(gazetteer.reverse("82.5, -61.4").address, "Polar Way, Alert, NU")
+        self.assertIsNone(gazetteer.reverse("82.5, -60.0"))
+
+
+class NearbyDoctorsEdgeTests(TestCase):
+    """Doctors just inside the search radius survive the bounding-box prefilter"""
+
+    CENTER = (35.5951, -82.5515)
+
+    def add_doctor(self, number, distance_km, bearing):
+        """A doctor ``distance_km`` from CENTER due north ("n") or due east ("e")"""
+        latitude, longitude = self.CENTER
+        if bearing == "n":
+            latitude += math.degrees(distance_km / EARTH_RADIUS_KM)
+        else:
+            # Solve the haversine formula for the longitude offset at a fixed latitude
+            phi = math.radians(latitude)
+            longitude += math.degrees(2 * math.asin(math.sin(distance_km / (2 * EARTH_RADIUS_KM)) / math.cos(phi)))
+        return Doctor.objects.create(
+            user=User.objects.create(username=f"edge{number}"),
+            license_number=f"EDGE{number}",
+            specialization="cardiology",
+            phone="555-0100",
+            address="",
+            latitude=round(latitude, 6),
+            longitude=round(longitude, 6),
+        )
+
+    def test_batch_distances_match_haversine_km(self):
+        points = [(35.6, -82.5), (-33.9, 151.2), (64.1, -21.9), (0.0, 179.9), (35.5951, -82.5515)]
+        distances = haversine_km_batch(*self.CENTER, array("d", [lat for lat, _ in points]), array("d", [lng for _, lng in points]))
+        for (lat, lng), distance in zip(points, distances):
+            self.assertAlmostEqual(distance, haversine_km(*self.CENTER, lat, lng), places=6)
+
+    def test_points_at_the_radius_edge_are_found(self):
+        inside = [self.add_doctor(1, 9.995, "n"), self.add_doctor(2, 9.995, "e")]
+        self.add_doctor(3, 10.005, "n")
+        index = DoctorSpatialIndex()
+        index.build()
+        for name, search in (("database", nearby_doctors_from_db), ("index", index.search)):
+            with self.subTest(search=name):
+                matches = search(*self.CENTER, 10, limit=10)
+                self.assertEqual(sorted(doctor_id for doctor_id, _ in matches), sorted(doctor.pk for doctor in inside))
+                self.assertTrue(all(distance <= 10 for _, distance in matches))
+
+    def test_nearby_endpoint_skips_rows_the_index_has_not_caught_up_with(self):
+        doctors = [self.add_doctor(number, 2 * number, "n") for number in range(1, 4)]
+        self.client.force_login(User.objects.create_superuser("nearby", "nearby@example.com", "nearby"))
+        url = f"/api/doctors/nearby/?lat={self.CENTER[0]}&lng={self.CENTER[1]}&radius_km=10"
+        doctor_index.build()
+        self.assertEqual([result["id"] for result in self.client.get(url).json()["results"]], [doctor.pk for doctor in doctors])
+
+        # Neither write reaches the index: deletes only refresh it on commit, update() sends no signals
+        doctors[0].delete()
+        Doctor.objects.filter(pk=doctors[1].pk).update(is_available=False)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result["id"] for result in response.json()["results"]], [doctors[2].pk])
+
+
+@override_settings(KELLCARE_NETWORK_REPORT_IN_BACKGROUND=False)
+class NearestSpecialistsReportTests(TestCase):
+    """The report endpoint only reads stored builds, and only staff can queue one"""
+
+    url = "/api/stats/nearest-specialists/"
+
+    @classmethod
+    def setUpTestData(cls):
+        for i, (latitude, longitude) in enumerate([(35.59, -82.55), (35.80, -82.30)]):
+            Doctor.objects.create(
+                user=User.objects.create(username=f"specialist{i}"),
+                license_number=f"SPEC{i}",
+                specialization="cardiology",
+                phone="555-0100",
+                address="",
+                latitude=latitude,
+                longitude=longitude,
+            )
+        for i, (latitude, longitude) in enumerate([(35.60, -82.56), (35.61, -82.50), (35.79, -82.31)]):
+            Patient.objects.create(
+                user=User.objects.create(username=f"resident{i}"),
+                patient_id=f"R{i:04d}",
+                date_of_birth=date(1980, 1, 1),
+                gender="F",
+                phone="555-0200",
+                emergency_contact="Contact",
+                emergency_phone="555-0300",
+                address="",
+                latitude=latitude,
+                longitude=longitude,
+            )
+        cls.staff = User.objects.create_user("planner", is_staff=True)
+        cls.member = User.objects.create_user("member")
+
+    def test_only_staff_can_queue_a_build(self):
+        self.client.force_login(self.member)
+        self.assertEqual(self.client.get(self.url, {"refresh": 1}).status_code, 403)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertFalse(NetworkReport.objects.exists())
+
+        self.client.force_login(self.staff)
+        first = self.client.get(self.url, {"refresh": 1})
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(first.json()["status"], "pending")
+        # A second refresh reuses the queued build
+        self.assertEqual(self.client.get(self.url, {"refresh": 1}).json()["report_id"], first.json()["report_id"])
+
+    def test_reads_the_stored_report_without_touching_patients(self):
+        self.client.force_login(self.staff)
+        self.client.get(self.url, {"refresh": 1, "specialization": "cardiology"})
+        call_command("nearest_specialists", "--run-pending", stdout=io.StringIO())
+        call_command("nearest_specialists", "--store", "--report", os.devnull, stdout=io.StringIO())
+
+        for params in ({"specialization": "cardiology"}, {}):
+            with self.subTest(params=params):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(any("kellcare_patient" in query["sql"] for query in queries.captured_queries))
+                report = response.json()
+                self.assertEqual(report["patients"], 3)
+                self.assertEqual(report["specializations"]["cardiology"]["patients"], 3)
+
+
+@override_settings(KELLCARE_EXACT_COUNT_MAX=5, KELLCARE_COUNT_ESTIMATE_CAP=3)
+class EstimatedCountPaginationTests(TestCase):
+    """Pages past an estimated count that is too low are still served"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("pager", "pager@example.com", "pager")
+        doctor = Doctor.objects.create(user=User.objects.create(username="pagerdoc"), license_number="PAGE1", specialization="cardiology", phone="555-0100", address="")
+        patient = Patient.objects.create(
+            user=User.objects.create(username="pagerpatient"),
+            patient_id="PG0001",
+            date_of_birth=date(1980, 1, 1),
+            gender="F",
+            phone="555-0200",
+            emergency_contact="Contact",
+            emergency_phone="555-0300",
+            address="",
+        )
+        # Confirmed appointments are sparse at the start of the id range and dense at its end,
+        # so the estimate extrapolated from the first three of them is 4 while there are 8
+        now = timezone.now()
+        confirmed = {0, 9, *range(14, 20)}
+        Appointment.objects.bulk_create(
+            Appointment(patient=patient, doctor=doctor, appointment_date=now + timedelta(hours=i), reason="Checkup", status="confirmed" if i in confirmed else "scheduled")
+            for i in range(20)
+        )
+        cls.confirmed = list(Appointment.objects.filter(status="confirmed").order_by("pk").values_list("pk", flat=True))
+
+    def setUp(self):
+        cache.clear()
+
+    def paginator(self):
+        return EstimatedCountPaginator(Appointment.objects.filter(status="confirmed").order_by("pk"), 3)
+
+    def test_pages_past_a_low_estimate(self):
+        paginator = self.paginator()
+        self.assertEqual((paginator.count, paginator.count_mode), (4, "estimate"))
+        self.assertEqual(paginator.num_pages, 2)
+
+        second = self.paginator().page(2)
+        self.assertEqual([row.pk for row in second], self.confirmed[3:6])
+        self.assertTrue(second.has_next())
+
+        paginator = self.paginator()
+        last = paginator.page(3)
+        self.assertEqual([row.pk for row in last], self.confirmed[6:])
+        self.assertFalse(last.has_next())
+        self.assertEqual((paginator.count, paginator.count_exact), (8, True))
+
+        self.assertEqual(list(self.paginator().page(5)), [])
+
+    def test_api_and_admin_serve_the_last_real_page(self):
+        self.client.force_login(self.user)
+        with mock.patch("kellcare.pagination.CountedPageNumberPagination.page_size", 3):
+            response = self.client.get("/api/appointments/", {"status": "confirmed", "ordering": "appointment_date", "page": 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.json()["next"])
+
+        with mock.patch.object(AppointmentAdmin, "list_per_page", 3):
+            response = self.client.get("/admin/kellcare/appointment/", {"status__exact": "confirmed", "o": "3", "p": 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row.pk for row in response.context["cl"].result_list], self.confirmed[6:])
+
+
+
+class KeysetPaginationTests(TestCase):
+    """?cursor= pages never skip or repeat rows, even across equal keys and concurrent inserts"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("keyset", "keyset@example.com", "keyset")
+        cls.doctor = Doctor.objects.create(user=User.objects.create(username="keysetdoc"), license_number="KEY1", specialization="cardiology", phone="555-0100", address="")
+        cls.patient = Patient.objects.create(
+            user=User.objects.create(username="keysetpatient"),
+            patient_id="KS0001",
+            date_of_birth=date(1980, 1, 1),
+            gender="F",
+            phone="555-0200",
+            emergency_contact="Contact",
+            emergency_phone="555-0300",
+            address="",
+        )
+        # Three appointments on each of three dates, so pages break inside runs of equal keys
+        cls.dates = [timezone.now().replace(microsecond=0) + timedelta(days=day) for day in range(3)]
+        Appointment.objects.bulk_create(cls.appointment(cls.dates[i // 3]) for i in range(9))
+
+    @classmethod
+    def appointment(cls, when):
+        return Appointment(patient=cls.patient, doctor=cls.doctor, appointment_date=when, reason="Checkup")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def expected(self):
+        return list(Appointment.objects.order_by("-appointment_date", "-id").values_list("pk", flat=True))
+
+    def page(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.json()
+        return data, [row["id"] for row in data["results"]]
+
+    def test_walk_forward_and_back_across_equal_dates(self):
+        data, forward = self.page("/api/appointments/", {"cursor": "", "page_size": 2})
+        # The first page ends inside the newest date's run. Insert one row that sorts before it
+        # (already passed, so not seen going forward) and one ahead of it (seen exactly once)
+        behind = Appointment.objects.create(patient=self.patient, doctor=self.doctor, appointment_date=self.dates[2], reason="Walk-in")
+        ahead = Appointment.objects.create(patient=self.patient, doctor=self.doctor, appointment_date=self.dates[0], reason="Walk-in")
+        while data["next"]:
+            data, ids = self.page(data["next"])
+            forward += ids
+        self.assertIsNone(data["next"])
+        self.assertEqual(forward, [pk for pk in self.expected() if pk != behind.pk])
+        self.assertIn(ahead.pk, forward)
+
+        backward = ids
+        while data["previous"]:
+            data, ids = self.page(data["previous"])
+            backward = ids + backward
+        self.assertEqual(backward, self.expected())
+
+    def test_malformed_cursors_are_not_found(self):
+        # Not base64 JSON, {"v":[],"r":0} and {"v":["not a date",1],"r":0}
+        for cursor in ("not-a-cursor", "eyJ2IjpbXSwiciI6MH0", "eyJ2IjpbIm5vdCBhIGRhdGUiLDFdLCJyIjowfQ"):
+            with self.subTest(cursor=cursor):
+                response = self.client.get("/api/appointments/", {"cursor": cursor})
+                self.assertEqual(response.status_code, 404)
@@ -1,15 +1,19 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name = "kellcare"
 
+# API-backed pages have ASGI-native versions for async deployments
+pages = async_views if settings.KELLCARE_ASYNC_VIEWS else views
+
 urlpatterns = [
-    path("", views.home, name="home"),
+    path("", pages.home, name="home"),
     path("about/", views.about, name="about"),
     path("services/", views.services, name="services"),
     path("contact/", views.contact, name="contact"),
     path("bestsellers/", views.bestsellers, name="bestsellers"),
-    path("urgent-care/", views.urgent_care, name="urgent_care"),
-    path("locations/", views.locations, name="locations"),
-    path("nursing-homes/", views.nursing_homes, name="nursing_homes"),
+    path("urgent-care/", pages.urgent_care, name="urgent_care"),
+    path("locations/", pages.locations, name="locations"),
+    path("nursing-homes/", pages.nursing_homes, name="nursing_homes"),
 ]
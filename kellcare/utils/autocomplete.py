@@ -0,0 +1,324 @@
+"""
+In-memory typeahead index of doctors and patients
+
+Every doctor and patient is reduced to a few normalized keys: the words of
+their first and last name and patient id (lowercased, accents stripped), the
+same values with punctuation removed ("o'brien", "p0001"), and the digits of
+their phone number. All keys sit in one sorted list, with a parallel ``array`` of
+record references. A prefix lookup is a binary search followed by a short walk
+over the keys that share the prefix, so the database is never queried.
+
+The index is built once per process on first use. The Doctor, Patient and User
+receivers in kellcare.signals keep it current by re-reading the written rows
+once their transaction commits, and record them as IndexChange rows that other
+processes apply on their next lookup (see kellcare.utils.index_changes), so a
+patient registering elsewhere costs this process one small query, not a rebuild.
+"""
+
+import bisect
+import logging
+import re
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+
+from django.db import transaction
+
+from ..models import Doctor, Patient
+from .index_changes import ChangeFollowingIndex, latest_change_id
+
+logger = logging.getLogger(__name__)
+
+# Record kinds; a reference is ``pk * 2 + kind code``
+KINDS = ("doctor", "patient")
+
+# Keys a lookup examines before giving up on filling ``limit`` results
+MAX_SCAN = 2000
+
+_WORDS = re.compile(r"[^\W_]+")
+_NON_DIGITS = re.compile(r"\D")
+
+SPECIALIZATION_LABELS = dict(Doctor.SPECIALIZATION_CHOICES)
+
+
+def normalize_words(text):
+    """Lowercase words of ``text`` with accents removed ("José-María" -> ["jose", "maria"])"""
+    text = unicodedata.normalize("NFKD", text or "")
+    return _WORDS.findall("".join(char for char in text if not unicodedata.combining(char)).casefold())
+
+
+def normalize_terms(text):
+    """Whitespace-separated terms of ``text``, each normalized and joined into one word ("P-0001 o'brien" -> ["p0001", "obrien"])"""
+    return [term for term in ("".join(normalize_words(part)) for part in (text or "").split()) if term]
+
+
+def _text_keys(*values):
+    """Every word of each value, plus each value joined up when it has several ("Mary-Jane" -> mary, jane, maryjane)"""
+    keys = set()
+    for value in values:
+        words = normalize_words(value)
+        keys.update(words)
+        if len(words) > 1:
+            keys.add("".join(words))
+    return keys
+
+
+def _join_keys(keys):
+    """Keys of one record as a single string, so "another key starts with" is one substring test"""
+    return "".join(f"\0{key}" for key in sorted(keys))
+
+
+def _split_keys(joined):
+    return joined.split("\0")[1:]
+
+
+def _doctor_entry(doctor_id, first_name, last_name, specialization, phone):
+    keys = _text_keys(first_name, last_name)
+    digits = _NON_DIGITS.sub("", phone or "")
+    if digits:
+        keys.add(digits)
+    label = f"Dr. {first_name} {last_name}".strip()
+    return doctor_id * 2, label, SPECIALIZATION_LABELS.get(specialization, specialization), keys
+
+
+def _patient_entry(patient_id, first_name, last_name, code, phone):
+    keys = _text_keys(first_name, last_name, code)
+    digits = _NON_DIGITS.sub("", phone or "")
+    if digits:
+        keys.add(digits)
+    return patient_id * 2 + 1, f"{first_name} {last_name}".strip(), code, keys
+
+
+def _doctor_rows(ids=None):
+    doctors = Doctor.objects.order_by()
+    if ids is not None:
+        doctors = doctors.filter(pk__in=ids)
+    return doctors.values_list("id", "user__first_name", "user__last_name", "specialization", "phone")
+
+
+def _patient_rows(ids=None):
+    patients = Patient.objects.order_by()
+    if ids is not None:
+        patients = patients.filter(pk__in=ids)
+    return patients.values_list("id", "user__first_name", "user__last_name", "patient_id", "phone")
+
+
+class AutocompleteIndex(ChangeFollowingIndex):
+    """Sorted-key prefix index over doctor and patient names, patient ids and phone numbers"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._init_sync()
+        self.counters = {"builds": 0, "updates": 0, "removals": 0, "searches": 0}
+        self.built_at = None
+        self.build_seconds = None
+        self._clear()
+
+    def _clear(self):
+        self.keys = []  # sorted normalized keys
+        self.refs = array("q")  # record reference of each key
+        self.records = {}  # reference -> (label, detail, keys joined as "\0key\0key")
+
+    def __len__(self):
+        return len(self.records)
+
+    # Writes (callers hold the lock)
+
+    def _upsert(self, ref, label, detail, keys):
+        self._remove(ref)
+        for key in keys:
+            position = bisect.bisect_left(self.keys, key)
+            self.keys.insert(position, key)
+            self.refs.insert(position, ref)
+        self.records[ref] = (label, detail, _join_keys(keys))
+
+    def _remove(self, ref):
+        record = self.records.pop(ref, None)
+        if record is None:
+            return False
+        for key in _split_keys(record[2]):
+            position = bisect.bisect_left(self.keys, key)
+            while self.refs[position] != ref:
+                position += 1
+            del self.keys[position]
+            del self.refs[position]
+        return True
+
+    @classmethod
+    def from_entries(cls, entries):
+        """Standalone index over (ref, label, detail, keys) entries, sorted in one pass"""
+        index = cls()
+        pairs = []
+        for ref, label, detail, keys in entries:
+            index.records[ref] = (label, detail, _join_keys(keys))
+            pairs.extend((key, ref) for key in keys)
+        pairs.sort()
+        index.keys = [key for key, _ in pairs]
+        index.refs = array("q", (ref for _, ref in pairs))
+        return index
+
+    @staticmethod
+    def _database_entries(doctor_ids=None, patient_ids=None):
+        for row in _doctor_rows(doctor_ids).iterator(chunk_size=5000):
+            yield _doctor_entry(*row)
+        for row in _patient_rows(patient_ids).iterator(chunk_size=5000):
+            yield _patient_entry(*row)
+
+    def build(self):
+        """Load every doctor and patient from the database, replacing the current contents"""
+        started = time.perf_counter()
+        # Changes recorded while the rows are read are applied again by the next sync
+        change_id = latest_change_id()
+        fresh = self.from_entries(self._database_entries())
+
+        with self._lock:
+            self.keys, self.refs, self.records = fresh.keys, fresh.refs, fresh.records
+            self._mark_synced(change_id)
+            self.built_at = time.time()
+            self.build_seconds = time.perf_counter() - started
+            self.counters["builds"] += 1
+        logger.info(f"Built autocomplete index with {len(self)} records in {self.build_seconds:.3f}s")
+
+    def apply_changes(self, changes):
+        self.refresh(
+            doctor_ids={object_id for _, kind, object_id in changes if kind == "doctor"},
+            patient_ids={object_id for _, kind, object_id in changes if kind == "patient"},
+        )
+
+    def refresh(self, doctor_ids=(), patient_ids=()):
+        """Re-read the given doctors and patients from the database; deleted ones are removed"""
+        stale = {pk * 2 for pk in doctor_ids} | {pk * 2 + 1 for pk in patient_ids}
+        # Not built yet: the build reads the rows
+        if not stale or self.last_change_id is None:
+            return
+        entries = list(self._database_entries(list(doctor_ids), list(patient_ids)))
+        with self._lock:
+            for entry in entries:
+                stale.discard(entry[0])
+                self._upsert(*entry)
+                self.counters["updates"] += 1
+            for ref in stale:
+                self.counters["removals"] += self._remove(ref)
+
+    def refresh_on_commit(self, doctor_ids=(), patient_ids=()):
+        """Schedule ``refresh`` for after the current transaction commits"""
+        doctor_ids, patient_ids = list(doctor_ids), list(patient_ids)
+        transaction.on_commit(lambda: self.refresh(doctor_ids, patient_ids))
+
+    # Reads
+
+    def search(self, query, kinds=None, limit=10):
+        """
+        Doctors and patients with a key starting with every word of ``query``
+
+        Punctuation inside a word is dropped ("P-00" -> "p00", "O'Br" -> "obr"), and a
+        query of digits only ("555 01") is matched as one number. The lookup walks the
+        keys under the word with the fewest of them, stopping at ``limit`` matches or
+        MAX_SCAN keys.
+
+        Args:
+            query (str): Text as typed
+            kinds: Optional subset of KINDS
+            limit (int): Maximum results
+
+        Returns:
+            list: {"type", "id", "label", "detail"} in key order (shorter and alphabetically earlier keys first)
+        """
+        tokens = normalize_terms(query)
+        if tokens and all(token.isdigit() for token in tokens):
+            tokens = ["".join(tokens)]
+        if not tokens or limit < 1:
+            return []
+        kind_codes = {KINDS.index(kind) for kind in kinds} if kinds else None
+
+        with self._lock:
+            self.counters["searches"] += 1
+            # Walk the word with the fewest keys; the others must start another key of the record
+            ranges = {token: self._range(token) for token in tokens}
+            lead = min(ranges, key=lambda token: ranges[token][1] - ranges[token][0])
+            others = list(tokens)
+            others.remove(lead)
+            needles = [f"\0{token}" for token in others]
+            start, end = ranges[lead]
+            records = self.records
+            found, seen = [], set()
+            for ref in self.refs[start : min(end, start + MAX_SCAN)]:
+                if ref in seen or (kind_codes is not None and ref & 1 not in kind_codes):
+                    continue
+                seen.add(ref)
+                record = records[ref]
+                if all(needle in record[2] for needle in needles):
+                    found.append({"type": KINDS[ref & 1], "id": ref >> 1, "label": record[0], "detail": record[1]})
+                    if len(found) == limit:
+                        break
+            return found
+
+    def _range(self, prefix):
+        """Positions of the keys starting with ``prefix``"""
+        return bisect.bisect_left(self.keys, prefix), bisect.bisect_left(self.keys, prefix + "\U0010ffff")
+
+    def check_consistency(self, sample=20):
+        """
+        Compare the index with a fresh read of the database
+
+        Returns:
+            dict: counts and sample references of missing, extra and stale records
+        """
+        expected = self.from_entries(self._database_entries()).records
+        with self._lock:
+            indexed = dict(self.records)
+            sorted_keys = all(self.keys[i] <= self.keys[i + 1] for i in range(len(self.keys) - 1))
+            key_count = len(self.keys)
+
+        def describe(refs):
+            return {"count": len(refs), "records": [f"{KINDS[ref & 1]}:{ref >> 1}" for ref in sorted(refs)[:sample]]}
+
+        missing = set(expected) - set(indexed)
+        extra = set(indexed) - set(expected)
+        stale = {ref for ref in set(expected) & set(indexed) if expected[ref] != indexed[ref]}
+        return {
+            "consistent": not (missing or extra or stale) and sorted_keys and key_count == sum(len(_split_keys(record[2])) for record in indexed.values()),
+            "database_records": len(expected),
+            "indexed": len(indexed),
+            "keys": key_count,
+            "missing": describe(missing),
+            "extra": describe(extra),
+            "stale": describe(stale),
+        }
+
+    def memory_footprint(self):
+        """Approximate bytes held by the index (containers plus the strings and tuples they hold)"""
+        with self._lock:
+            keys = sys.getsizeof(self.keys) + sum(sys.getsizeof(key) for key in self.keys)
+            refs = sys.getsizeof(self.refs)
+            records = sys.getsizeof(self.records) + sum(
+                sys.getsizeof(ref) + sys.getsizeof(record) + sum(sys.getsizeof(part) for part in record)
+                for ref, record in self.records.items()
+            )
+            count = len(self.records)
+        total = keys + refs + records
+        return {"keys": keys, "refs": refs, "records": records, "total_bytes": total, "bytes_per_record": round(total / count, 1) if count else None}
+
+    def stats(self):
+        with self._lock:
+            return {
+                "records": len(self.records),
+                "keys": len(self.keys),
+                "last_change_id": self.last_change_id,
+                "rebuilding": self.rebuilding,
+                "built_at": self.built_at,
+                "build_seconds": round(self.build_seconds, 4) if self.build_seconds is not None else None,
+                **self.counters,
+                "memory": self.memory_footprint(),
+            }
+
+
+autocomplete_index = AutocompleteIndex()
+
+
+def get_autocomplete_index():
+    """Shared autocomplete index, built or rebuilt as needed"""
+    autocomplete_index.ensure_fresh()
+    return autocomplete_index
@@ -0,0 +1,61 @@
+"""
+Distance search over doctor coordinates
+"""
+
+import numpy as np
+from django.db.models import Q
+
+from ..models import Doctor
+from .geo import bounding_box, haversine_km_batch
+
+
+def nearby_doctors_from_db(latitude, longitude, radius_km, specialization=None, limit=10):
+    """
+    Nearest available doctors within ``radius_km``, using the database
+
+    Candidates are narrowed with a latitude/longitude bounding box (served by the
+    doctor_lat_lng_idx index), fetched as bare (id, lat, lng) tuples, and ranked by
+    exact haversine distance in one batch.
+
+    Args:
+        latitude (float): Search centre latitude
+        longitude (float): Search centre longitude
+        radius_km (float): Search radius in kilometres
+        specialization (str): Optional Doctor.specialization filter
+        limit (int): Maximum number of doctors to return
+
+    Returns:
+        list: (doctor_id, distance_km) pairs, nearest first
+    """
+    (min_lat, max_lat), lng_ranges = bounding_box(latitude, longitude, radius_km)
+    lng_filter = Q()
+    for min_lng, max_lng in lng_ranges:
+        lng_filter |= Q(longitude__gte=min_lng, longitude__lte=max_lng)
+
+    candidates = Doctor.objects.filter(lng_filter, latitude__gte=min_lat, latitude__lte=max_lat, is_available=True)
+    if specialization:
+        candidates = candidates.filter(specialization=specialization)
+    rows = list(candidates.order_by().values_list("id", "latitude", "longitude"))
+    if not rows:
+        return []
+
+    ids, latitudes, longitudes = zip(*rows)
+    distances = haversine_km_batch(latitude, longitude, np.array(latitudes, dtype=np.float64), np.array(longitudes, dtype=np.float64))
+    return nearest_in_range(np.array(ids, dtype=np.int64), distances, radius_km, limit)
+
+
+def nearest_in_range(ids, distances, radius_km, limit):
+    """
+    The ``limit`` nearest of ``ids`` within ``radius_km`` (ties go to the lower id)
+
+    Args:
+        ids: numpy array of doctor ids
+        distances: numpy array of their distances in kilometres
+
+    Returns:
+        list: (doctor_id, distance_km) pairs, nearest first
+    """
+    in_range = np.flatnonzero(distances <= radius_km)
+    ids, distances = ids[in_range], distances[in_range]
+    order = np.lexsort((ids, distances))[:limit]
+    return list(zip(ids[order].tolist(), distances[order].tolist()))
@@ -0,0 +1,228 @@
+"""
+SQLite FTS5 full-text search for doctors, patients, appointments and contact messages
+
+Each searchable model has an FTS5 virtual table (created by migration 0009)
+whose rowid is the model's primary key. Its columns hold the text the
+viewset's ``search_fields`` used to LIKE-scan, with names from the joined
+users already filled in. Rows are refreshed by the signals in
+kellcare/signals.py on every save and delete, including user renames. Bulk
+writes bypass signals, so run ``python manage.py search_index --rebuild``
+after them.
+
+Queries are tokenized like the indexed text and every term is matched as a
+prefix, so ``?search=jo sm`` finds "John Smith". Unlike the LIKE search over
+``search_fields``, a term never matches inside a word ("smith" does not find
+"Goldsmith"). Results are ranked by bm25.
+"""
+
+import html
+import re
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.db.models import Q
+
+from ..models import Appointment, ContactMessage, Doctor, Patient
+
+# Highlight markers that cannot occur in indexed text; swapped for <mark> after HTML-escaping
+_OPEN, _CLOSE = "\x02", "\x03"
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+class FullTextIndex:
+    """
+    One FTS5 table mirroring a model
+
+    Args:
+        name (str): Index name used by viewsets and /api/search/ (e.g. "doctors")
+        model: The indexed model
+        columns (tuple): FTS column names, in the order ``source`` selects them
+        source (str): SELECT of (id, *columns) over the model's table aliased ``t``
+    """
+
+    def __init__(self, name, model, columns, source):
+        self.name = name
+        self.model = model
+        self.table = f"kellcare_{name}_fts"
+        self.columns = columns
+        self.source = source
+
+    def refresh(self, ids):
+        """Re-read rows ``ids`` into the index (deleted rows are just removed)"""
+        ids = [int(pk) for pk in ids]
+        if not ids or not fulltext_available():
+            return
+        with connection.cursor() as cursor:
+            # Batched to stay under SQLite's bound parameter limit
+            for start in range(0, len(ids), 500):
+                batch = ids[start : start + 500]
+                placeholders = ", ".join(["%s"] * len(batch))
+                cursor.execute(f"DELETE FROM {self.table} WHERE rowid IN ({placeholders})", batch)
+                cursor.execute(f"INSERT INTO {self.table} (rowid, {', '.join(self.columns)}) {self.source} WHERE t.id IN ({placeholders})", batch)
+
+    def rebuild(self):
+        """Re-read the whole table; returns the number of rows indexed"""
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            cursor.execute(f"INSERT INTO {self.table} (rowid, {', '.join(self.columns)}) {self.source}")
+            cursor.execute(f"INSERT INTO {self.table} ({self.table}) VALUES ('optimize')")
+        return self.indexed_rows()
+
+    def indexed_rows(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) FROM {self.table}")
+            return cursor.fetchone()[0]
+
+    def filter(self, queryset, expression):
+        """
+        Rows of ``queryset`` matching a MATCH expression, with a ``search_rank`` (bm25, lower is better)
+
+        Joined to the FTS table rather than ranked per row in a subquery, so
+        SQLite evaluates the full-text query once and looks the matches up by
+        primary key.
+        """
+        model_table = self.model._meta.db_table
+        return queryset.extra(
+            tables=[self.table],
+            where=[f'"{self.table}".rowid = "{model_table}"."id"', f'"{self.table}" MATCH %s'],
+            params=[expression],
+            select={"search_rank": f'"{self.table}".rank'},
+        )
+
+    def search(self, expression, limit=20):
+        """
+        Best matches with every column highlighted
+
+        Returns:
+            list: {"id", "rank", "highlights": {column: HTML with <mark> around matched terms}}
+        """
+        highlights = ", ".join(f"highlight({self.table}, {position}, %s, %s)" for position in range(len(self.columns)))
+        params = [marker for _ in self.columns for marker in (_OPEN, _CLOSE)] + [expression, limit]
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT rowid, rank, {highlights} FROM {self.table} WHERE {self.table} MATCH %s ORDER BY rank LIMIT %s", params)
+            rows = cursor.fetchall()
+        return [
+            {
+                "id": row[0],
+                "rank": round(row[1], 4),
+                "highlights": {column: _markup(value) for column, value in zip(self.columns, row[2:]) if value and _OPEN in value},
+            }
+            for row in rows
+        ]
+
+
+def _markup(value):
+    return html.escape(value).replace(_OPEN, "<mark>").replace(_CLOSE, "</mark>")
+
+
+FULLTEXT_INDEXES = {
+    index.name: index
+    for index in (
+        FullTextIndex(
+            "doctors",
+            Doctor,
+            ("name", "specialization", "department"),
+            "SELECT t.id, u.first_name || ' ' || u.last_name, t.specialization, COALESCE(d.name, '') "
+            "FROM kellcare_doctor t JOIN auth_user u ON u.id = t.user_id LEFT JOIN kellcare_department d ON d.id = t.department_id",
+        ),
+        FullTextIndex(
+            "patients",
+            Patient,
+            ("name", "patient_id", "phone"),
+            "SELECT t.id, u.first_name || ' ' || u.last_name, t.patient_id, t.phone FROM kellcare_patient t JOIN auth_user u ON u.id = t.user_id",
+        ),
+        FullTextIndex(
+            "appointments",
+            Appointment,
+            ("patient", "doctor", "reason"),
+            "SELECT t.id, pu.first_name || ' ' || pu.last_name, du.first_name || ' ' || du.last_name, t.reason "
+            "FROM kellcare_appointment t "
+            "JOIN kellcare_patient p ON p.id = t.patient_id JOIN auth_user pu ON pu.id = p.user_id "
+            "JOIN kellcare_doctor d ON d.id = t.doctor_id JOIN auth_user du ON du.id = d.user_id",
+        ),
+        FullTextIndex(
+            "contact_messages",
+            ContactMessage,
+            ("name", "email", "subject", "message"),
+            "SELECT t.id, t.name, t.email, t.subject, t.message FROM kellcare_contactmessage t",
+        ),
+    )
+}
+
+FULLTEXT_INDEX_BY_MODEL = {index.model: index for index in FULLTEXT_INDEXES.values()}
+
+# Seconds a fulltext_available() answer is trusted before the schema is checked again
+AVAILABILITY_TTL = 60.0
+
+# (connection alias, database name) -> (answer, time.monotonic() of the check)
+_available = {}
+
+
+def fulltext_available():
+    """
+    Whether the FTS5 tables exist (SQLite with FTS5, migrations applied) and search is enabled
+
+    The answer is cached per database for AVAILABILITY_TTL seconds and forgotten
+    after migrations (reset_fulltext_available), so tables created or dropped
+    later are noticed without a restart.
+    """
+    if not getattr(settings, "KELLCARE_FULLTEXT_SEARCH", True) or connection.vendor != "sqlite":
+        return False
+    key = (connection.alias, str(connection.settings_dict["NAME"]))
+    cached = _available.get(key)
+    if cached is not None and time.monotonic() - cached[1] < AVAILABILITY_TTL:
+        return cached[0]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = %s", [FULLTEXT_INDEXES["doctors"].table])
+            available = cursor.fetchone() is not None
+    except DatabaseError:
+        available = False
+    _available[key] = (available, time.monotonic())
+    return available
+
+
+def reset_fulltext_available():
+    """Forget cached fulltext_available() answers (e.g. after migrating)"""
+    _available.clear()
+
+
+def get_fulltext_index(name):
+    """The FullTextIndex called ``name`` if full-text search is usable, else None"""
+    return FULLTEXT_INDEXES.get(name) if fulltext_available() else None
+
+
+def match_expression(terms):
+    """
+    FTS5 MATCH expression requiring every term as a prefix
+
+    Args:
+        terms: Search string or list of search terms as typed
+
+    Returns:
+        str or None: e.g. '"jo"* AND "smi"*', or None if there is nothing to search for
+    """
+    if isinstance(terms, str):
+        terms = [terms]
+    tokens = [token for term in terms for token in _TOKEN.findall(term.lower())]
+    if not tokens:
+        return None
+    return " AND ".join(f'"{token}"*' for token in tokens)
+
+
+def refresh_user(user):
+    """Re-index the doctor or patient behind a user, and their appointments, after a rename"""
+    doctor_ids = list(Doctor.objects.filter(user=user).values_list("id", flat=True))
+    patient_ids = list(Patient.objects.filter(user=user).values_list("id", flat=True))
+    if not doctor_ids and not patient_ids:
+        return
+    FULLTEXT_INDEXES["doctors"].refresh(doctor_ids)
+    FULLTEXT_INDEXES["patients"].refresh(patient_ids)
+    appointments = Appointment.objects.filter(Q(doctor_id__in=doctor_ids) | Q(patient_id__in=patient_ids))
+    FULLTEXT_INDEXES["appointments"].refresh(appointments.values_list("id", flat=True))
+
+
+def refresh_department(department):
+    """Re-index the doctors of a renamed department"""
+    FULLTEXT_INDEXES["doctors"].refresh(Doctor.objects.filter(department=department).values_list("id", flat=True))
@@ -0,0 +1,361 @@
+"""
+Offline geocoding from a local gazetteer
+
+The gazetteer is loaded from a CSV of postal codes, cities and street centroids
+(columns: kind, name, city, state, postal_code, latitude, longitude) and kept as a
+compact index: parallel arrays of coordinates plus dictionaries from normalized
+names to row numbers, a sorted key list for prefix matching, a trigram index that
+bounds fuzzy matching to a few candidate keys and a coarse grid for reverse
+lookups. `manage.py build_gazetteer` saves the index as JSON (never a pickle, so
+loading it cannot run code) for later processes to load without re-parsing; the
+app only reads it, and parses the CSV in memory when the file is missing or
+older than the CSV. Lookups are dictionary/bisect operations over bounded
+candidate sets, so answers come back in well under a millisecond.
+
+``LocalGazetteer`` mimics the geopy geocoder interface (``geocode``/``reverse``
+returning ``geopy.location.Location``), so GeocodeService uses it as
+``service="local"`` like any other provider.
+"""
+
+import bisect
+import csv
+import difflib
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import threading
+from array import array
+
+from django.conf import settings
+from geopy.location import Location
+
+from .geo import bounding_box
+from .geocode_cache import normalize_address
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 2
+KINDS = ("street", "city", "postal_code")
+POSTAL_CODE_PATTERN = re.compile(r"^\d{5}$")
+GRID_DEGREES = 0.1
+
+# Fuzzy street matching compares at most FUZZY_CANDIDATES keys, chosen by shared trigrams
+# from at most FUZZY_MAX_POSTINGS trigram postings (rarest trigrams first)
+FUZZY_CANDIDATES = 20
+FUZZY_MAX_POSTINGS = 5000
+
+
+def _cell(latitude, longitude):
+    return (math.floor(latitude / GRID_DEGREES), math.floor(longitude / GRID_DEGREES))
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def _trigram_index(keys):
+    """Trigram -> positions in ``keys`` of the keys containing it"""
+    postings = {}
+    for position, key in enumerate(keys):
+        for gram in _trigrams(key):
+            postings.setdefault(gram, array("i")).append(position)
+    return postings
+
+
+def _label(kind, name, city, state, postal_code):
+    if kind == "city":
+        parts = (name, state)
+    elif kind == "postal_code":
+        parts = (city, f"{state} {postal_code or name}".strip())
+    else:
+        parts = (name, city, f"{state} {postal_code}".strip())
+    return ", ".join(part for part in parts if part)
+
+
+def _distance_km(lat1, lng1, lat2, lng2):
+    # Equirectangular approximation; plenty for picking the nearest centroid
+    x = math.radians(lng2 - lng1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return 6371 * math.hypot(x, y)
+
+
+class LocalGazetteer:
+    """
+    In-memory gazetteer index with a geopy-compatible interface
+
+    Args:
+        data (dict): Index built by ``from_csv`` (or read by ``load``)
+    """
+
+    def __init__(self, data):
+        self.labels = data["labels"]
+        self.kinds = data["kinds"]
+        self.cities = data["cities"]
+        self.postal_codes = data["postal_codes"]
+        self.latitudes = data["latitudes"]
+        self.longitudes = data["longitudes"]
+        self.names = data["names"]
+        self.street_keys = data["street_keys"]
+        self.trigrams = data["trigrams"]
+        self.grid = data["grid"]
+
+    def __len__(self):
+        return len(self.labels)
+
+    @classmethod
+    def from_csv(cls, csv_path):
+        """Parse a gazetteer CSV into an index"""
+        data = {
+            "version": INDEX_VERSION,
+            "labels": [],
+            "kinds": array("b"),
+            "cities": [],
+            "postal_codes": [],
+            "latitudes": array("d"),
+            "longitudes": array("d"),
+            "names": {kind: {} for kind in KINDS},
+            "grid": {},
+        }
+        with open(csv_path, newline="", encoding="utf-8") as handle:
+            for row in csv.DictReader(handle):
+                kind = (row.get("kind") or "").strip()
+                if kind not in KINDS:
+                    continue
+                try:
+                    latitude, longitude = float(row["latitude"]), float(row["longitude"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+
+                index = len(data["labels"])
+                name, city, state, postal_code = (row.get(column, "").strip() for column in ("name", "city", "state", "postal_code"))
+                data["labels"].append(_label(kind, name, city, state, postal_code))
+                data["kinds"].append(KINDS.index(kind))
+                data["cities"].append(normalize_address(city if kind != "city" else name))
+                data["postal_codes"].append(postal_code or (name if kind == "postal_code" else ""))
+                data["latitudes"].append(latitude)
+                data["longitudes"].append(longitude)
+                key = normalize_address(name)
+                data["names"][kind].setdefault(key, []).append(index)
+                data["grid"].setdefault(_cell(latitude, longitude), []).append(index)
+
+        data["street_keys"] = sorted(data["names"]["street"])
+        data["trigrams"] = _trigram_index(data["street_keys"])
+        return cls(data)
+
+    @classmethod
+    def load(cls, csv_path, index_path=None):
+        """
+        Read the index file written by `manage.py build_gazetteer`
+
+        Falls back to parsing the CSV in memory (never writing anything) when the
+        file is missing, older than the CSV or from another index version.
+
+        Args:
+            csv_path (str): Gazetteer CSV
+            index_path (str): Index file (defaults to the CSV path with an .idx suffix)
+        """
+        index_path = index_path or os.path.splitext(csv_path)[0] + ".idx"
+        if os.path.exists(index_path) and (not os.path.exists(csv_path) or os.path.getmtime(index_path) >= os.path.getmtime(csv_path)):
+            try:
+                with open(index_path, encoding="utf-8") as handle:
+                    data = json.load(handle)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read gazetteer index {index_path}: {str(e)}")
+            else:
+                if data.get("version") == INDEX_VERSION:
+                    return cls(
+                        dict(
+                            data,
+                            kinds=array("b", data["kinds"]),
+                            latitudes=array("d", data["latitudes"]),
+                            longitudes=array("d", data["longitudes"]),
+                            trigrams={gram: array("i", positions) for gram, positions in data["trigrams"].items()},
+                            grid={(row, column): members for row, column, members in data["grid"]},
+                        )
+                    )
+
+        logger.warning(f"Gazetteer index {index_path} is missing or out of date; parsing {csv_path} (run `manage.py build_gazetteer`)")
+        return cls.from_csv(csv_path)
+
+    def save(self, index_path):
+        """Write the index as JSON, replacing ``index_path`` atomically"""
+        data = {
+            "version": INDEX_VERSION,
+            "labels": self.labels,
+            "kinds": self.kinds.tolist(),
+            "cities": self.cities,
+            "postal_codes": self.postal_codes,
+            "latitudes": self.latitudes.tolist(),
+            "longitudes": self.longitudes.tolist(),
+            "names": self.names,
+            "street_keys": self.street_keys,
+            "trigrams": {gram: positions.tolist() for gram, positions in self.trigrams.items()},
+            "grid": [[row, column, members] for (row, column), members in self.grid.items()],
+        }
+        temporary = f"{index_path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as handle:
+            json.dump(data, handle, separators=(",", ":"))
+        os.replace(temporary, index_path)
+
+    def _location(self, index, score):
+        latitude, longitude = self.latitudes[index], self.longitudes[index]
+        return Location(self.labels[index], (latitude, longitude, 0.0), {"kind": KINDS[self.kinds[index]], "score": score})
+
+    def _pick(self, candidates, tokens, postal_codes):
+        """Prefer the candidate whose city or postal code also appears in the query"""
+        text = " " + " ".join(tokens) + " "
+
+        def agreement(index):
+            city = self.cities[index]
+            return (self.postal_codes[index] in postal_codes) * 2 + bool(city and f" {city} " in text)
+
+        best = max(candidates, key=agreement)
+        if len(candidates) > 1 and agreement(best) == 0:
+            return None  # Ambiguous street name with no city to tell the candidates apart
+        return best
+
+    def _match_street(self, tokens, postal_codes):
+        streets = self.names["street"]
+        # Exact street names, longest first (house number already stripped)
+        for length in range(min(6, len(tokens)), 0, -1):
+            key = " ".join(tokens[:length])
+            if key in streets:
+                index = self._pick(streets[key], tokens, postal_codes)
+                if index is not None:
+                    return index, 1.0
+
+        if len(tokens) < 2:
+            return None
+
+        # Prefix: "sweeten creek" matches "sweeten creek rd"
+        prefix = " ".join(tokens[:2])
+        position = bisect.bisect_left(self.street_keys, prefix)
+        candidates = []
+        while position < len(self.street_keys) and self.street_keys[position].startswith(prefix) and len(candidates) < 20:
+            candidates.extend(streets[self.street_keys[position]])
+            position += 1
+        if candidates:
+            index = self._pick(candidates, tokens, postal_codes)
+            if index is not None:
+                return index, 0.9
+
+        # Fuzzy: tolerate typos, comparing only the keys sharing the most trigrams
+        for length in (3, 2):
+            phrase = " ".join(tokens[:length])
+            matches = difflib.get_close_matches(phrase, self._fuzzy_candidates(phrase), n=3, cutoff=0.85)
+            if matches:
+                index = self._pick([i for match in matches for i in streets[match]], tokens, postal_codes)
+                if index is not None:
+                    return index, 0.75
+        return None
+
+    def _fuzzy_candidates(self, phrase):
+        """Up to FUZZY_CANDIDATES street keys sharing the most trigrams with ``phrase``"""
+        counts, scanned = {}, 0
+        for gram in sorted(_trigrams(phrase), key=lambda gram: len(self.trigrams.get(gram, ()))):
+            postings = self.trigrams.get(gram, ())
+            scanned += len(postings)
+            if scanned > FUZZY_MAX_POSTINGS:
+                break
+            for position in postings:
+                counts[position] = counts.get(position, 0) + 1
+        best = heapq.nlargest(FUZZY_CANDIDATES, counts.items(), key=lambda item: item[1])
+        return [self.street_keys[position] for position, _ in best]
+
+    def _match_city(self, tokens):
+        cities = self.names["city"]
+        for length in (3, 2, 1):
+            for start in range(len(tokens) - length + 1):
+                key = " ".join(tokens[start : start + length])
+                if key in cities:
+                    return cities[key][0]
+        return None
+
+    def geocode(self, query, timeout=None, **kwargs):
+        """
+        Geocode an address against the gazetteer
+
+        Street centroids are preferred, then postal code centroids, then city centroids.
+
+        Returns:
+            geopy.location.Location or None
+        """
+        tokens = normalize_address(query).split()
+        if not tokens:
+            return None
+        postal_codes = {token for token in tokens if POSTAL_CODE_PATTERN.match(token)}
+        street_tokens = tokens[1:] if any(char.isdigit() for char in tokens[0]) else tokens
+
+        street = self._match_street(street_tokens, postal_codes) if street_tokens else None
+        if street is not None:
+            return self._location(*street)
+
+        for postal_code in postal_codes:
+            if postal_code in self.names["postal_code"]:
+                return self._location(self.names["postal_code"][postal_code][0], 0.6)
+
+        city = self._match_city(tokens)
+        if city is not None:
+            return self._location(city, 0.4)
+        return None
+
+    def reverse(self, query, timeout=None, **kwargs):
+        """
+        Nearest gazetteer entry to "lat, lng" (within KELLCARE_GAZETTEER_REVERSE_MAX_KM)
+
+        Returns:
+            geopy.location.Location or None
+        """
+        latitude, longitude = (float(part) for part in str(query).split(","))
+        max_km = getattr(settings, "KELLCARE_GAZETTEER_REVERSE_MAX_KM", 10.0)
+        # Every cell the radius reaches; cells narrow towards the poles, so the column count grows there
+        (min_lat, max_lat), lng_ranges = bounding_box(latitude, longitude, max_km)
+        rows = range(math.floor(min_lat / GRID_DEGREES), math.floor(max_lat / GRID_DEGREES) + 1)
+        columns = {column for min_lng, max_lng in lng_ranges for column in range(math.floor(min_lng / GRID_DEGREES), math.floor(max_lng / GRID_DEGREES) + 1)}
+        if len(rows) * len(columns) > len(self.grid):
+            cells = [members for (row, column), members in self.grid.items() if row in rows and column in columns]
+        else:
+            cells = [self.grid[(row, column)] for row in rows for column in columns if (row, column) in self.grid]
+
+        best, best_distance = None, max_km
+        for members in cells:
+            for index in members:
+                # Prefer streets over coarser centroids at similar distances
+                distance = _distance_km(latitude, longitude, self.latitudes[index], self.longitudes[index]) * (1 + self.kinds[index])
+                if distance < best_distance:
+                    best, best_distance = index, distance
+        return self._location(best, 1.0) if best is not None else None
+
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+
+def get_gazetteer():
+    """
+    Shared gazetteer loaded from settings.KELLCARE_GAZETTEER_CSV (and its index file)
+
+    Returns:
+        LocalGazetteer or None if no gazetteer is configured
+    """
+    global _gazetteer
+    with _gazetteer_lock:
+        if _gazetteer is None:
+            csv_path = getattr(settings, "KELLCARE_GAZETTEER_CSV", "")
+            index_path = getattr(settings, "KELLCARE_GAZETTEER_INDEX", "") or None
+            if not csv_path or not (os.path.exists(csv_path) or (index_path and os.path.exists(index_path))):
+                return None
+            _gazetteer = LocalGazetteer.load(str(csv_path), index_path and str(index_path))
+            logger.info(f"Loaded local gazetteer with {len(_gazetteer)} entries")
+        return _gazetteer
+
+
+def reset_gazetteer():
+    """Forget the loaded gazetteer (e.g. after rebuilding the index)"""
+    global _gazetteer
+    with _gazetteer_lock:
+        _gazetteer = None
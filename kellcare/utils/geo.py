@@ -0,0 +1,73 @@
+"""
+Distance helpers for coordinate searches
+"""
+
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+# One degree of latitude on the sphere haversine_km uses (about 111.195 km, not the
+# 111.32 km equatorial figure, which would make bounding boxes too small)
+KM_PER_DEGREE_LATITUDE = math.radians(1) * EARTH_RADIUS_KM
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    Latitude/longitude ranges that contain every point within ``radius_km``
+
+    Args:
+        latitude (float): Centre latitude
+        longitude (float): Centre longitude
+        radius_km (float): Search radius
+
+    Returns:
+        tuple: ((min_lat, max_lat), [(min_lng, max_lng), ...]) - two longitude ranges
+        when the box crosses the antimeridian, one otherwise
+    """
+    lat_delta = radius_km / KM_PER_DEGREE_LATITUDE
+    min_lat, max_lat = max(latitude - lat_delta, -90.0), min(latitude + lat_delta, 90.0)
+
+    # Near the poles (or for huge radii) every longitude is in range
+    cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    if cos_lat <= 0 or radius_km / (KM_PER_DEGREE_LATITUDE * cos_lat) >= 180:
+        return (min_lat, max_lat), [(-180.0, 180.0)]
+
+    lng_delta = radius_km / (KM_PER_DEGREE_LATITUDE * cos_lat)
+    min_lng, max_lng = longitude - lng_delta, longitude + lng_delta
+    if min_lng < -180:
+        return (min_lat, max_lat), [(min_lng + 360, 180.0), (-180.0, max_lng)]
+    if max_lng > 180:
+        return (min_lat, max_lat), [(min_lng, 180.0), (-180.0, max_lng - 360)]
+    return (min_lat, max_lat), [(min_lng, max_lng)]
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((phi2 - phi1) / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def haversine_km_batch(latitude, longitude, latitudes, longitudes):
+    """
+    Distances from one point to many, computed with numpy
+
+    The origin's trigonometry is computed once; the points go through vectorised
+    numpy operations, so callers should pass arrays (numpy or ``array('d')``,
+    which numpy reads without copying) rather than lists.
+
+    Args:
+        latitude (float): Origin latitude
+        longitude (float): Origin longitude
+        latitudes: Array of latitudes
+        longitudes: Array of longitudes, same length
+
+    Returns:
+        numpy.ndarray: Distance in kilometres for each point
+    """
+    phi1 = math.radians(latitude)
+    phis = np.radians(np.asarray(latitudes, dtype=np.float64))
+    half_delta_lambdas = np.radians(np.asarray(longitudes, dtype=np.float64) - longitude) / 2
+    a = np.sin((phis - phi1) / 2) ** 2 + math.cos(phi1) * np.cos(phis) * np.sin(half_delta_lambdas) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
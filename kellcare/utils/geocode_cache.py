@@ -0,0 +1,334 @@
+"""
+Persistent cache for geocoding results
+
+Lookups go through an in-process LRU first, then the GeocodeCacheEntry table, and
+only reach the provider on a miss. Addresses are normalized before keying (case,
+whitespace, punctuation, street-type abbreviations and suite/unit designators),
+so "123 Medical Plaza, Suite 300" and "123 medical plaza ste. 500" share one entry.
+Reverse lookups are keyed by geohash cell, so nearby points share an answer.
+Successful results live for KELLCARE_GEOCODE_CACHE_TTL seconds; "not found"
+results are cached for the much shorter KELLCARE_GEOCODE_NEGATIVE_TTL. Transient
+provider errors (timeouts, service errors) are never cached.
+"""
+
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import F
+from django.utils import timezone
+
+from . import geohash
+
+logger = logging.getLogger(__name__)
+
+# Provider errors that are answers rather than failures, and may be cached
+NEGATIVE_ERRORS = {"Address not found", "Coordinates not found"}
+PER_CALL_FIELDS = {"rate_limit_wait", "elapsed", "provider", "service_used", "tried", "cached"}
+
+# A unit designator followed by a number ("Suite 300", "ste. 5B", "#12"). There is no bare "fl"
+# alternative: in "Orlando, FL 32801" it is the state.
+UNIT = r"(?:(?:suite|ste|apt|apartment|unit|room|rm|floor|bldg|building)\.?\s*#?\s*(?=[\w-]*\d)[\w-]+|#\s*[\w-]+)"
+# Units trailing the street part ("123 Main St Ste 500"), and comma-separated parts that are only a unit
+TRAILING_UNIT_PATTERN = re.compile(rf"(?<=\S)\s+{UNIT}\s*$")
+UNIT_PART_PATTERN = re.compile(rf"^\s*{UNIT}\s*$")
+PUNCTUATION_PATTERN = re.compile(r"[^\w\s]")
+
+STREET_ABBREVIATIONS = {
+    "street": "st",
+    "avenue": "ave",
+    "road": "rd",
+    "drive": "dr",
+    "boulevard": "blvd",
+    "lane": "ln",
+    "court": "ct",
+    "place": "pl",
+    "highway": "hwy",
+    "parkway": "pkwy",
+    "north": "n",
+    "south": "s",
+    "east": "e",
+    "west": "w",
+}
+
+
+def normalize_address(address):
+    """
+    Reduce an address to the form used as its cache key
+
+    Args:
+        address (str): Free-form address
+
+    Unit designators are only removed next to the street part: at the end of
+    the first comma-separated part, or as whole parts before the first part that
+    is not a unit (the locality). "1 Building 7 Way, Floor 2, Orlando, FL 32801"
+    keeps "building 7", the city, state and ZIP code.
+
+    Returns:
+        str: Lower-case address without punctuation, suite/unit designators or repeated whitespace
+    """
+    parts = (address or "").lower().split(",")
+    while len(parts) > 1 and UNIT_PART_PATTERN.match(parts[0]):
+        parts.pop(0)
+    street, rest = parts[0], parts[1:]
+    while True:
+        stripped = TRAILING_UNIT_PATTERN.sub("", street)
+        if stripped == street:
+            break
+        street = stripped
+    while rest and UNIT_PART_PATTERN.match(rest[0]):
+        rest.pop(0)
+    text = PUNCTUATION_PATTERN.sub(" ", " ".join([street, *rest]))
+    return " ".join(STREET_ABBREVIATIONS.get(word, word) for word in text.split())
+
+
+def address_fingerprint(address):
+    """
+    Fingerprint of the geocodable part of an address
+
+    Stored next to coordinates to record which address they were geocoded from;
+    edits that do not change the normalized address (case, punctuation, suite
+    numbers) keep the same fingerprint.
+
+    Returns:
+        str: Hex digest, or "" for an empty address
+    """
+    normalized = normalize_address(address)
+    return hashlib.sha256(normalized.encode()).hexdigest()[:32] if normalized else ""
+
+
+def normalize_coordinates(latitude, longitude):
+    """
+    Cache key form of a coordinate pair: its geohash cell
+
+    Points in the same cell (KELLCARE_REVERSE_GEOHASH_PRECISION characters, about
+    38 m x 19 m at the default of 8) share one reverse geocoding answer, so map
+    clicks and device positions a few metres apart do not each reach the provider.
+    """
+    precision = getattr(settings, "KELLCARE_REVERSE_GEOHASH_PRECISION", 8)
+    return f"geohash{precision}:{geohash.encode(latitude, longitude, precision)}"
+
+
+KINDS = ("forward", "reverse")
+
+# In-process LRU size and database row cap (None = no cap beyond TTL) per lookup kind
+LRU_SIZE_SETTINGS = {"forward": ("KELLCARE_GEOCODE_LRU_SIZE", 1024), "reverse": ("KELLCARE_REVERSE_GEOCODE_LRU_SIZE", 4096)}
+DB_MAX_ENTRIES_SETTINGS = {"reverse": ("KELLCARE_REVERSE_GEOCODE_MAX_ENTRIES", 100_000)}
+
+# Check the database row cap every this many stores
+PRUNE_EVERY = 100
+
+
+class GeocodeCache:
+    """
+    Two-level (in-process LRU + database) cache of geocoding results
+
+    Results are the dicts returned by GeocodeService. ``get`` returns None on a miss;
+    callers then ask the provider and hand the result to ``set``. Forward and
+    reverse lookups have separate LRUs and counters so each reports its own hit rate.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {kind: OrderedDict() for kind in KINDS}
+        self._stats = {kind: {"lru_hits": 0, "db_hits": 0, "misses": 0, "negative_hits": 0, "stores": 0, "evictions": 0, "errors": 0} for kind in KINDS}
+
+    @staticmethod
+    def _ttl(result):
+        if result["success"]:
+            return getattr(settings, "KELLCARE_GEOCODE_CACHE_TTL", 30 * 24 * 3600)
+        return getattr(settings, "KELLCARE_GEOCODE_NEGATIVE_TTL", 3600)
+
+    @staticmethod
+    def cacheable(result):
+        return result["success"] or result.get("error") in NEGATIVE_ERRORS
+
+    def _count(self, kind, name, amount=1):
+        with self._lock:
+            self._stats[kind][name] += amount
+
+    def _remember(self, key, result, expires_at):
+        kind = key[0]
+        setting, default = LRU_SIZE_SETTINGS[kind]
+        max_entries = getattr(settings, setting, default)
+        if max_entries <= 0:
+            return
+        entries = self._entries[kind]
+        with self._lock:
+            entries[key] = (result, expires_at)
+            entries.move_to_end(key)
+            while len(entries) > max_entries:
+                entries.popitem(last=False)
+                self._stats[kind]["evictions"] += 1
+
+    def get(self, kind, provider, normalized_query):
+        """
+        Look up a cached result
+
+        Args:
+            kind (str): "forward" or "reverse"
+            provider (str): Geocoding service name
+            normalized_query (str): Output of normalize_address() or normalize_coordinates()
+
+        Returns:
+            dict or None: Cached geocoding result
+        """
+        from ..models import GeocodeCacheEntry
+
+        key = (kind, provider, normalized_query)
+        entries = self._entries[kind]
+        with self._lock:
+            entry = entries.get(key)
+            if entry is not None:
+                if entry[1] > time.time():
+                    entries.move_to_end(key)
+                    self._stats[kind]["lru_hits"] += 1
+                    if not entry[0]["success"]:
+                        self._stats[kind]["negative_hits"] += 1
+                    return dict(entry[0])
+                del entries[key]
+
+        query_hash = hashlib.sha256(normalized_query.encode()).hexdigest()
+        try:
+            row = GeocodeCacheEntry.objects.filter(kind=kind, provider=provider, query_hash=query_hash, expires_at__gt=timezone.now()).first()
+            if row is not None:
+                GeocodeCacheEntry.objects.filter(pk=row.pk).update(hits=F("hits") + 1)
+        except DatabaseError as e:
+            logger.warning(f"Geocode cache lookup failed: {str(e)}")
+            self._count(kind, "errors")
+            return None
+
+        if row is None:
+            self._count(kind, "misses")
+            return None
+
+        result = self._row_to_result(row)
+        self._remember(key, result, row.expires_at.timestamp())
+        with self._lock:
+            self._stats[kind]["db_hits"] += 1
+            if not row.success:
+                self._stats[kind]["negative_hits"] += 1
+        return dict(result)
+
+    def set(self, kind, provider, normalized_query, result):
+        """Store a provider result (transient errors are ignored)"""
+        from ..models import GeocodeCacheEntry
+
+        if not self.cacheable(result):
+            return
+        # Per-call details (rate limiter wait, timings, which services were asked) are not part of the answer
+        result = {name: value for name, value in result.items() if name not in PER_CALL_FIELDS}
+        expires_at = timezone.now() + timedelta(seconds=self._ttl(result))
+        query_hash = hashlib.sha256(normalized_query.encode()).hexdigest()
+        try:
+            GeocodeCacheEntry.objects.update_or_create(
+                kind=kind,
+                provider=provider,
+                query_hash=query_hash,
+                defaults={
+                    "normalized_query": normalized_query,
+                    "success": result["success"],
+                    "latitude": result.get("latitude"),
+                    "longitude": result.get("longitude"),
+                    "address": result.get("formatted_address") or result.get("address") or "",
+                    "error": (result.get("error") or "")[:200],
+                    "hits": 0,
+                    "expires_at": expires_at,
+                },
+            )
+        except DatabaseError as e:
+            logger.warning(f"Geocode cache store failed: {str(e)}")
+            self._count(kind, "errors")
+            return
+        self._remember((kind, provider, normalized_query), dict(result), expires_at.timestamp())
+        with self._lock:
+            self._stats[kind]["stores"] += 1
+            prune = self._stats[kind]["stores"] % PRUNE_EVERY == 0
+        if prune:
+            self.prune(kind)
+
+    @staticmethod
+    def _row_to_result(row):
+        if row.kind == "reverse":
+            return {"address": row.address or None, "success": row.success, "error": row.error or None}
+        return {
+            "latitude": row.latitude,
+            "longitude": row.longitude,
+            "formatted_address": row.address or None,
+            "success": row.success,
+            "error": row.error or None,
+        }
+
+    def clear(self):
+        """Drop the in-process LRUs (database entries expire on their own)"""
+        with self._lock:
+            for entries in self._entries.values():
+                entries.clear()
+
+    def purge_expired(self):
+        """Delete expired database entries; returns how many were removed"""
+        from ..models import GeocodeCacheEntry
+
+        deleted, _ = GeocodeCacheEntry.objects.filter(expires_at__lte=timezone.now()).delete()
+        return deleted
+
+    def prune(self, kind):
+        """
+        Keep the database rows of one kind under their configured cap
+
+        Expired rows go first, then the rows closest to expiry. Returns how many were removed.
+        """
+        from ..models import GeocodeCacheEntry
+
+        setting, default = DB_MAX_ENTRIES_SETTINGS.get(kind, (None, None))
+        max_entries = getattr(settings, setting, default) if setting else None
+        if not max_entries:
+            return 0
+        try:
+            deleted, _ = GeocodeCacheEntry.objects.filter(kind=kind, expires_at__lte=timezone.now()).delete()
+            rows = GeocodeCacheEntry.objects.filter(kind=kind)
+            excess = rows.count() - max_entries
+            if excess > 0:
+                oldest = list(rows.order_by("expires_at").values_list("pk", flat=True)[:excess])
+                deleted += GeocodeCacheEntry.objects.filter(pk__in=oldest).delete()[0]
+        except DatabaseError as e:
+            logger.warning(f"Geocode cache prune failed: {str(e)}")
+            return 0
+        self._count(kind, "evictions", deleted)
+        return deleted
+
+    def stats(self):
+        """Hit/miss counters for this process plus database entry counts, per lookup kind"""
+        from ..models import GeocodeCacheEntry
+
+        with self._lock:
+            stats = {kind: dict(self._stats[kind], lru_entries=len(self._entries[kind])) for kind in KINDS}
+        now = timezone.now()
+        for kind, kind_stats in stats.items():
+            lookups = kind_stats["lru_hits"] + kind_stats["db_hits"] + kind_stats["misses"]
+            kind_stats["hit_rate"] = round((kind_stats["lru_hits"] + kind_stats["db_hits"]) / lookups, 3) if lookups else None
+            kind_stats["lru_max_entries"] = getattr(settings, *LRU_SIZE_SETTINGS[kind])
+            try:
+                rows = GeocodeCacheEntry.objects.filter(kind=kind)
+                kind_stats["db_entries"] = rows.filter(expires_at__gt=now).count()
+                kind_stats["db_negative_entries"] = rows.filter(expires_at__gt=now, success=False).count()
+                kind_stats["db_expired_entries"] = rows.filter(expires_at__lte=now).count()
+            except DatabaseError:
+                pass
+
+        precision = getattr(settings, "KELLCARE_REVERSE_GEOHASH_PRECISION", 8)
+        stats["reverse"]["geohash_precision"] = precision
+        # Cells are widest at the equator and narrow with cos(latitude)
+        stats["reverse"]["cell_size_m"] = geohash.cell_size_m(precision)
+        stats["reverse"]["cell_size_latitude"] = 0.0
+        stats["reverse"]["db_max_entries"] = getattr(settings, *DB_MAX_ENTRIES_SETTINGS["reverse"])
+        return stats
+
+
+geocode_cache = GeocodeCache()
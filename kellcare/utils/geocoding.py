@@ -2,13 +2,23 @@
 Geocoding utilities for converting addresses to coordinates
 """
 
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from geopy.geocoders import Nominatim, GoogleV3
 from geopy.exc import GeocoderTimedOut, GeocoderServiceError
 from django.conf import settings
+from .gazetteer import get_gazetteer
+from .geocode_cache import geocode_cache, normalize_address, normalize_coordinates
+from .provider_health import get_provider_health
+from .rate_limiter import RateLimitExceeded, get_rate_limiter
 import logging
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+# Services backed by one provider ("chain" tries several of them, see _failover_order)
+PROVIDER_SERVICES = ("nominatim", "google", "local")
+
 
 class GeocodeService:
     """
@@ -20,14 +30,24 @@ class GeocodeService:
         Initialize geocoding service
 
         Args:
-            service (str): 'nominatim' (free) or 'google' (requires API key)
+            service (str): 'nominatim' (free), 'google' (requires API key) or 'local' (offline gazetteer)
         """
         self.service = service
         self.geocoder = self._get_geocoder()
+        # Rate limit by the provider actually used (google falls back to nominatim without a key)
+        if self.service == "local":
+            self.provider = "local"
+        else:
+            self.provider = "google" if isinstance(self.geocoder, GoogleV3) else "nominatim"
+        self.rate_limiter = get_rate_limiter(self.provider)
+        self.health = get_provider_health(self.provider)
 
     def _get_geocoder(self):
         """Get the appropriate geocoder instance"""
-        if self.service == "google":
+        if self.service == "local":
+            # Offline gazetteer (None when KELLCARE_GAZETTEER_CSV is not available)
+            return get_gazetteer()
+        elif self.service == "google":
             # Google Maps API (requires API key in settings)
             api_key = getattr(settings, "GOOGLE_MAPS_API_KEY", None)
             if not api_key:
@@ -38,6 +58,38 @@ class GeocodeService:
             # Nominatim (OpenStreetMap) - Free but rate limited
             return Nominatim(user_agent="kellcare_healthcare_app")
 
+    def _wait_for_rate_limit(self):
+        """Wait for the provider's shared rate limiter; returns seconds waited or None if over the max wait"""
+        try:
+            return self.rate_limiter.acquire(max_wait=getattr(settings, "KELLCARE_GEOCODE_MAX_WAIT", 10.0))
+        except RateLimitExceeded as e:
+            logger.warning(str(e))
+            return None
+
+    def _call(self, lookup, empty):
+        """
+        Run one provider lookup behind the circuit breaker and rate limiter
+
+        The outcome and latency feed the provider's health score, and the result
+        reports which provider answered and how long the call took.
+        """
+        if self.geocoder is None:
+            return dict(empty, error="Local gazetteer not configured", rate_limit_wait=0.0, provider=self.provider, elapsed=0.0)
+        if not self.health.allow_request():
+            return dict(empty, error="Geocoding provider temporarily unavailable", rate_limit_wait=0.0, provider=self.provider, elapsed=0.0)
+
+        waited = self._wait_for_rate_limit()
+        if waited is None:
+            self.health.release()
+            return dict(empty, error="Geocoding rate limit exceeded", rate_limit_wait=0.0, provider=self.provider, elapsed=0.0)
+
+        started = time.perf_counter()
+        result = lookup()
+        elapsed = time.perf_counter() - started
+        self.health.record(geocode_cache.cacheable(result), elapsed)
+        result.update(rate_limit_wait=round(waited, 4), provider=self.provider, elapsed=round(elapsed, 4))
+        return result
+
     def get_coordinates(self, address):
         """
         Convert address to coordinates
@@ -51,11 +103,18 @@ class GeocodeService:
                 'longitude': float,
                 'formatted_address': str,
                 'success': bool,
-                'error': str or None
+                'error': str or None,
+                'rate_limit_wait': float (seconds spent waiting for the rate limiter),
+                'provider': str (provider that answered),
+                'elapsed': float (seconds the provider call took)
             }
         """
+        empty = {"latitude": None, "longitude": None, "formatted_address": None, "success": False}
+        return self._call(lambda: self._geocode(address), empty)
+
+    def _geocode(self, address):
         try:
-            location = self.geocoder.geocode(address, timeout=10)
+            location = self.geocoder.geocode(address, timeout=getattr(settings, "KELLCARE_GEOCODE_TIMEOUT", 10))
 
             if location:
                 return {"latitude": location.latitude, "longitude": location.longitude, "formatted_address": location.address, "success": True, "error": None}
@@ -86,11 +145,17 @@ class GeocodeService:
             dict: {
                 'address': str,
                 'success': bool,
-                'error': str or None
+                'error': str or None,
+                'rate_limit_wait': float (seconds spent waiting for the rate limiter),
+                'provider': str (provider that answered),
+                'elapsed': float (seconds the provider call took)
             }
         """
+        return self._call(lambda: self._reverse_geocode(latitude, longitude), {"address": None, "success": False})
+
+    def _reverse_geocode(self, latitude, longitude):
         try:
-            location = self.geocoder.reverse(f"{latitude}, {longitude}", timeout=10)
+            location = self.geocoder.reverse(f"{latitude}, {longitude}", timeout=getattr(settings, "KELLCARE_GEOCODE_TIMEOUT", 10))
 
             if location:
                 return {"address": location.address, "success": True, "error": None}
@@ -110,36 +175,235 @@ class GeocodeService:
             return {"address": None, "success": False, "error": f"Unexpected error: {str(e)}"}
 
 
+_services = {}
+_services_lock = threading.Lock()
+
+
+def get_geocode_service(service="nominatim"):
+    """
+    Shared GeocodeService for a provider
+
+    Geocoder instances are reusable, so the convenience functions below use one
+    per provider instead of building a new geopy client on every call.
+
+    Raises:
+        ValueError: ``service`` is not one of PROVIDER_SERVICES
+    """
+    if service not in PROVIDER_SERVICES:
+        raise ValueError(f"Unknown geocoding service: {service!r}")
+    with _services_lock:
+        if service not in _services:
+            _services[service] = GeocodeService(service=service)
+        return _services[service]
+
+
+def _fallback_chain():
+    return list(getattr(settings, "KELLCARE_GEOCODE_CHAIN", ["local", "nominatim", "google"]))
+
+
+def _failover_order(service):
+    """
+    Services to try for a request, in order
+
+    'chain' is settings.KELLCARE_GEOCODE_CHAIN. Any other remote service is tried
+    first and, with settings.KELLCARE_GEOCODE_FAILOVER on, followed by the rest of
+    the chain.
+    """
+    if service == "chain":
+        return _fallback_chain()
+    if service == "local" or not getattr(settings, "KELLCARE_GEOCODE_FAILOVER", True):
+        return [service]
+    return [service] + [tier for tier in _fallback_chain() if tier != service]
+
+
+def _with_failover(service, lookup, empty):
+    """
+    Run ``lookup(tier)`` along the failover order of ``service``
+
+    A chain moves on until a service finds an answer. A specific service only
+    fails over when its provider could not answer (timeout, provider error, open
+    circuit breaker), not when it answered "not found". Services backed by a
+    provider that was already tried (google without an API key is nominatim) are
+    skipped.
+
+    Returns:
+        dict: The last result, with 'service_used' (None unless found), 'tried'
+        (services asked, in order) and 'elapsed' summed over the providers asked
+    """
+    result, tried, providers, elapsed = None, [], set(), 0.0
+    for tier in _failover_order(service):
+        provider = get_geocode_service(tier).provider
+        if provider in providers:
+            continue
+        providers.add(provider)
+        tried.append(tier)
+        result = lookup(tier)
+        elapsed += result.get("elapsed", 0.0)
+        if result["success"] or (service != "chain" and geocode_cache.cacheable(result)):
+            break
+
+    result = dict(result or dict(empty, error="No geocoding services configured", provider=None))
+    result.update(service_used=tried[-1] if result["success"] else None, tried=tried, elapsed=round(elapsed, 4))
+    return result
+
+
+def _cached_lookup(kind, service, key, lookup):
+    """One service's answer through the geocode cache (key "" skips the cache)"""
+    if key:
+        cached = geocode_cache.get(kind, service, key)
+        if cached is not None:
+            return dict(cached, provider=get_geocode_service(service).provider, elapsed=0.0, cached=True)
+    result = lookup()
+    if key:
+        geocode_cache.set(kind, service, key, result)
+    return result
+
+
 # Convenience functions
-def address_to_coordinates(address, service="nominatim"):
+def address_to_coordinates(address, service="nominatim", use_cache=True):
     """
     Quick function to convert address to coordinates
 
+    Unhealthy providers are skipped and failed calls fail over along
+    settings.KELLCARE_GEOCODE_CHAIN (see _with_failover).
+
     Args:
         address (str): Full address string
-        service (str): 'nominatim' or 'google'
+        service (str): 'nominatim', 'google', 'local', or 'chain' (try settings.KELLCARE_GEOCODE_CHAIN in order)
+        use_cache (bool): Serve repeated (normalized) addresses from the geocode cache
 
     Returns:
-        dict: Geocoding result
+        dict: Geocoding result, plus 'provider' and 'service_used' (who answered),
+        'tried' (services asked) and 'elapsed' (seconds spent in provider calls)
     """
-    geocode_service = GeocodeService(service=service)
-    return geocode_service.get_coordinates(address)
+    normalized = normalize_address(address) if use_cache else ""
 
+    def lookup(tier):
+        # The local gazetteer answers faster than the cache could
+        key = normalized if tier != "local" else ""
+        return _cached_lookup("forward", tier, key, lambda: get_geocode_service(tier).get_coordinates(address))
 
-def coordinates_to_address(latitude, longitude, service="nominatim"):
+    return _with_failover(service, lookup, {"latitude": None, "longitude": None, "formatted_address": None, "success": False})
+
+
+def coordinates_to_address(latitude, longitude, service="nominatim", use_cache=True):
     """
     Quick function to convert coordinates to address
 
+    Unhealthy providers are skipped and failed calls fail over along
+    settings.KELLCARE_GEOCODE_CHAIN (see _with_failover).
+
     Args:
         latitude (float): Latitude coordinate
         longitude (float): Longitude coordinate
-        service (str): 'nominatim' or 'google'
+        service (str): 'nominatim', 'google', 'local', or 'chain' (try settings.KELLCARE_GEOCODE_CHAIN in order)
+        use_cache (bool): Serve repeated coordinates from the geocode cache
 
     Returns:
-        dict: Reverse geocoding result
+        dict: Reverse geocoding result, plus 'provider', 'service_used', 'tried' and 'elapsed'
+    """
+    normalized = normalize_coordinates(latitude, longitude) if use_cache else ""
+
+    def lookup(tier):
+        key = normalized if tier != "local" else ""
+        return _cached_lookup("reverse", tier, key, lambda: get_geocode_service(tier).reverse_geocode(latitude, longitude))
+
+    return _with_failover(service, lookup, {"address": None, "success": False})
+
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def provider_concurrency(service):
+    """
+    Lookups allowed in flight at once for a service
+
+    Limits come from settings.KELLCARE_GEOCODE_CONCURRENCY, keyed by the provider a
+    service really uses (google without an API key is nominatim). A chain gets the
+    smallest limit of its tiers.
+    """
+    limits = getattr(settings, "KELLCARE_GEOCODE_CONCURRENCY", {})
+    if service == "chain":
+        return min((provider_concurrency(tier) for tier in _fallback_chain()), default=1)
+    return max(1, limits.get(get_geocode_service(service).provider, 1))
+
+
+def _get_executor(service):
+    """Thread pool for a service, shared by every geocode_many() call in this process"""
+    with _executors_lock:
+        executor = _executors.get(service)
+        if executor is None:
+            executor = _executors[service] = ThreadPoolExecutor(max_workers=provider_concurrency(service), thread_name_prefix=f"kellcare-geocode-{service}")
+        return executor
+
+
+def _lookup(address, service):
+    """Provider lookups for geocode_many() (cache reads and writes stay on the calling thread)"""
+    empty = {"latitude": None, "longitude": None, "formatted_address": None, "success": False}
+    try:
+        return _with_failover(service, lambda tier: get_geocode_service(tier).get_coordinates(address), empty)
+    except Exception as e:
+        logger.exception(f"Batch geocoding failed for address {address}")
+        return dict(empty, error=f"Unexpected error: {str(e)}", provider=None, service_used=None, tried=[], elapsed=0.0)
+
+
+def geocode_many(addresses, service="nominatim", use_cache=True):
+    """
+    Geocode many addresses concurrently, yielding results as they complete
+
+    Lookups run on a per-service thread pool sized by provider_concurrency(), so
+    Nominatim stays at one request in flight while Google runs many; the provider
+    rate limiters still pace the requests. Cached addresses are answered
+    immediately, addresses that normalize to the same key are looked up once,
+    and only a small window of lookups is queued at a time, so ``addresses``
+    may be a lazy iterable of any length.
+
+    Args:
+        addresses: Iterable of address strings
+        service (str): 'nominatim', 'google', 'local' or 'chain'
+        use_cache (bool): Read and fill the geocode cache
+
+    Yields:
+        tuple: (position in ``addresses``, address, result) in completion order;
+        results have the same fields as address_to_coordinates() results
     """
-    geocode_service = GeocodeService(service=service)
-    return geocode_service.reverse_geocode(latitude, longitude)
+    executor = _get_executor(service)
+    window = provider_concurrency(service) * 4
+    waiting = {}  # normalized address -> [(position, address), ...] sharing one lookup
+    in_flight = {}  # future -> normalized address
+
+    def finished(futures):
+        for future in futures:
+            key = in_flight.pop(future)
+            result = future.result()
+            # Stored from this thread (SQLite rejects concurrent writers), under the service that gave the final answer
+            tier = result["tried"][-1] if result["tried"] else None
+            if use_cache and tier not in (None, "local") and not key.startswith("raw:"):
+                geocode_cache.set("forward", tier, key, result)
+            for position, address in waiting.pop(key):
+                yield position, address, result
+
+    for position, address in enumerate(addresses):
+        key = normalize_address(address) or f"raw:{address}"
+        if key in waiting:
+            waiting[key].append((position, address))
+            continue
+        if use_cache and service not in ("local", "chain") and not key.startswith("raw:"):
+            cached = geocode_cache.get("forward", service, key)
+            if cached is not None:
+                yield position, address, dict(cached, provider=get_geocode_service(service).provider, service_used=service, tried=[service], elapsed=0.0, cached=True)
+                continue
+
+        waiting[key] = [(position, address)]
+        in_flight[executor.submit(_lookup, address, service)] = key
+        if len(in_flight) >= window:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            yield from finished(done)
+
+    while in_flight:
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        yield from finished(done)
 
 
 # Usage examples:
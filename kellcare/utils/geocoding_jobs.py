@@ -0,0 +1,319 @@
+"""
+Resumable bulk geocoding jobs
+
+A GeocodingJob walks the Doctor and/or Patient tables in primary-key order, one
+chunk at a time. Rows are grouped by normalized address so each distinct address
+is geocoded once per run. Each chunk's results are written with a single
+bulk_update and checkpointed (last primary key plus counters) in the same
+transaction, so a job that dies part-way resumes from its last finished chunk
+instead of starting over. Rows whose address fingerprint shows their coordinates
+were geocoded from the current address are skipped unless the job is forced.
+Jobs run from `manage.py bulk_geocode`, from a polling worker
+(`manage.py bulk_geocode --worker`) or, when KELLCARE_GEOCODE_IN_BACKGROUND is
+on, in a thread started by the bulk-update endpoint. Whoever runs a job first
+claims it with a conditional UPDATE (claim_job), so a job never runs twice at once.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from ..api_client import invalidate_response_cache
+from ..models import Doctor, GeocodingJob, Patient
+from .geocode_cache import address_fingerprint, normalize_address
+from .geocoding import geocode_many
+from .index_changes import record_index_changes
+from .spatial_index import doctor_index
+
+logger = logging.getLogger(__name__)
+
+TARGETS = {"doctors": Doctor, "patients": Patient}
+
+# Results remembered per run for address dedup (least recently used dropped first);
+# older addresses fall back to the geocode cache
+RESOLVED_MAX_ENTRIES = 10000
+
+
+def create_job(service="nominatim", targets=("doctors", "patients"), only_missing=False, chunk_size=None, user=None, force=False):
+    """
+    Create a pending bulk geocoding job
+
+    Args:
+        service (str): 'nominatim', 'google', 'local' or 'chain'
+        targets: Row types to geocode ("doctors", "patients")
+        only_missing (bool): Skip rows that already have coordinates
+        chunk_size (int): Rows per checkpoint (defaults to settings.KELLCARE_GEOCODE_JOB_CHUNK_SIZE)
+        user: User who requested the job
+        force (bool): Also re-geocode rows whose address is unchanged since their coordinates were set
+
+    Returns:
+        GeocodingJob: The new job
+    """
+    unknown = set(targets) - set(TARGETS)
+    if unknown:
+        raise ValueError(f"Unknown geocoding targets: {', '.join(sorted(unknown))}")
+    return GeocodingJob.objects.create(
+        service=service,
+        targets=[name for name in TARGETS if name in targets],
+        only_missing=only_missing,
+        force=force,
+        chunk_size=chunk_size or getattr(settings, "KELLCARE_GEOCODE_JOB_CHUNK_SIZE", 100),
+        created_by=user if user is not None and user.is_authenticated else None,
+    )
+
+
+def _target_queryset(job, name):
+    queryset = TARGETS[name].objects.exclude(address="")
+    if job.only_missing:
+        queryset = queryset.filter(Q(latitude__isnull=True) | Q(longitude__isnull=True))
+    return queryset
+
+
+def _display_name(instance):
+    return instance.user.get_full_name() if instance.user_id else str(instance.pk)
+
+
+def _process_chunk(job, name, rows, resolved, dedup):
+    """
+    Geocode one chunk and return (updated rows, per-row errors, rows skipped as up to date)
+
+    Rows are grouped by normalized address (the geocode cache key), and each distinct
+    address is looked up once per run: ``resolved`` maps keys already looked up
+    earlier in the run (by any target) to their results, so family members and
+    colleagues sharing a building cost one lookup between them. It keeps the
+    RESOLVED_MAX_ENTRIES most recently used keys. A chunk's new addresses are
+    looked up concurrently through geocode_many(); ``dedup["lookups"]`` counts
+    only those that reached a provider, and ``dedup["cache_hits"]`` those the
+    geocode cache answered.
+    """
+    groups = {}
+    skipped = 0
+    for instance in rows:
+        fingerprint = address_fingerprint(instance.address)
+        if not job.force and fingerprint and fingerprint == instance.address_fingerprint and instance.latitude is not None and instance.longitude is not None:
+            skipped += 1
+            continue
+        key = normalize_address(instance.address) or f"raw:{instance.address}"
+        groups.setdefault(key, []).append(instance)
+
+    # New addresses are looked up concurrently, up to the provider's concurrency limit
+    keys = [key for key in groups if key not in resolved]
+    for position, _, result in geocode_many((groups[key][0].address for key in keys), service=job.service):
+        resolved[keys[position]] = (result["success"], result["latitude"], result["longitude"], result["error"])
+        dedup["cache_hits" if result.get("cached") else "lookups"] += 1
+
+    updated, errors = [], []
+    for key, instances in groups.items():
+        success, latitude, longitude, error = resolved[key]
+        resolved.move_to_end(key)
+        dedup["rows"] += len(instances)
+
+        for instance in instances:
+            if success:
+                instance.latitude = latitude
+                instance.longitude = longitude
+                instance.address_fingerprint = address_fingerprint(instance.address)
+                updated.append(instance)
+            else:
+                errors.append({"target": name, "id": instance.pk, "name": _display_name(instance), "error": error})
+
+    while len(resolved) > RESOLVED_MAX_ENTRIES:
+        resolved.popitem(last=False)
+    return updated, errors, skipped
+
+
+def _dedup_report(dedup):
+    rows, lookups = dedup["rows"], dedup["lookups"]
+    return dict(dedup, saved_calls=rows - lookups, dedup_ratio=round(1 - lookups / rows, 3) if rows else 0.0)
+
+
+def run_job(job):
+    """
+    Run (or resume) a job until every target is processed
+
+    Args:
+        job (GeocodingJob): Job to run; its checkpoint decides where processing starts
+
+    Returns:
+        GeocodingJob: The job in its final state ("completed" or "failed")
+    """
+    max_errors = getattr(settings, "KELLCARE_GEOCODE_JOB_MAX_ERRORS", 100)
+    now = timezone.now()
+    job.status = "running"
+    job.started_at = job.started_at or now
+    job.heartbeat_at = now
+    job.finished_at = None
+    job.error = ""
+    for name in job.targets:
+        progress = job.progress.setdefault(name, {"last_id": 0, "processed": 0, "updated": 0, "failed": 0, "skipped": 0})
+        progress["total"] = progress["processed"] + _target_queryset(job, name).filter(pk__gt=progress["last_id"]).count()
+    job.save(update_fields=["status", "started_at", "heartbeat_at", "finished_at", "error", "progress"])
+
+    # Address dedup state: results by normalized address for this run, and counters carried across resumes
+    resolved = OrderedDict()
+    dedup = {"rows": 0, "lookups": 0, "cache_hits": 0}
+    dedup.update({key: job.progress.get("dedup", {}).get(key, 0) for key in dedup})
+
+    try:
+        for name in job.targets:
+            model = TARGETS[name]
+            progress = job.progress[name]
+
+            while True:
+                rows = list(
+                    _target_queryset(job, name)
+                    .filter(pk__gt=progress["last_id"])
+                    .select_related("user")
+                    .only("id", "address", "latitude", "longitude", "address_fingerprint", "user__first_name", "user__last_name")
+                    .order_by("pk")[: job.chunk_size]
+                )
+                if not rows:
+                    break
+
+                updated, errors, skipped = _process_chunk(job, name, rows, resolved, dedup)
+                job.progress["dedup"] = _dedup_report(dedup)
+                progress["last_id"] = rows[-1].pk
+                progress["processed"] += len(rows)
+                progress["updated"] += len(updated)
+                progress["failed"] += len(errors)
+                progress["skipped"] = progress.get("skipped", 0) + skipped
+                job.errors = (job.errors + errors)[-max_errors:] if max_errors else []
+                job.heartbeat_at = timezone.now()
+
+                # Results and checkpoint commit together, so a crash never loses or repeats a finished chunk
+                with transaction.atomic():
+                    model.objects.bulk_update(updated, ["latitude", "longitude", "address_fingerprint"])
+                    if model is Doctor:
+                        record_index_changes("doctor", [row.pk for row in updated])
+                    job.save(update_fields=["progress", "errors", "heartbeat_at"])
+                if updated:
+                    # bulk_update sends no post_save signals, so the job records index changes itself
+                    invalidate_response_cache(name)
+                    if model is Doctor:
+                        doctor_index.refresh([row.pk for row in updated])
+
+        job.status = "completed"
+    except Exception as e:
+        logger.exception(f"Geocoding job {job.pk} failed")
+        job.status = "failed"
+        job.error = str(e)
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "error", "finished_at"])
+    return job
+
+
+def _stale_before():
+    return timezone.now() - timedelta(seconds=getattr(settings, "KELLCARE_GEOCODE_JOB_STALE_AFTER", 300))
+
+
+def claim_job(job):
+    """
+    Mark a job as running, unless it is completed or running with a recent heartbeat
+
+    The check and the update are one conditional UPDATE, so of two processes
+    claiming the same job only one succeeds.
+
+    Returns:
+        bool: Whether this caller now owns the job
+    """
+    now = timezone.now()
+    claimable = Q(status__in=("pending", "failed")) | Q(status="running", heartbeat_at__lt=_stale_before()) | Q(status="running", heartbeat_at__isnull=True)
+    claimed = GeocodingJob.objects.filter(claimable, pk=job.pk).update(status="running", heartbeat_at=now)
+    if claimed:
+        job.status = "running"
+        job.heartbeat_at = now
+    return bool(claimed)
+
+
+def claim_next_job():
+    """
+    Pick the next job for a worker: the oldest pending job, or a running job whose
+    heartbeat is older than KELLCARE_GEOCODE_JOB_STALE_AFTER seconds (its worker died)
+
+    Returns:
+        GeocodingJob or None
+    """
+    while True:
+        job = (
+            GeocodingJob.objects.filter(status="pending").order_by("created_at").first()
+            or GeocodingJob.objects.filter(status="running", heartbeat_at__lt=_stale_before()).order_by("created_at").first()
+        )
+        if job is None:
+            return None
+        # Another worker (or the endpoint's thread) may have claimed it since it was read
+        if claim_job(job):
+            return job
+
+
+def start_job_in_background(job):
+    """
+    Claim a job and run it in a daemon thread of this process
+
+    Returns:
+        threading.Thread or None: None when a worker claimed the job first
+    """
+    if not claim_job(job):
+        return None
+
+    def target():
+        try:
+            run_job(job)
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=target, name=f"kellcare-geocoding-job-{job.pk}", daemon=True)
+    thread.start()
+    return thread
+
+
+def job_status(job):
+    """
+    Progress report for the status endpoint and management command
+
+    Returns:
+        dict: Status, per-target counters, address dedup savings, throughput (rows/second), ETA and recent errors
+    """
+    targets = [job.progress[name] for name in job.targets if name in job.progress]
+    processed = sum(progress.get("processed", 0) for progress in targets)
+    total = sum(progress.get("total", 0) for progress in targets)
+    elapsed = None
+    throughput = None
+    eta = None
+    if job.started_at:
+        end = job.finished_at or job.heartbeat_at or timezone.now()
+        elapsed = max((end - job.started_at).total_seconds(), 0.0)
+        if elapsed and processed:
+            throughput = round(processed / elapsed, 3)
+            if job.status == "running" and total > processed:
+                eta = round((total - processed) / throughput, 1)
+
+    return {
+        "job_id": job.pk,
+        "status": job.status,
+        "service": job.service,
+        "targets": job.targets,
+        "only_missing": job.only_missing,
+        "force": job.force,
+        "chunk_size": job.chunk_size,
+        "progress": {name: job.progress[name] for name in job.targets if name in job.progress},
+        "dedup": job.progress.get("dedup", _dedup_report({"rows": 0, "lookups": 0, "cache_hits": 0})),
+        "processed": processed,
+        "total": total,
+        "percent_complete": round(100 * processed / total, 1) if total else (100.0 if job.status == "completed" else 0.0),
+        "elapsed_seconds": round(elapsed, 1) if elapsed is not None else None,
+        "rows_per_second": throughput,
+        "eta_seconds": eta,
+        "errors": job.errors,
+        "error": job.error or None,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "heartbeat_at": job.heartbeat_at,
+        "finished_at": job.finished_at,
+    }
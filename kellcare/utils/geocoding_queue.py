@@ -0,0 +1,174 @@
+"""
+Background resolution of missing or outdated coordinates
+
+Page views never geocode while rendering: they read stored coordinates, show a
+placeholder for rows without them and enqueue those rows here. Saving a Doctor or
+Patient whose address no longer matches its address fingerprint enqueues it too. A single daemon
+worker geocodes queued rows one at a time (paced by the provider rate limiter)
+and saves the result, so later page views pick the coordinates up once the
+post_save signals invalidate the cached API responses.
+"""
+
+import logging
+import queue
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+
+from .geocode_cache import address_fingerprint
+from .geocoding import address_to_coordinates
+
+logger = logging.getLogger(__name__)
+
+
+def needs_coordinates(instance):
+    """
+    Whether a Doctor/Patient row needs geocoding: it has an address but no stored
+    coordinates, or its coordinates were geocoded from a different address
+    """
+    if not instance.address:
+        return False
+    return instance.latitude is None or instance.longitude is None or instance.address_fingerprint != address_fingerprint(instance.address)
+
+
+def resolve_coordinates(instance, service=None):
+    """
+    Geocode one row's address and store the coordinates
+
+    Args:
+        instance: Doctor or Patient with an ``address``
+        service (str): Geocoding service (defaults to settings.KELLCARE_GEOCODE_SERVICE)
+
+    Returns:
+        dict: Geocoding result from address_to_coordinates()
+    """
+    service = service or getattr(settings, "KELLCARE_GEOCODE_SERVICE", "nominatim")
+    result = address_to_coordinates(instance.address, service=service)
+    if result["success"]:
+        instance.latitude = result["latitude"]
+        instance.longitude = result["longitude"]
+        instance.address_fingerprint = address_fingerprint(instance.address)
+        instance.save(update_fields=["latitude", "longitude", "address_fingerprint"])
+    return result
+
+
+class GeocodingQueue:
+    """
+    De-duplicating work queue of rows waiting for coordinates
+
+    Rows are identified by (model label, pk). A row that is already queued is not
+    added twice, and a row whose lookup failed is not retried for
+    KELLCARE_GEOCODE_RETRY_AFTER seconds, so repeated page views cannot turn into
+    repeated calls to the geocoding provider. Failures are remembered in expiry
+    order and dropped once they expire, so only the last RETRY_AFTER seconds of
+    failures are kept.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._failed_until = {}
+        self._worker = None
+        self._stats = {"enqueued": 0, "resolved": 0, "failed": 0, "skipped": 0}
+
+    def enqueue(self, model, pks):
+        """
+        Queue rows for background geocoding
+
+        Args:
+            model: Model class (Doctor or Patient)
+            pks: Primary keys of rows without (current) coordinates
+
+        Returns:
+            int: Number of rows newly queued
+        """
+        label = model._meta.label
+        now = time.monotonic()
+        added = 0
+        with self._lock:
+            for pk in pks:
+                key = (label, pk)
+                if key in self._pending or self._failed_until.get(key, 0) > now:
+                    continue
+                self._pending.add(key)
+                self._queue.put(key)
+                added += 1
+            self._stats["enqueued"] += added
+            self._prune_failed(now)
+        if added and getattr(settings, "KELLCARE_GEOCODE_IN_BACKGROUND", True):
+            self._ensure_worker()
+        return added
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, pending=len(self._pending))
+
+    def process_next(self, timeout=None):
+        """
+        Resolve one queued row (blocking up to ``timeout`` seconds for work)
+
+        Returns:
+            bool: False if the queue stayed empty
+        """
+        try:
+            key = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return False
+
+        label, pk = key
+        outcome = "skipped"
+        try:
+            instance = apps.get_model(label).objects.filter(pk=pk).first()
+            if instance is not None and needs_coordinates(instance):
+                outcome = "resolved" if resolve_coordinates(instance)["success"] else "failed"
+        except Exception:
+            logger.exception(f"Background geocoding failed for {label} {pk}")
+            outcome = "failed"
+        finally:
+            connections.close_all()
+
+        with self._lock:
+            self._pending.discard(key)
+            self._stats[outcome] += 1
+            now = time.monotonic()
+            if outcome == "failed":
+                # Re-inserted at the end, so the dict stays in expiry order
+                self._failed_until.pop(key, None)
+                self._failed_until[key] = now + getattr(settings, "KELLCARE_GEOCODE_RETRY_AFTER", 3600)
+            self._prune_failed(now)
+        return outcome != "skipped"
+
+    def _prune_failed(self, now):
+        """Forget expired failures (call with the lock held)"""
+        while self._failed_until:
+            key, until = next(iter(self._failed_until.items()))
+            if until > now:
+                break
+            del self._failed_until[key]
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(target=self._run, name="kellcare-geocoder", daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            self.process_next()
+
+
+geocoding_queue = GeocodingQueue()
+
+
+def enqueue_missing_coordinates(model, pks):
+    """Queue rows without stored (or current) coordinates for background geocoding"""
+    return geocoding_queue.enqueue(model, pks)
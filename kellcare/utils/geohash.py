@@ -0,0 +1,51 @@
+"""
+Geohash encoding for snapping coordinates to grid cells
+
+A geohash interleaves longitude and latitude bisections into a base-32 string;
+each extra character shrinks the cell, and points in the same cell share a prefix.
+"""
+
+import math
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def encode(latitude, longitude, precision=8):
+    """
+    Geohash of a coordinate pair
+
+    Args:
+        latitude (float): Latitude in degrees
+        longitude (float): Longitude in degrees
+        precision (int): Number of characters (8 is roughly a 38 m x 19 m cell)
+
+    Returns:
+        str: Geohash cell
+    """
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    latitude, longitude = float(latitude), float(longitude)
+    cell, bits, value, even = [], 0, 0, True
+    while len(cell) < precision:
+        span, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (span[0] + span[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            span[0] = middle
+        else:
+            span[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            cell.append(BASE32[value])
+            bits, value = 0, 0
+    return "".join(cell)
+
+
+def cell_size_m(precision, latitude=0.0):
+    """Approximate (width, height) in metres of a geohash cell at the given latitude"""
+    lng_bits = math.ceil(precision * 5 / 2)
+    lat_bits = precision * 5 // 2
+    width = 360 / 2**lng_bits * 111_320 * math.cos(math.radians(latitude))
+    height = 180 / 2**lat_bits * 110_574
+    return round(width, 1), round(height, 1)
@@ -0,0 +1,157 @@
+"""
+Change records that keep per-process in-memory indexes current
+
+Every process holds its own doctor spatial index and autocomplete index. Doctor
+and Patient writes add an IndexChange row (kind, id) in the writing transaction,
+and each process reads the rows after the last one it applied, at most every
+KELLCARE_INDEX_SYNC_INTERVAL seconds, and re-reads just those doctors and
+patients. The auto-increment id orders the records, and SQLite commits one
+writer at a time, so a record is never skipped.
+
+A process that falls too far behind (more than MAX_CHANGES_PER_SYNC records, or
+no sync for half of KELLCARE_INDEX_CHANGE_RETENTION, after which records are
+pruned) rebuilds in a background thread and keeps serving its current index
+until the new one is ready. Only the first use in a process builds on the
+request path.
+"""
+
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from ..models import IndexChange
+
+logger = logging.getLogger(__name__)
+
+# Records applied incrementally in one sync; a longer backlog triggers a rebuild
+MAX_CHANGES_PER_SYNC = 2000
+
+# Delete expired records every this many writes
+PRUNE_EVERY = 100
+
+_writes = 0
+_writes_lock = threading.Lock()
+
+
+def record_index_changes(kind, ids):
+    """
+    Record written doctors or patients for every process's indexes
+
+    Call inside the writing transaction, so the record commits with the write.
+
+    Args:
+        kind (str): "doctor" or "patient"
+        ids: Primary keys of the written rows
+    """
+    global _writes
+    ids = list(ids)
+    if not ids:
+        return
+    IndexChange.objects.bulk_create(IndexChange(kind=kind, object_id=pk) for pk in ids)
+    with _writes_lock:
+        _writes += 1
+        prune = _writes % PRUNE_EVERY == 0
+    if prune:
+        prune_index_changes()
+
+
+def prune_index_changes():
+    """Delete records older than KELLCARE_INDEX_CHANGE_RETENTION seconds; returns how many"""
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, "KELLCARE_INDEX_CHANGE_RETENTION", 3600))
+    return IndexChange.objects.filter(created_at__lt=cutoff).delete()[0]
+
+
+def latest_change_id():
+    """Id of the newest record (0 when there are none)"""
+    return IndexChange.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+
+
+def changes_after(change_id, limit):
+    """(id, kind, object_id) of up to ``limit`` records after ``change_id``, oldest first"""
+    return list(IndexChange.objects.filter(pk__gt=change_id).order_by("pk").values_list("pk", "kind", "object_id")[:limit])
+
+
+class ChangeFollowingIndex:
+    """
+    Mixin for in-memory indexes that follow IndexChange records
+
+    Subclasses call ``_init_sync()`` from ``__init__``, set ``last_change_id``
+    in ``build()`` (read with latest_change_id() before loading rows) and
+    implement ``apply_changes(changes)``.
+    """
+
+    def _init_sync(self):
+        self.last_change_id = None  # None until built
+        self.synced_at = None  # time.monotonic() of the last check
+        self.synced_wall = None  # time.time() of the last build or sync
+        self._build_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self.rebuilding = False
+
+    def _mark_synced(self, change_id):
+        self.last_change_id = change_id
+        self.synced_at = time.monotonic()
+        self.synced_wall = time.time()
+
+    def ensure_fresh(self):
+        """
+        Build on first use; afterwards apply records written since the last sync
+
+        Never rebuilds on the calling thread once built: a long backlog starts
+        rebuild_in_background() and the current contents keep being served.
+        """
+        if self.last_change_id is None:
+            with self._build_lock:
+                if self.last_change_id is None:
+                    self.build()
+            return
+        if time.monotonic() - self.synced_at < getattr(settings, "KELLCARE_INDEX_SYNC_INTERVAL", 1.0):
+            return
+        # Another thread is already syncing: serve the current contents
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            self.synced_at = time.monotonic()
+            if self.rebuilding:
+                return
+            # Records older than the retention may be pruned before this process read them
+            if time.time() - self.synced_wall > getattr(settings, "KELLCARE_INDEX_CHANGE_RETENTION", 3600) / 2:
+                self.rebuild_in_background()
+                return
+            changes = changes_after(self.last_change_id, MAX_CHANGES_PER_SYNC + 1)
+            if len(changes) > MAX_CHANGES_PER_SYNC:
+                self.rebuild_in_background()
+                return
+            if changes:
+                self.apply_changes(changes)
+            self._mark_synced(changes[-1][0] if changes else self.last_change_id)
+        finally:
+            self._sync_lock.release()
+
+    def rebuild_in_background(self):
+        """Rebuild in a daemon thread, swapping the new contents in when done"""
+        if self.rebuilding:
+            return None
+        self.rebuilding = True
+
+        def target():
+            try:
+                with self._build_lock:
+                    self.build()
+            except Exception:
+                logger.exception(f"Background rebuild of {type(self).__name__} failed")
+            finally:
+                self.rebuilding = False
+                connections.close_all()
+
+        thread = threading.Thread(target=target, name=f"kellcare-rebuild-{type(self).__name__}", daemon=True)
+        thread.start()
+        return thread
+
+    def apply_changes(self, changes):
+        raise NotImplementedError
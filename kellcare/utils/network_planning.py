@@ -0,0 +1,386 @@
+"""
+Patient-to-doctor network planning reports
+
+For every patient with coordinates, find the nearest available doctors in each
+specialization, and summarize each doctor's catchment (the patients for whom it
+is the nearest doctor of its specialization).
+
+Doctors of each specialization are loaded into their own grid index. Patients
+are streamed in chunks of contiguous float arrays and grouped by grid cell;
+each group is compared against the doctors in a square block of surrounding
+cells with one numpy distance matrix (patients x doctors). A patient's result is accepted
+once its k-th distance is shorter than the distance to the edge of the block
+(so no doctor outside could be nearer); the rest retry with a block twice as
+wide. Memory stays bounded by the chunk size plus the per-doctor counters.
+
+Reports take minutes on large tables, so they are never built inside a
+request: NetworkReport rows are filled by `manage.py nearest_specialists
+--store` or by a background thread started for a staff refresh, and the API
+serves the latest completed one.
+"""
+
+import logging
+import threading
+import time
+from array import array
+
+import numpy as np
+from django.db import connections, transaction
+from django.utils import timezone
+
+from ..models import Doctor, NetworkReport, Patient
+from .geo import EARTH_RADIUS_KM
+from .spatial_index import SPECIALIZATIONS, DoctorSpatialIndex
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (km) of the distance bands reported per specialization
+DISTANCE_BANDS_KM = (5, 10, 25, 50, 100)
+
+# Largest patients x doctors distance matrix computed at once (8 bytes per cell)
+MAX_MATRIX_CELLS = 2_000_000
+
+# Report grid cells are sized for this many doctors on average, within these bounds (degrees)
+DOCTORS_PER_REPORT_CELL = 4
+MIN_REPORT_CELL_DEGREES = 0.01
+MAX_REPORT_CELL_DEGREES = 5.0
+
+
+def _safe_radii_km(latitudes, longitudes, box):
+    """Distance from each point inside ``box`` below which nothing outside the box can lie"""
+    min_lat, max_lat, min_lng, max_lng = box
+    radii = np.full(latitudes.shape, np.inf)
+    if min_lat > -90:
+        radii = np.minimum(radii, np.radians(latitudes - min_lat) * EARTH_RADIUS_KM)
+    if max_lat < 90:
+        radii = np.minimum(radii, np.radians(max_lat - latitudes) * EARTH_RADIUS_KM)
+    if max_lng - min_lng < 360:
+        # Great-circle distance to a meridian Δλ away is asin(cos φ · sin Δλ) ≥ cos φ · sin Δλ
+        delta = np.radians(np.minimum(np.minimum(longitudes - min_lng, max_lng - longitudes), 90))
+        radii = np.minimum(radii, EARTH_RADIUS_KM * np.cos(np.radians(latitudes)) * np.sin(delta))
+    return radii
+
+
+def _distance_matrix_km(latitudes, longitudes, block):
+    """Haversine distances (patients x doctors) from points to a block of doctors, in one numpy pass"""
+    doctor_phis, doctor_cosines, doctor_lambdas = block
+    phis, lambdas = np.radians(latitudes)[:, None], np.radians(longitudes)[:, None]
+    a = np.sin((doctor_phis - phis) / 2) ** 2 + np.cos(phis) * doctor_cosines * np.sin((doctor_lambdas - lambdas) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _cell_groups(index, latitudes, longitudes):
+    """Positions of the patients in each grid cell of ``index``, as {(row, column): positions}"""
+    rows = np.floor(latitudes / index.cell_degrees).astype(np.int64)
+    columns = np.floor(longitudes / index.cell_degrees).astype(np.int64)
+    order = np.lexsort((columns, rows))
+    rows, columns = rows[order], columns[order]
+    starts = np.flatnonzero(np.concatenate(([True], (rows[1:] != rows[:-1]) | (columns[1:] != columns[:-1]))))
+    return {(int(rows[start]), int(columns[start])): positions for start, positions in zip(starts, np.split(order, starts[1:]))}
+
+
+def load_specialist_indexes(specializations=None, cell_degrees=None):
+    """
+    One grid index of available doctors with coordinates per specialization
+
+    Without ``cell_degrees``, each index gets cells holding about
+    DOCTORS_PER_REPORT_CELL doctors on average, so every distance matrix
+    covers many patients and a few hundred doctors.
+
+    Returns:
+        dict: specialization -> DoctorSpatialIndex (specializations without doctors are kept, empty)
+    """
+    specializations = specializations or SPECIALIZATIONS
+    rows = {specialization: [] for specialization in specializations}
+    doctors = (
+        Doctor.objects.order_by()
+        .filter(is_available=True, specialization__in=specializations, latitude__isnull=False, longitude__isnull=False)
+        .values_list("id", "latitude", "longitude", "specialization", "is_available")
+    )
+    for row in doctors.iterator(chunk_size=5000):
+        rows[row[3]].append(row)
+    return {
+        specialization: DoctorSpatialIndex.from_rows(rows[specialization], cell_degrees or _report_cell_degrees(rows[specialization]))
+        for specialization in specializations
+    }
+
+
+def _report_cell_degrees(rows):
+    """Cell size giving about DOCTORS_PER_REPORT_CELL doctors per cell over the doctors' bounding box"""
+    if len(rows) < 2:
+        return MAX_REPORT_CELL_DEGREES
+    latitudes = [float(row[1]) for row in rows]
+    longitudes = [float(row[2]) for row in rows]
+    area = max(max(latitudes) - min(latitudes), 0.01) * max(max(longitudes) - min(longitudes), 0.01)
+    return min(max((area * DOCTORS_PER_REPORT_CELL / len(rows)) ** 0.5, MIN_REPORT_CELL_DEGREES), MAX_REPORT_CELL_DEGREES)
+
+
+def patient_coordinate_chunks(chunk_size=50_000):
+    """
+    Stream patients with coordinates as (ids, latitudes, longitudes) array chunks
+
+    Yields:
+        tuple: (array('q'), array('d'), array('d'))
+    """
+    ids, latitudes, longitudes = array("q"), array("d"), array("d")
+    patients = Patient.objects.order_by("pk").filter(latitude__isnull=False, longitude__isnull=False).values_list("id", "latitude", "longitude")
+    for patient_id, latitude, longitude in patients.iterator(chunk_size=min(chunk_size, 5000)):
+        ids.append(patient_id)
+        latitudes.append(float(latitude))
+        longitudes.append(float(longitude))
+        if len(ids) >= chunk_size:
+            yield ids, latitudes, longitudes
+            ids, latitudes, longitudes = array("q"), array("d"), array("d")
+    if ids:
+        yield ids, latitudes, longitudes
+
+
+def nearest_in_chunk(index, ids, latitudes, longitudes, k=1):
+    """
+    The ``k`` nearest doctors in ``index`` for every patient in a chunk
+
+    Args:
+        index (DoctorSpatialIndex): Doctors of one specialization
+        ids, latitudes, longitudes: Parallel patient arrays
+
+    Yields:
+        tuple: (patient_ids, doctor_ids, distances_km) numpy arrays for a batch of
+        patients; row i of the (patients x k) doctor and distance arrays is patient
+        i's nearest doctors, nearest first (fewer than k columns when the index
+        holds fewer doctors, none when it is empty)
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    total = len(index)
+    if not total:
+        yield ids, np.empty((len(ids), 0), dtype=np.int64), np.empty((len(ids), 0))
+        return
+
+    latitudes, longitudes = np.asarray(latitudes, dtype=np.float64), np.asarray(longitudes, dtype=np.float64)
+    for cell, pending in _cell_groups(index, latitudes, longitudes).items():
+        rings = 1
+        while pending.size:
+            doctor_ids, doctor_lats, doctor_lngs, box = index.cell_block(cell, rings)
+            exhaustive = len(doctor_ids) >= total
+            if len(doctor_ids) < k and not exhaustive:
+                rings *= 2
+                continue
+
+            # The block's trigonometry is computed once and shared by every patient in the group
+            doctor_ids = np.asarray(doctor_ids, dtype=np.int64)
+            doctor_phis = np.radians(np.asarray(doctor_lats, dtype=np.float64))
+            block = (doctor_phis, np.cos(doctor_phis), np.radians(np.asarray(doctor_lngs, dtype=np.float64)))
+            nearest_count = min(k, len(doctor_ids))
+            retry = []
+            # Patients per distance matrix, so one matrix stays within MAX_MATRIX_CELLS
+            batch_size = max(1, MAX_MATRIX_CELLS // len(doctor_ids))
+            for start in range(0, pending.size, batch_size):
+                batch = pending[start : start + batch_size]
+                distances = _distance_matrix_km(latitudes[batch], longitudes[batch], block)
+                if nearest_count < len(doctor_ids):
+                    nearest = np.argpartition(distances, nearest_count - 1, axis=1)[:, :nearest_count]
+                else:
+                    nearest = np.broadcast_to(np.arange(len(doctor_ids)), distances.shape)
+                nearest_distances = np.take_along_axis(distances, nearest, axis=1)
+                order = np.argsort(nearest_distances, axis=1, kind="stable")
+                nearest, nearest_distances = np.take_along_axis(nearest, order, axis=1), np.take_along_axis(nearest_distances, order, axis=1)
+
+                if exhaustive:
+                    accepted = np.ones(batch.size, dtype=bool)
+                elif nearest_count < k:
+                    accepted = np.zeros(batch.size, dtype=bool)
+                else:
+                    accepted = nearest_distances[:, -1] <= _safe_radii_km(latitudes[batch], longitudes[batch], box)
+                if accepted.any():
+                    yield ids[batch[accepted]], doctor_ids[nearest[accepted]], nearest_distances[accepted]
+                retry.append(batch[~accepted])
+            pending = np.concatenate(retry)
+            rings *= 2
+
+
+class CatchmentStats:
+    """
+    Running per-specialization and per-doctor catchment counters
+
+    Only a patient's nearest doctor (rank 1) counts towards catchments and distance
+    bands; ``in_top_k`` counts every appearance in a nearest-k list.
+    """
+
+    def __init__(self, specializations):
+        self.specializations = {
+            specialization: {"patients": 0, "unserved": 0, "distance_sum": 0.0, "max_km": 0.0, "bands": [0] * (len(DISTANCE_BANDS_KM) + 1)}
+            for specialization in specializations
+        }
+        self.doctors = {}
+
+    def add(self, specialization, doctor_ids, distances):
+        """
+        Count a batch of patients' nearest doctors
+
+        Args:
+            specialization (str): Specialization of the doctors
+            doctor_ids, distances: (patients x k) arrays from nearest_in_chunk
+        """
+        summary = self.specializations[specialization]
+        count = len(doctor_ids)
+        summary["patients"] += count
+        if not doctor_ids.shape[1]:
+            summary["unserved"] += count
+            return
+
+        nearest = distances[:, 0]
+        summary["distance_sum"] += float(nearest.sum())
+        summary["max_km"] = max(summary["max_km"], float(nearest.max()))
+        bands = np.bincount(np.searchsorted(DISTANCE_BANDS_KM, nearest, side="left"), minlength=len(DISTANCE_BANDS_KM) + 1)
+        summary["bands"] = [total + int(added) for total, added in zip(summary["bands"], bands)]
+
+        in_top_k, appearances = np.unique(doctor_ids, return_counts=True)
+        firsts, first_positions = np.unique(doctor_ids[:, 0], return_inverse=True)
+        patients = np.bincount(first_positions, minlength=len(firsts))
+        distance_sums = np.bincount(first_positions, weights=nearest, minlength=len(firsts))
+        max_distances = np.zeros(len(firsts))
+        np.maximum.at(max_distances, first_positions, nearest)
+
+        doctors = self.doctors
+        for doctor_id, appeared in zip(in_top_k.tolist(), appearances.tolist()):
+            doctor = doctors.get(doctor_id)
+            if doctor is None:
+                doctor = doctors[doctor_id] = {"specialization": specialization, "patients": 0, "distance_sum": 0.0, "max_km": 0.0, "in_top_k": 0}
+            doctor["in_top_k"] += appeared
+        for doctor_id, first, distance_sum, max_km in zip(firsts.tolist(), patients.tolist(), distance_sums.tolist(), max_distances.tolist()):
+            doctor = doctors[doctor_id]
+            doctor["patients"] += first
+            doctor["distance_sum"] += distance_sum
+            doctor["max_km"] = max(doctor["max_km"], max_km)
+
+    def report(self):
+        labels = [f"<={bound}km" for bound in DISTANCE_BANDS_KM] + [f">{DISTANCE_BANDS_KM[-1]}km"]
+        specializations = {}
+        for specialization, summary in self.specializations.items():
+            served = summary["patients"] - summary["unserved"]
+            specializations[specialization] = {
+                "patients": summary["patients"],
+                "unserved": summary["unserved"],
+                "mean_km": round(summary["distance_sum"] / served, 3) if served else None,
+                "max_km": round(summary["max_km"], 3),
+                "distance_bands": dict(zip(labels, summary["bands"])),
+            }
+
+        doctors = [
+            {
+                "doctor_id": doctor_id,
+                "specialization": doctor["specialization"],
+                "patients": doctor["patients"],
+                "in_top_k": doctor["in_top_k"],
+                "mean_km": round(doctor["distance_sum"] / doctor["patients"], 3) if doctor["patients"] else None,
+                "max_km": round(doctor["max_km"], 3),
+            }
+            for doctor_id, doctor in self.doctors.items()
+        ]
+        doctors.sort(key=lambda doctor: (doctor["specialization"], -doctor["patients"], doctor["doctor_id"]))
+        return {"specializations": specializations, "doctors": doctors}
+
+
+def nearest_specialists(chunks, indexes, k=1, on_assignment=None):
+    """
+    Assign every patient its ``k`` nearest doctors per specialization
+
+    Args:
+        chunks: Iterable of (ids, latitudes, longitudes) patient arrays (see patient_coordinate_chunks)
+        indexes (dict): specialization -> DoctorSpatialIndex (see load_specialist_indexes)
+        k (int): Doctors to assign per patient and specialization
+        on_assignment: Optional callable(patient_id, specialization, matches) for streaming output
+
+    Returns:
+        dict: Catchment report plus patient count and elapsed seconds
+    """
+    started = time.perf_counter()
+    stats = CatchmentStats(indexes)
+    patients = 0
+    for ids, latitudes, longitudes in chunks:
+        patients += len(ids)
+        for specialization, index in indexes.items():
+            for patient_ids, doctor_ids, distances in nearest_in_chunk(index, ids, latitudes, longitudes, k):
+                stats.add(specialization, doctor_ids, distances)
+                if on_assignment is not None:
+                    for patient_id, row_ids, row_distances in zip(patient_ids.tolist(), doctor_ids.tolist(), distances.tolist()):
+                        on_assignment(patient_id, specialization, list(zip(row_ids, row_distances)))
+
+    report = stats.report()
+    report.update({"k": k, "patients": patients, "doctors_indexed": {specialization: len(index) for specialization, index in indexes.items()}, "elapsed_seconds": round(time.perf_counter() - started, 3)})
+    return report
+
+
+def latest_report(k=1, specialization=None):
+    """The most recently completed NetworkReport for these options, or None"""
+    return (
+        NetworkReport.objects.filter(k=k, specialization=specialization or "", status="completed")
+        .order_by("-finished_at")
+        .first()
+    )
+
+
+def request_report(k=1, specialization=None, user=None):
+    """
+    Queue a report build, reusing one already pending or running for the same options
+
+    Returns:
+        tuple: (NetworkReport, created)
+    """
+    with transaction.atomic():
+        queued = NetworkReport.objects.select_for_update().filter(k=k, specialization=specialization or "", status__in=("pending", "running")).first()
+        if queued is not None:
+            return queued, False
+        return NetworkReport.objects.create(k=k, specialization=specialization or "", created_by=user), True
+
+
+def claim_pending_report():
+    """
+    Mark the oldest pending report as running and return it, or None if there is none
+
+    The row is locked while it is claimed so concurrent workers never build the same report.
+    """
+    with transaction.atomic():
+        report = NetworkReport.objects.select_for_update().filter(status="pending").order_by("created_at").first()
+        if report is not None:
+            report.status = "running"
+            report.started_at = timezone.now()
+            report.save(update_fields=["status", "started_at"])
+        return report
+
+
+def run_report(report):
+    """
+    Build a queued report and store the result
+
+    Returns:
+        NetworkReport: The report in its final state ("completed" or "failed")
+    """
+    report.status = "running"
+    report.started_at = timezone.now()
+    report.save(update_fields=["status", "started_at"])
+    try:
+        indexes = load_specialist_indexes([report.specialization] if report.specialization else None)
+        report.report = nearest_specialists(patient_coordinate_chunks(), indexes, k=report.k)
+        report.status = "completed"
+    except Exception as error:
+        logger.exception(f"Nearest-specialist report #{report.pk} failed")
+        report.status = "failed"
+        report.error = str(error)
+    report.finished_at = timezone.now()
+    report.save(update_fields=["status", "report", "error", "finished_at"])
+    return report
+
+
+def start_report_in_background(report):
+    """Build a report in a daemon thread of this process"""
+
+    def target():
+        try:
+            run_report(report)
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=target, name=f"kellcare-network-report-{report.pk}", daemon=True)
+    thread.start()
+    return thread
+
@@ -0,0 +1,158 @@
+"""
+Rolling health scores and circuit breakers for geocoding providers
+
+Every provider call records whether the provider gave a definitive answer (a
+result or "not found") and how long it took. A provider whose recent calls keep
+failing or running slower than KELLCARE_GEOCODE_SLOW_CALL is taken out of
+rotation (the breaker opens) for KELLCARE_GEOCODE_BREAKER_COOLDOWN seconds, so
+callers fail over immediately instead of each waiting out the timeout. After the
+cooldown one trial call is let through (half-open): success closes the breaker,
+failure opens it again.
+
+Health is tracked per process.
+"""
+
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class ProviderHealth:
+    """
+    Rolling window of call outcomes for one provider, with a circuit breaker
+
+    Args:
+        provider (str): Provider name
+    """
+
+    def __init__(self, provider):
+        self.provider = provider
+        self._lock = threading.Lock()
+        self._calls = deque(maxlen=max(1, getattr(settings, "KELLCARE_GEOCODE_HEALTH_WINDOW", 20)))
+        self._state = CLOSED
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._consecutive_failures = 0
+        self._stats = {"calls": 0, "failures": 0, "slow_calls": 0, "short_circuited": 0, "opened": 0}
+
+    @staticmethod
+    def _settings():
+        return (
+            getattr(settings, "KELLCARE_GEOCODE_BREAKER_FAILURES", 3),
+            getattr(settings, "KELLCARE_GEOCODE_BREAKER_ERROR_RATE", 0.5),
+            getattr(settings, "KELLCARE_GEOCODE_BREAKER_COOLDOWN", 60),
+            getattr(settings, "KELLCARE_GEOCODE_SLOW_CALL", 5.0),
+        )
+
+    def allow_request(self):
+        """
+        Whether a call may go to the provider now
+
+        Returns False while the breaker is open, and lets a single trial call
+        through once the cooldown has passed.
+        """
+        _, _, cooldown, _ = self._settings()
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and time.monotonic() - self._opened_at >= cooldown:
+                self._state = HALF_OPEN
+                self._trial_in_flight = False
+            if self._state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self._stats["short_circuited"] += 1
+            return False
+
+    def release(self):
+        """Give back a trial call that never reached the provider (e.g. rejected by the rate limiter)"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record(self, ok, elapsed):
+        """
+        Record one provider call
+
+        Args:
+            ok (bool): The provider gave a definitive answer (found or not found)
+            elapsed (float): Seconds the call took
+        """
+        max_failures, max_error_rate, _, slow_call = self._settings()
+        slow = elapsed > slow_call
+        healthy = ok and not slow
+        with self._lock:
+            self._calls.append((healthy, elapsed))
+            self._stats["calls"] += 1
+            self._stats["failures"] += not ok
+            self._stats["slow_calls"] += slow
+            self._consecutive_failures = 0 if healthy else self._consecutive_failures + 1
+
+            if self._state == HALF_OPEN:
+                self._trial_in_flight = False
+                if healthy:
+                    self._state = CLOSED
+                    self._calls.clear()
+                else:
+                    self._open()
+                return
+
+            # Only judge the error rate once the window holds enough calls to mean something
+            window_full = len(self._calls) >= min(10, self._calls.maxlen)
+            error_rate = sum(1 for call_ok, _ in self._calls if not call_ok) / len(self._calls)
+            if self._state == CLOSED and (self._consecutive_failures >= max_failures or (window_full and error_rate >= max_error_rate)):
+                self._open()
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._stats["opened"] += 1
+
+    def reset(self):
+        with self._lock:
+            self._calls.clear()
+            self._state = CLOSED
+            self._opened_at = None
+            self._trial_in_flight = False
+            self._consecutive_failures = 0
+
+    def stats(self):
+        """Breaker state, rolling error rate and latency, and lifetime counters"""
+        _, _, cooldown, _ = self._settings()
+        with self._lock:
+            calls = list(self._calls)
+            stats = dict(self._stats, provider=self.provider, state=self._state, consecutive_failures=self._consecutive_failures)
+            if self._state == OPEN:
+                stats["retry_in"] = round(max(0.0, cooldown - (time.monotonic() - self._opened_at)), 1)
+
+        latencies = sorted(elapsed for _, elapsed in calls)
+        stats["window"] = len(calls)
+        stats["error_rate"] = round(sum(1 for ok, _ in calls if not ok) / len(calls), 3) if calls else 0.0
+        stats["mean_latency"] = round(sum(latencies) / len(latencies), 4) if latencies else None
+        stats["p95_latency"] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 4) if latencies else None
+        # 1.0 is a perfectly healthy provider; errors and slow calls pull it towards 0
+        stats["score"] = round(1.0 - stats["error_rate"], 3) if stats["state"] == CLOSED else 0.0
+        return stats
+
+
+_health = {}
+_health_lock = threading.Lock()
+
+
+def get_provider_health(provider):
+    """Shared health tracker for a geocoding provider"""
+    with _health_lock:
+        health = _health.get(provider)
+        if health is None:
+            health = _health[provider] = ProviderHealth(provider)
+        return health
+
+
+def provider_health_stats():
+    """Health of every provider used by this process"""
+    with _health_lock:
+        trackers = dict(_health)
+    return {provider: health.stats() for provider, health in trackers.items()}
@@ -0,0 +1,164 @@
+"""
+Cross-process token-bucket rate limiting for geocoding providers
+
+Each provider has one bucket whose state (tokens, timestamp) lives in a small file
+under KELLCARE_RATE_LIMIT_DIR. Every acquire takes an exclusive lock on that file,
+so threads and worker processes on the same host share one budget. Callers reserve
+the next free slot in turn (the bucket may go negative) and sleep until it comes
+up, which queues them in arrival order. A caller that would wait longer than its
+maximum wait gives up without reserving anything.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a caller would have to wait longer than its maximum wait"""
+
+    def __init__(self, provider, wait):
+        super().__init__(f"Rate limit for {provider} would need a {wait:.2f}s wait")
+        self.provider = provider
+        self.wait = wait
+
+
+@contextmanager
+def _locked(path):
+    with open(path, "a+") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield handle
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class TokenBucketLimiter:
+    """
+    Token bucket shared through a lock file
+
+    Args:
+        name (str): Bucket name (used for the state file)
+        rate (float): Tokens added per second
+        capacity (float): Largest burst allowed after an idle period
+        directory (str): Where the state file lives (defaults to settings.KELLCARE_RATE_LIMIT_DIR)
+    """
+
+    def __init__(self, name, rate, capacity=1.0, directory=None):
+        self.name = name
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        directory = directory or getattr(settings, "KELLCARE_RATE_LIMIT_DIR", None) or tempfile.gettempdir()
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"kellcare-ratelimit-{name}.json")
+        self._lock = threading.Lock()
+        self._stats = {"acquired": 0, "rejected": 0, "waited": 0, "total_wait": 0.0, "max_wait": 0.0}
+
+    def _reserve(self, max_wait):
+        """Reserve one token and return how long to sleep before using it"""
+        with _locked(self.path) as handle:
+            handle.seek(0)
+            try:
+                state = json.loads(handle.read() or "{}")
+            except ValueError:
+                state = {}
+            now = time.time()
+            tokens = state.get("tokens", self.capacity)
+            updated = state.get("updated", now)
+            tokens = min(self.capacity, tokens + max(0.0, now - updated) * self.rate)
+
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+            if max_wait is not None and wait > max_wait:
+                return None, wait
+
+            handle.seek(0)
+            handle.truncate()
+            handle.write(json.dumps({"tokens": tokens - 1, "updated": now}))
+            handle.flush()
+            return wait, wait
+
+    def acquire(self, max_wait=None):
+        """
+        Take one token, waiting in line for it if necessary
+
+        Args:
+            max_wait (float): Longest acceptable wait in seconds (None waits as long as needed)
+
+        Returns:
+            float: Seconds spent waiting for the limiter
+
+        Raises:
+            RateLimitExceeded: If the wait would exceed ``max_wait``
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        wait, needed = self._reserve(max_wait)
+        if wait is None:
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise RateLimitExceeded(self.name, needed)
+
+        if wait > 0:
+            time.sleep(wait)
+        with self._lock:
+            self._stats["acquired"] += 1
+            if wait > 0:
+                self._stats["waited"] += 1
+                self._stats["total_wait"] += wait
+                self._stats["max_wait"] = max(self._stats["max_wait"], wait)
+        return wait
+
+    def stats(self):
+        """Per-process counters: acquisitions, rejections and time spent waiting"""
+        with self._lock:
+            stats = dict(self._stats, rate_per_second=self.rate, capacity=self.capacity)
+        stats["mean_wait"] = round(stats["total_wait"] / stats["acquired"], 4) if stats["acquired"] else 0.0
+        stats["total_wait"] = round(stats["total_wait"], 4)
+        stats["max_wait"] = round(stats["max_wait"], 4)
+        return stats
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider):
+    """
+    Shared limiter for a geocoding provider
+
+    Rates come from settings.KELLCARE_GEOCODE_RATE_LIMITS (requests per second);
+    providers without an entry are not limited.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            rate = getattr(settings, "KELLCARE_GEOCODE_RATE_LIMITS", {}).get(provider, 0)
+            limiter = _limiters[provider] = TokenBucketLimiter(provider, rate)
+        return limiter
+
+
+def rate_limiter_stats():
+    """Stats for every limiter used by this process"""
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {provider: limiter.stats() for provider, limiter in limiters.items()}
@@ -0,0 +1,96 @@
+"""
+Row counts for paginated API lists and admin changelists
+
+On large tables, COUNT(*) (with the joins a filtered list brings along) can take
+longer than fetching the page itself. count_rows() picks one of three strategies:
+
+- exact: COUNT(*) of the queryset, while the table holds at most
+  KELLCARE_EXACT_COUNT_MAX rows (and for models not in COUNTED_MODELS)
+- cached: unfiltered lists of a large table read a per-table counter from the
+  Django cache. Save/delete signals keep it current, and it is recounted every
+  KELLCARE_ROW_COUNT_TTL seconds because bulk writes bypass signals.
+- estimate: filtered lists of a large table look at no more than
+  KELLCARE_COUNT_ESTIMATE_CAP matches in primary key order. If there are no more
+  matches than that, the count is exact. Otherwise the total is extrapolated
+  from how far into the primary key range the last of them lies.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max, Min
+
+from ..models import Appointment, ContactMessage, Patient
+
+# Models whose list counts may be cached or estimated (the others are always counted)
+COUNTED_MODELS = (Appointment, Patient, ContactMessage)
+
+EXACT, CACHED, ESTIMATE = "exact", "cached", "estimate"
+
+
+def _cache_key(model):
+    return f"kellcare:row-count:{model._meta.label_lower}"
+
+
+def table_count(model):
+    """Rows in ``model``'s table, from the cache when available"""
+    key = _cache_key(model)
+    count = cache.get(key)
+    if count is None:
+        count = model._base_manager.count()
+        cache.set(key, count, timeout=getattr(settings, "KELLCARE_ROW_COUNT_TTL", 300))
+    return count
+
+
+def adjust_table_count(model, delta):
+    """Apply an insert (+1) or delete (-1) to the cached table count"""
+    try:
+        cache.incr(_cache_key(model), delta)
+    except ValueError:
+        # Not cached (expired or never read): the next read counts the table
+        pass
+
+
+def _is_unfiltered(queryset):
+    query = queryset.query
+    return not query.where and not query.distinct and query.low_mark == 0 and query.high_mark is None
+
+
+def _estimate(queryset, model, total):
+    """
+    Count matches up to the cap, extrapolating past it
+
+    Returns:
+        tuple: (count, EXACT or ESTIMATE)
+    """
+    cap = getattr(settings, "KELLCARE_COUNT_ESTIMATE_CAP", 1000)
+    pks = list(queryset.order_by("pk").values_list("pk", flat=True)[: cap + 1])
+    if len(pks) <= cap:
+        return len(pks), EXACT
+
+    bounds = model._base_manager.aggregate(low=Min("pk"), high=Max("pk"))
+    span = bounds["high"] - bounds["low"] + 1
+    covered = pks[cap - 1] - bounds["low"] + 1
+    estimate = round(cap * span / covered)
+    return max(cap + 1, min(estimate, total)), ESTIMATE
+
+
+def count_rows(queryset):
+    """
+    Number of rows in a list queryset, exact only where that is cheap
+
+    Args:
+        queryset: The filtered queryset being paginated (or any sized sequence)
+
+    Returns:
+        tuple: (count, mode) where mode is EXACT, CACHED or ESTIMATE
+    """
+    model = getattr(queryset, "model", None)
+    if model not in COUNTED_MODELS:
+        return (queryset.count() if hasattr(queryset, "query") else len(queryset)), EXACT
+
+    total = table_count(model)
+    if total <= getattr(settings, "KELLCARE_EXACT_COUNT_MAX", 10_000):
+        return queryset.count(), EXACT
+    if _is_unfiltered(queryset):
+        return total, CACHED
+    return _estimate(queryset, model, total)
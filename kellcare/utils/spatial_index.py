@@ -0,0 +1,357 @@
+"""
+In-memory spatial index of doctor coordinates
+
+Doctors with coordinates are kept in parallel ``array`` buffers (id, latitude,
+longitude, specialization code, availability) bucketed into a fixed-degree grid,
+so nearby and nearest-doctor searches touch only the cells around the search
+point and never the database.
+
+The index is built once per process on first use. The Doctor post_save and
+post_delete receivers in kellcare.signals re-read the written rows once their
+transaction commits and record them as IndexChange rows; other processes apply
+those records on their next search (see kellcare.utils.index_changes), so a
+write never makes them rebuild on the request path. Until a change is applied,
+results can trail the database, so callers re-check matches against the rows
+they fetch.
+"""
+
+import logging
+import math
+import sys
+import threading
+import time
+from array import array
+from itertools import chain
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from ..models import Doctor
+from .doctor_search import nearest_in_range
+from .geo import KM_PER_DEGREE_LATITUDE, bounding_box, haversine_km_batch
+from .index_changes import ChangeFollowingIndex, latest_change_id
+
+logger = logging.getLogger(__name__)
+
+# Specialization codes stored in the index; 0 is reserved for values not in the choices
+SPECIALIZATIONS = [choice for choice, _ in Doctor.SPECIALIZATION_CHOICES]
+SPECIALIZATION_CODES = {choice: code for code, choice in enumerate(SPECIALIZATIONS, start=1)}
+
+INDEX_FIELDS = ("id", "latitude", "longitude", "specialization", "is_available")
+
+
+def _empty_arrays():
+    return {
+        "ids": array("q"),
+        "latitudes": array("d"),
+        "longitudes": array("d"),
+        "specializations": array("B"),
+        "available": array("b"),
+    }
+
+
+class DoctorSpatialIndex(ChangeFollowingIndex):
+    """
+    Grid-bucketed, array-backed index of doctor locations
+
+    Args:
+        cell_degrees (float): Grid cell size in degrees (defaults to settings.KELLCARE_DOCTOR_INDEX_CELL_DEGREES)
+    """
+
+    def __init__(self, cell_degrees=None):
+        self.cell_degrees = cell_degrees or getattr(settings, "KELLCARE_DOCTOR_INDEX_CELL_DEGREES", 0.1)
+        self._lock = threading.RLock()
+        self._init_sync()
+        self.counters = {"builds": 0, "updates": 0, "removals": 0, "searches": 0}
+        self.built_at = None
+        self.build_seconds = None
+        self._clear()
+
+    def _clear(self):
+        for name, buffer in _empty_arrays().items():
+            setattr(self, name, buffer)
+        self.slots = {}  # doctor id -> slot in the arrays
+        self.free_slots = []  # slots of removed doctors, reused by later inserts
+        self.grid = {}  # (row, column) -> list of slots
+
+    def __len__(self):
+        return len(self.slots)
+
+    def cell_for(self, latitude, longitude):
+        return (math.floor(latitude / self.cell_degrees), math.floor(longitude / self.cell_degrees))
+
+    # Writes (callers hold the lock)
+
+    def _upsert(self, doctor_id, latitude, longitude, specialization, is_available):
+        latitude, longitude = float(latitude), float(longitude)
+        slot = self.slots.get(doctor_id)
+        if slot is not None:
+            self.grid[self.cell_for(self.latitudes[slot], self.longitudes[slot])].remove(slot)
+        elif self.free_slots:
+            slot = self.free_slots.pop()
+        else:
+            slot = len(self.ids)
+            for buffer in (self.ids, self.latitudes, self.longitudes, self.specializations, self.available):
+                buffer.append(0)
+
+        self.ids[slot] = doctor_id
+        self.latitudes[slot] = latitude
+        self.longitudes[slot] = longitude
+        self.specializations[slot] = SPECIALIZATION_CODES.get(specialization, 0)
+        self.available[slot] = bool(is_available)
+        self.slots[doctor_id] = slot
+        self.grid.setdefault(self.cell_for(latitude, longitude), []).append(slot)
+
+    def _remove(self, doctor_id):
+        slot = self.slots.pop(doctor_id, None)
+        if slot is None:
+            return False
+        cell = self.cell_for(self.latitudes[slot], self.longitudes[slot])
+        self.grid[cell].remove(slot)
+        if not self.grid[cell]:
+            del self.grid[cell]
+        self.ids[slot] = 0
+        self.available[slot] = 0
+        self.free_slots.append(slot)
+        return True
+
+    @classmethod
+    def from_rows(cls, rows, cell_degrees=None):
+        """
+        Standalone index over (id, latitude, longitude, specialization, is_available) rows
+
+        Does not follow IndexChange records; used for one-off computations such as reports.
+        """
+        index = cls(cell_degrees)
+        for row in rows:
+            index._upsert(*row)
+        return index
+
+    def build(self):
+        """Load every doctor with coordinates from the database, replacing the current contents"""
+        started = time.perf_counter()
+        # Changes recorded while the rows are read are applied again by the next sync
+        change_id = latest_change_id()
+        rows = Doctor.objects.order_by().filter(latitude__isnull=False, longitude__isnull=False).values_list(*INDEX_FIELDS)
+        fresh = self.from_rows(rows.iterator(chunk_size=5000), self.cell_degrees)
+
+        with self._lock:
+            for name in ("ids", "latitudes", "longitudes", "specializations", "available", "slots", "free_slots", "grid"):
+                setattr(self, name, getattr(fresh, name))
+            self._mark_synced(change_id)
+            self.built_at = time.time()
+            self.build_seconds = time.perf_counter() - started
+            self.counters["builds"] += 1
+        logger.info(f"Built doctor spatial index with {len(self)} doctors in {self.build_seconds:.3f}s")
+
+    def apply_changes(self, changes):
+        self.refresh([object_id for _, kind, object_id in changes if kind == "doctor"])
+
+    def refresh(self, doctor_ids):
+        """
+        Re-read the given doctors from the database and update their entries
+
+        Doctors that were deleted or lost their coordinates are removed.
+        """
+        doctor_ids = set(doctor_ids)
+        # Not built yet: the build reads the rows
+        if not doctor_ids or self.last_change_id is None:
+            return
+        rows = list(Doctor.objects.order_by().filter(pk__in=doctor_ids).values_list(*INDEX_FIELDS))
+        with self._lock:
+            for row in rows:
+                doctor_ids.discard(row[0])
+                if row[1] is None or row[2] is None:
+                    self.counters["removals"] += self._remove(row[0])
+                else:
+                    self._upsert(*row)
+                    self.counters["updates"] += 1
+            for doctor_id in doctor_ids:
+                self.counters["removals"] += self._remove(doctor_id)
+
+    def refresh_on_commit(self, doctor_ids):
+        """Schedule ``refresh`` for after the current transaction commits"""
+        doctor_ids = list(doctor_ids)
+        transaction.on_commit(lambda: self.refresh(doctor_ids))
+
+    # Reads
+
+    def _cells_in_box(self, latitude, longitude, radius_km):
+        (min_lat, max_lat), lng_ranges = bounding_box(latitude, longitude, radius_km)
+        rows = range(math.floor(min_lat / self.cell_degrees), math.floor(max_lat / self.cell_degrees) + 1)
+        columns = [column for min_lng, max_lng in lng_ranges for column in range(math.floor(min_lng / self.cell_degrees), math.floor(max_lng / self.cell_degrees) + 1)]
+        if len(rows) * len(columns) > len(self.grid):
+            # Huge box relative to the populated cells: scan those instead
+            row_set, column_set = set(rows), set(columns)
+            return [slots for (row, column), slots in self.grid.items() if row in row_set and column in column_set]
+        grid = self.grid
+        return [grid[(row, column)] for row in rows for column in columns if (row, column) in grid]
+
+    def _matching_slots(self, cells, code):
+        """Slots in ``cells`` (lists of slots) of available doctors, optionally with one specialization code"""
+        slots = np.fromiter(chain.from_iterable(cells), dtype=np.intp)
+        keep = self._columns(slots, "available")[0] != 0
+        if code is not None:
+            keep &= self._columns(slots, "specializations")[0] == code
+        return slots[keep]
+
+    def _columns(self, slots, *names):
+        """
+        Copies of the named array buffers at ``slots``, as numpy arrays
+
+        numpy reads the buffers in place, and each view is dropped straight away:
+        an ``array`` cannot grow while a view of it exists.
+        """
+        return [np.asarray(getattr(self, name))[slots] for name in names]
+
+    def cell_block(self, cell, rings, specialization=None):
+        """
+        Available doctors in the square of cells ``rings`` cells around ``cell``
+
+        Returns:
+            tuple: (ids, latitudes, longitudes, box), numpy arrays and box
+            (min_lat, max_lat, min_lng, max_lng) in degrees
+        """
+        row, column = cell
+        code = SPECIALIZATION_CODES.get(specialization, -1) if specialization else None
+        rows, columns = range(row - rings, row + rings + 1), range(column - rings, column + rings + 1)
+        with self._lock:
+            if len(rows) * len(columns) > len(self.grid):
+                cells = [slots for (r, c), slots in self.grid.items() if r in rows and c in columns]
+            else:
+                cells = [self.grid[(r, c)] for r in rows for c in columns if (r, c) in self.grid]
+            ids, latitudes, longitudes = self._columns(self._matching_slots(cells, code), "ids", "latitudes", "longitudes")
+        degrees = self.cell_degrees
+        box = (rows.start * degrees, rows.stop * degrees, columns.start * degrees, columns.stop * degrees)
+        return ids, latitudes, longitudes, box
+
+    def search(self, latitude, longitude, radius_km, specialization=None, limit=10):
+        """
+        Nearest available doctors within ``radius_km``
+
+        Args:
+            latitude (float): Search centre latitude
+            longitude (float): Search centre longitude
+            radius_km (float): Search radius in kilometres
+            specialization (str): Optional Doctor.specialization filter
+            limit (int): Maximum number of doctors to return
+
+        Returns:
+            list: (doctor_id, distance_km) pairs, nearest first
+        """
+        code = SPECIALIZATION_CODES.get(specialization, -1) if specialization else None
+        with self._lock:
+            self.counters["searches"] += 1
+            slots = self._matching_slots(self._cells_in_box(latitude, longitude, radius_km), code)
+            if not slots.size:
+                return []
+            ids, latitudes, longitudes = self._columns(slots, "ids", "latitudes", "longitudes")
+        return nearest_in_range(ids, haversine_km_batch(latitude, longitude, latitudes, longitudes), radius_km, limit)
+
+    def nearest(self, latitude, longitude, k=1, specialization=None, max_radius_km=None):
+        """
+        The ``k`` nearest available doctors, widening the search radius until enough are found
+
+        Returns:
+            list: (doctor_id, distance_km) pairs, nearest first (fewer than ``k`` if
+            fewer exist within ``max_radius_km``, default half the Earth's circumference)
+        """
+        max_radius_km = max_radius_km or 20_016.0
+        radius_km = self.cell_degrees * KM_PER_DEGREE_LATITUDE
+        while True:
+            matches = self.search(latitude, longitude, min(radius_km, max_radius_km), specialization=specialization, limit=k)
+            if len(matches) >= k or radius_km >= max_radius_km:
+                return matches
+            radius_km *= 4
+
+    def check_consistency(self, sample=20):
+        """
+        Compare the index with the database
+
+        Returns:
+            dict: Counts (and up to ``sample`` ids) of doctors missing from the index,
+            indexed but gone from the database, or indexed with outdated values
+        """
+        expected = {
+            row[0]: (float(row[1]), float(row[2]), SPECIALIZATION_CODES.get(row[3], 0), bool(row[4]))
+            for row in Doctor.objects.order_by().filter(latitude__isnull=False, longitude__isnull=False).values_list(*INDEX_FIELDS).iterator(chunk_size=5000)
+        }
+        with self._lock:
+            indexed = {
+                doctor_id: (self.latitudes[slot], self.longitudes[slot], self.specializations[slot], bool(self.available[slot]))
+                for doctor_id, slot in self.slots.items()
+            }
+            grid_slots = sum(len(slots) for slots in self.grid.values())
+
+        missing = sorted(set(expected) - set(indexed))
+        extra = sorted(set(indexed) - set(expected))
+        stale = sorted(doctor_id for doctor_id in set(expected) & set(indexed) if expected[doctor_id] != indexed[doctor_id])
+        return {
+            "consistent": not (missing or extra or stale) and grid_slots == len(indexed),
+            "database_rows": len(expected),
+            "indexed": len(indexed),
+            "grid_entries": grid_slots,
+            "missing": {"count": len(missing), "ids": missing[:sample]},
+            "extra": {"count": len(extra), "ids": extra[:sample]},
+            "stale": {"count": len(stale), "ids": stale[:sample]},
+        }
+
+    def memory_footprint(self):
+        """
+        Approximate bytes held by the index, per structure
+
+        Dictionary and list sizes include their container overhead and the boxed
+        ints/tuples they hold.
+        """
+        with self._lock:
+            arrays = {name: sys.getsizeof(getattr(self, name)) for name in ("ids", "latitudes", "longitudes", "specializations", "available")}
+            slots = sys.getsizeof(self.slots) + sum(sys.getsizeof(key) + sys.getsizeof(value) for key, value in self.slots.items())
+            grid = sys.getsizeof(self.grid) + sum(
+                sys.getsizeof(cell) + sum(sys.getsizeof(part) for part in cell) + sys.getsizeof(members) + sum(sys.getsizeof(slot) for slot in members)
+                for cell, members in self.grid.items()
+            )
+            free_slots = sys.getsizeof(self.free_slots)
+            doctors = len(self.slots)
+
+        total = sum(arrays.values()) + slots + grid + free_slots
+        return {
+            "arrays": arrays,
+            "id_to_slot": slots,
+            "grid": grid,
+            "free_slots": free_slots,
+            "total_bytes": total,
+            "bytes_per_doctor": round(total / doctors, 1) if doctors else None,
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                "doctors": len(self.slots),
+                "slots": len(self.ids),
+                "free_slots": len(self.free_slots),
+                "cells": len(self.grid),
+                "cell_degrees": self.cell_degrees,
+                "last_change_id": self.last_change_id,
+                "rebuilding": self.rebuilding,
+                "built_at": self.built_at,
+                "build_seconds": round(self.build_seconds, 4) if self.build_seconds is not None else None,
+                **self.counters,
+                "memory": self.memory_footprint(),
+            }
+
+
+doctor_index = DoctorSpatialIndex()
+
+
+def get_doctor_index():
+    """
+    Shared doctor index, built or rebuilt as needed
+
+    Returns:
+        DoctorSpatialIndex or None when settings.KELLCARE_DOCTOR_INDEX_ENABLED is off
+    """
+    if not getattr(settings, "KELLCARE_DOCTOR_INDEX_ENABLED", True):
+        return None
+    doctor_index.ensure_fresh()
+    return doctor_index
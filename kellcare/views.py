@@ -1,3 +1,5 @@
+from functools import partial
+
 from django.shortcuts import render, redirect
 from django.urls import reverse
 from django.contrib import messages
@@ -6,12 +8,15 @@ from .forms import ContactForm
 
 def home(request):
     """Unified Home page with featured services and top medical talent"""
-    from .api_client import fetch_doctors, fetch_departments
+    from .api_client import fan_out, fetch_doctors, fetch_stats_summary
 
-    # Fetch data from API endpoints
-    doctors_data = fetch_doctors(request)
-    departments_data = fetch_departments(request)
+    # Fetch data from API endpoints in parallel under one page deadline
+    api_data = fan_out({"doctors": partial(fetch_doctors, request), "stats": partial(fetch_stats_summary, request)})
+    return render(request, "kellcare/home.html", build_home_context(api_data["doctors"], api_data["stats"]))
 
+
+def build_home_context(doctors_data, stats_data):
+    """Build the home page context from API payloads (shared by the sync and async views)"""
     # Dynamic service data
     bestseller_services = [
         {
@@ -102,10 +107,9 @@ def home(request):
     # Department stats
     department_stats = {"total_departments": 0, "total_doctors": 0, "patient_satisfaction": 97.2, "treatments_completed": "15,000+"}
 
-    if departments_data and "results" in departments_data:
-        department_stats["total_departments"] = len(departments_data["results"])
-    if doctors_data and "results" in doctors_data:
-        department_stats["total_doctors"] = len(doctors_data["results"])
+    if stats_data:
+        department_stats["total_departments"] = stats_data["total_departments"]
+        department_stats["total_doctors"] = stats_data["total_doctors"]
 
     feature_cards = [
         {
@@ -139,8 +143,7 @@ def home(request):
         "current_year": 2025,
         "hospital_name": "Kellcare Healthcare Network",
     }
-
-    return render(request, "kellcare/home.html", context)
+    return context
 
 
 def bestsellers(request):
@@ -154,7 +157,11 @@ def urgent_care(request):
 
     # Fetch data from API endpoints
     doctors_data = fetch_doctors(request)
+    return render(request, "kellcare/urgent_care.html", build_urgent_care_context(doctors_data))
 
+
+def build_urgent_care_context(doctors_data):
+    """Build the urgent care page context from API payloads (shared by the sync and async views)"""
     # Urgent care specific locations
     urgent_care_locations = [
         {
@@ -263,18 +270,20 @@ def urgent_care(request):
         "current_year": 2025,
         "hospital_network": "Kellcare Emergency Network",
     }
-
-    return render(request, "kellcare/urgent_care.html", context)
+    return context
 
 
 def locations(request):
     """Locations page view - now consuming Django REST Framework API"""
-    from .api_client import fetch_departments, fetch_doctors
+    from .api_client import fan_out, fetch_departments, fetch_stats_summary
+
+    # Fetch data from API endpoints in parallel under one page deadline
+    api_data = fan_out({"departments": partial(fetch_departments, request), "stats": partial(fetch_stats_summary, request)})
+    return render(request, "kellcare/locations.html", build_locations_context(api_data["departments"], api_data["stats"]))
 
-    # Fetch data from API endpoints instead of direct database access
-    departments_data = fetch_departments(request)
-    doctors_data = fetch_doctors(request)
 
+def build_locations_context(departments_data, stats_data):
+    """Build the locations page context from API payloads (shared by the sync and async views)"""
     # Default values in case API calls fail
     total_departments = 0
     total_doctors = 0
@@ -285,24 +294,14 @@ def locations(request):
     # Process departments data from API
     if departments_data and "results" in departments_data:
         departments_list = departments_data["results"]
-        total_departments = len(departments_list)
         if departments_list:
             flagship_hospital = departments_list[0]["name"]
 
-    # Process doctors data from API
-    if doctors_data and "results" in doctors_data:
-        doctors_list = doctors_data["results"]
-        total_doctors = len(doctors_list)
-
-        # Count specializations from API data
-        specialization_counts = {}
-        for doctor in doctors_list:
-            spec = doctor.get("specialization", "general")
-            specialization_counts[spec] = specialization_counts.get(spec, 0) + 1
-
-        # Get top 5 specializations
-        sorted_specs = sorted(specialization_counts.items(), key=lambda x: x[1], reverse=True)[:5]
-        major_specializations = [spec[0].replace("_", " ").title() for spec in sorted_specs]
+    # Totals and top 5 specializations come pre-aggregated from the stats API
+    if stats_data:
+        total_departments = stats_data["total_departments"]
+        total_doctors = stats_data["total_doctors"]
+        major_specializations = [spec["specialization"].replace("_", " ").title() for spec in stats_data["specializations"][:5]]
 
     context = {
         "total_facilities": total_departments,
@@ -344,48 +343,67 @@ def locations(request):
             },
         },
     }
-    return render(request, "kellcare/locations.html", context)
+    return context
 
 
 def nursing_homes(request):
-    """Nursing Homes page view - now consuming Django REST Framework API and geocoding API"""
-    from .api_client import fetch_doctors, fetch_departments, geocode_address_via_api
-    import random
+    """Nursing Homes page view - now consuming Django REST Framework API and stored coordinates"""
+    from .api_client import fan_out, fetch_doctors, fetch_departments
 
-    # Fetch data from API endpoints instead of direct database access
-    doctors_data = fetch_doctors(request)
-    departments_data = fetch_departments(request)
+    # Fetch data from API endpoints in parallel under one page deadline
+    api_data = fan_out({"doctors": partial(fetch_doctors, request), "departments": partial(fetch_departments, request)})
+
+    # Never geocode while rendering: missing coordinates are resolved in the background
+    queue_missing_coordinates(api_data["doctors"])
+
+    context = build_nursing_homes_context(api_data["doctors"], api_data["departments"])
+    return render(request, "kellcare/nursing_homes.html", context)
+
+
+def nursing_home_doctors(doctors_data):
+    """Doctors from an API payload whose specialization fits the nursing homes page"""
+    if not doctors_data or "results" not in doctors_data:
+        return []
+    return [doc for doc in doctors_data["results"] if doc.get("specialization") in ["general", "cardiology", "neurology"]]
+
+
+def queue_missing_coordinates(doctors_data):
+    """Queue nursing home doctors without stored coordinates for background geocoding (never blocks)"""
+    from .models import Doctor
+    from .utils.geocoding_queue import enqueue_missing_coordinates
+
+    missing = [
+        doctor["id"]
+        for doctor in nursing_home_doctors(doctors_data)
+        if doctor.get("id") and doctor.get("address") and not (doctor.get("latitude") and doctor.get("longitude"))
+    ]
+    if missing:
+        enqueue_missing_coordinates(Doctor, missing)
+    return missing
+
+
+def build_nursing_homes_context(doctors_data, departments_data):
+    """
+    Build the nursing homes page context from API payloads (shared by the sync and async views)
+
+    Args:
+        doctors_data: Doctors API payload
+        departments_data: Departments API payload
+    """
+    import random
 
     nursing_homes_data = []
 
     # Process doctors data from API
     if doctors_data and "results" in doctors_data:
-        doctors_list = doctors_data["results"]
-
-        # Filter for relevant specializations
-        nursing_doctors = [doc for doc in doctors_list if doc.get("specialization") in ["general", "cardiology", "neurology"]]
-
         # Convert API data to format expected by template
-        for doctor in nursing_doctors:
+        for doctor in nursing_home_doctors(doctors_data):
             # Generate some sample ratings (in production, these would come from a ratings model)
             base_rating = round(random.uniform(3.5, 4.8), 1)
 
-            # Use existing coordinates or try to geocode via API
-            location_coords = ""
-            if doctor.get("latitude") and doctor.get("longitude"):
-                location_coords = f"{doctor['latitude']}, {doctor['longitude']}"
-            elif doctor.get("address"):
-                # Try to geocode via API endpoint
-                try:
-                    geocode_result = geocode_address_via_api(request, doctor["address"])
-                    if geocode_result and geocode_result.get("latitude"):
-                        location_coords = f"{geocode_result['latitude']}, {geocode_result['longitude']}"
-                    else:
-                        location_coords = "0, 0"  # Default if geocoding fails
-                except Exception:
-                    location_coords = "0, 0"  # Default if API call fails
-            else:
-                location_coords = "0, 0"
+            # Only stored coordinates are shown; missing ones render a placeholder until resolved
+            location_pending = not (doctor.get("latitude") and doctor.get("longitude"))
+            location_coords = "" if location_pending else f"{doctor['latitude']}, {doctor['longitude']}"
 
             # Get user info from nested data
             user_data = doctor.get("user", {})
@@ -400,7 +418,8 @@ def nursing_homes(request):
                 "bar": "green" if base_rating >= 4.3 else "yellow" if base_rating >= 4.0 else "red",
                 "ratings": str(base_rating),
                 "location": location_coords,
-                "address": doctor.get("address", "Address not provided"),
+                "location_pending": location_pending,
+                "address": doctor.get("address") or "Address not provided",
                 "food_ratings": str(round(base_rating + random.uniform(-0.5, 0.3), 1)),
                 "staff_ratings": str(round(base_rating + random.uniform(-0.3, 0.4), 1)),
                 "atmosphere_ratings": str(round(base_rating + random.uniform(-0.4, 0.5), 1)),
@@ -437,9 +456,9 @@ def nursing_homes(request):
 
     context = {
         "nursing_homes": nursing_homes_data[:6],  # Limit to 6 facilities
-        "api_source": "Django REST Framework API + Geocoding API",  # Show data source
+        "api_source": "Django REST Framework API",  # Show data source
     }
-    return render(request, "kellcare/nursing_homes.html", context)
+    return context
 
 
 def about(request):
@@ -112,6 +112,20 @@ DATABASES = {
     }
 }
 
+# Django's cache holds the generation counters that invalidate the per-process API response
+# cache, doctor spatial index and autocomplete index, plus cached row counts and stats, so every
+# worker and management command must share it. The default file-based cache is shared by all
+# processes on one host; use Redis or Memcached (KELLCARE_CACHE_BACKEND/KELLCARE_CACHE_LOCATION)
+# across hosts, which also makes the counters' increments atomic. With a per-process backend
+# such as LocMemCache, writes from other processes go unseen until the affected entries expire.
+CACHES = {
+    "default": {
+        "BACKEND": config("KELLCARE_CACHE_BACKEND", default="django.core.cache.backends.filebased.FileBasedCache"),
+        "LOCATION": config("KELLCARE_CACHE_LOCATION", default=str(BASE_DIR / ".cache")),
+        "OPTIONS": {"MAX_ENTRIES": config("KELLCARE_CACHE_MAX_ENTRIES", default=10_000, cast=int)},
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -165,7 +179,7 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # Django REST Framework settings
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
+    "DEFAULT_PAGINATION_CLASS": "kellcare.pagination.CountedPageNumberPagination",
     "PAGE_SIZE": 20,
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework.authentication.SessionAuthentication",
@@ -182,6 +196,127 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Transport used by kellcare.api_client when page views consume the API.
+# "inprocess" calls the DRF views directly; "http" goes over a real socket.
+KELLCARE_API_TRANSPORT = config("KELLCARE_API_TRANSPORT", default="inprocess")
+
+# Serve the API-backed pages with the async views in kellcare/async_views.py (for ASGI servers)
+KELLCARE_ASYNC_VIEWS = config("KELLCARE_ASYNC_VIEWS", default=False, cast=bool)
+
+# Deadline (seconds) and worker count for pages that fan out several API calls at once
+KELLCARE_API_FANOUT_TIMEOUT = config("KELLCARE_API_FANOUT_TIMEOUT", default=2.0, cast=float)
+KELLCARE_API_FANOUT_WORKERS = config("KELLCARE_API_FANOUT_WORKERS", default=8, cast=int)
+
+# Shared keep-alive HTTP session pool, retries and circuit breaker for the "http" transport
+KELLCARE_API_HTTP_TIMEOUT = config("KELLCARE_API_HTTP_TIMEOUT", default=5.0, cast=float)
+KELLCARE_API_POOL_SIZE = config("KELLCARE_API_POOL_SIZE", default=10, cast=int)
+KELLCARE_API_RETRIES = config("KELLCARE_API_RETRIES", default=2, cast=int)
+KELLCARE_API_RETRY_BACKOFF = config("KELLCARE_API_RETRY_BACKOFF", default=0.1, cast=float)
+KELLCARE_API_BREAKER_THRESHOLD = config("KELLCARE_API_BREAKER_THRESHOLD", default=5, cast=int)
+KELLCARE_API_BREAKER_RESET = config("KELLCARE_API_BREAKER_RESET", default=30.0, cast=float)
+
+# Read-through cache for GET responses fetched by kellcare.api_client (TTL in seconds, 0 disables).
+# Model save/delete signals invalidate entries in every process sharing CACHES; the TTL bounds
+# staleness when a write is not seen (a bulk write without signals, or a per-process cache backend).
+KELLCARE_API_CACHE_DEFAULT_TTL = config("KELLCARE_API_CACHE_DEFAULT_TTL", default=60, cast=int)
+KELLCARE_API_CACHE_MAX_ENTRIES = config("KELLCARE_API_CACHE_MAX_ENTRIES", default=512, cast=int)
+KELLCARE_API_CACHE_TTLS = {
+    "/api/departments/": 600,
+    "/api/doctors/": 300,
+    "/api/patients/": 60,
+    "/api/appointments/": 30,
+    "/api/stats/": 300,
+}
+
+# Server-side cache lifetime (seconds) for /api/stats/summary/; writes invalidate it sooner
+KELLCARE_STATS_CACHE_TTL = config("KELLCARE_STATS_CACHE_TTL", default=300, cast=int)
+
+# Background resolution of missing coordinates (pages only read stored coordinates).
+# Disable the in-process worker to rely on `manage.py geocode_missing_coordinates` instead.
+KELLCARE_GEOCODE_IN_BACKGROUND = config("KELLCARE_GEOCODE_IN_BACKGROUND", default=True, cast=bool)
+KELLCARE_GEOCODE_SERVICE = config("KELLCARE_GEOCODE_SERVICE", default="nominatim")
+KELLCARE_GEOCODE_RETRY_AFTER = config("KELLCARE_GEOCODE_RETRY_AFTER", default=3600, cast=int)
+
+# Bulk geocoding jobs: rows per checkpoint, per-row errors kept, and how long (seconds)
+# a running job may go without a heartbeat before a worker takes it over
+KELLCARE_GEOCODE_JOB_CHUNK_SIZE = config("KELLCARE_GEOCODE_JOB_CHUNK_SIZE", default=100, cast=int)
+KELLCARE_GEOCODE_JOB_MAX_ERRORS = config("KELLCARE_GEOCODE_JOB_MAX_ERRORS", default=100, cast=int)
+KELLCARE_GEOCODE_JOB_STALE_AFTER = config("KELLCARE_GEOCODE_JOB_STALE_AFTER", default=300, cast=int)
+
+# Geocode result cache (seconds): found results, "not found" results, and the in-process LRU size
+KELLCARE_GEOCODE_CACHE_TTL = config("KELLCARE_GEOCODE_CACHE_TTL", default=30 * 24 * 3600, cast=int)
+KELLCARE_GEOCODE_NEGATIVE_TTL = config("KELLCARE_GEOCODE_NEGATIVE_TTL", default=3600, cast=int)
+KELLCARE_GEOCODE_LRU_SIZE = config("KELLCARE_GEOCODE_LRU_SIZE", default=1024, cast=int)
+
+# Reverse lookups are cached per geohash cell (8 characters is about 38 m x 19 m), with their own
+# in-process LRU size and a cap on stored rows
+KELLCARE_REVERSE_GEOHASH_PRECISION = config("KELLCARE_REVERSE_GEOHASH_PRECISION", default=8, cast=int)
+KELLCARE_REVERSE_GEOCODE_LRU_SIZE = config("KELLCARE_REVERSE_GEOCODE_LRU_SIZE", default=4096, cast=int)
+KELLCARE_REVERSE_GEOCODE_MAX_ENTRIES = config("KELLCARE_REVERSE_GEOCODE_MAX_ENTRIES", default=100_000, cast=int)
+
+# Provider rate limits (requests per second) shared by all threads and processes on this host
+# through lock files in KELLCARE_RATE_LIMIT_DIR. Callers give up after KELLCARE_GEOCODE_MAX_WAIT seconds.
+KELLCARE_GEOCODE_RATE_LIMITS = {
+    "nominatim": 1.0,
+    "google": 50.0,
+}
+KELLCARE_GEOCODE_MAX_WAIT = config("KELLCARE_GEOCODE_MAX_WAIT", default=10.0, cast=float)
+KELLCARE_RATE_LIMIT_DIR = config("KELLCARE_RATE_LIMIT_DIR", default="")
+
+# Lookups in flight at once per provider for geocode_many() and bulk jobs, and the per-request timeout (seconds)
+KELLCARE_GEOCODE_CONCURRENCY = {
+    "nominatim": 1,
+    "google": 10,
+    "local": 4,
+}
+KELLCARE_GEOCODE_TIMEOUT = config("KELLCARE_GEOCODE_TIMEOUT", default=10.0, cast=float)
+
+# Offline "local" geocoding provider: gazetteer CSV (kind,name,city,state,postal_code,latitude,longitude)
+# and its generated index (defaults to the CSV path with an .idx suffix)
+KELLCARE_GAZETTEER_CSV = config("KELLCARE_GAZETTEER_CSV", default=str(BASE_DIR / "kellcare" / "data" / "gazetteer_sample.csv"))
+KELLCARE_GAZETTEER_INDEX = config("KELLCARE_GAZETTEER_INDEX", default="")
+KELLCARE_GAZETTEER_REVERSE_MAX_KM = config("KELLCARE_GAZETTEER_REVERSE_MAX_KM", default=10.0, cast=float)
+
+# Providers tried in order by service="chain", and the failover order for a single service that
+# cannot answer (timeout, provider error, open circuit breaker) when KELLCARE_GEOCODE_FAILOVER is on
+KELLCARE_GEOCODE_CHAIN = config("KELLCARE_GEOCODE_CHAIN", default="local,nominatim,google", cast=Csv())
+KELLCARE_GEOCODE_FAILOVER = config("KELLCARE_GEOCODE_FAILOVER", default=True, cast=bool)
+
+# Provider health (per process): rolling window of recent calls, and the circuit breaker that takes
+# a provider out of rotation for KELLCARE_GEOCODE_BREAKER_COOLDOWN seconds after that many
+# consecutive failures or that error rate. Calls slower than KELLCARE_GEOCODE_SLOW_CALL count as failures.
+KELLCARE_GEOCODE_HEALTH_WINDOW = config("KELLCARE_GEOCODE_HEALTH_WINDOW", default=20, cast=int)
+KELLCARE_GEOCODE_BREAKER_FAILURES = config("KELLCARE_GEOCODE_BREAKER_FAILURES", default=3, cast=int)
+KELLCARE_GEOCODE_BREAKER_ERROR_RATE = config("KELLCARE_GEOCODE_BREAKER_ERROR_RATE", default=0.5, cast=float)
+KELLCARE_GEOCODE_BREAKER_COOLDOWN = config("KELLCARE_GEOCODE_BREAKER_COOLDOWN", default=60, cast=int)
+KELLCARE_GEOCODE_SLOW_CALL = config("KELLCARE_GEOCODE_SLOW_CALL", default=5.0, cast=float)
+
+# In-memory doctor spatial index serving /api/doctors/nearby/ (off = query the database each time)
+# and its grid cell size in degrees (0.1 is about 11 km north-south)
+KELLCARE_DOCTOR_INDEX_ENABLED = config("KELLCARE_DOCTOR_INDEX_ENABLED", default=True, cast=bool)
+KELLCARE_DOCTOR_INDEX_CELL_DEGREES = config("KELLCARE_DOCTOR_INDEX_CELL_DEGREES", default=0.1, cast=float)
+
+# In-memory doctor and autocomplete indexes apply other processes' writes (IndexChange
+# records) at most this often (seconds); records older than the retention are pruned
+KELLCARE_INDEX_SYNC_INTERVAL = config("KELLCARE_INDEX_SYNC_INTERVAL", default=1.0, cast=float)
+KELLCARE_INDEX_CHANGE_RETENTION = config("KELLCARE_INDEX_CHANGE_RETENTION", default=3600, cast=int)
+
+# Build nearest-specialist reports requested by staff in a background thread of the web
+# process (off = leave them pending for `manage.py nearest_specialists --run-pending`)
+KELLCARE_NETWORK_REPORT_IN_BACKGROUND = config("KELLCARE_NETWORK_REPORT_IN_BACKGROUND", default=True, cast=bool)
+
+# List and admin changelist counts (see kellcare/utils/row_counts.py): tables up to
+# KELLCARE_EXACT_COUNT_MAX rows are counted exactly; larger ones use the signal-maintained
+# table count (recounted every KELLCARE_ROW_COUNT_TTL seconds) when unfiltered, and an
+# estimate when a filtered list has more than KELLCARE_COUNT_ESTIMATE_CAP matches
+KELLCARE_EXACT_COUNT_MAX = config("KELLCARE_EXACT_COUNT_MAX", default=10_000, cast=int)
+KELLCARE_ROW_COUNT_TTL = config("KELLCARE_ROW_COUNT_TTL", default=300, cast=int)
+KELLCARE_COUNT_ESTIMATE_CAP = config("KELLCARE_COUNT_ESTIMATE_CAP", default=1000, cast=int)
+
+# ?search= on doctors, patients, appointments and contact messages and /api/search/ use the
+# SQLite FTS5 tables from migration 0009 (off = LIKE scans over each viewset's search_fields)
+KELLCARE_FULLTEXT_SEARCH = config("KELLCARE_FULLTEXT_SEARCH", default=True, cast=bool)
+
 # Spectacular settings for API documentation
 SPECTACULAR_SETTINGS = {
     "TITLE": "Kellcare API",